@@ -0,0 +1,173 @@
+# answer_cache.py
+import os
+import json
+import time
+import uuid
+import threading
+import numpy as np
+from embedding_cache import CACHE_DIR
+
+# ---------- Configuration ----------
+ANSWER_CACHE_TTL_SECONDS = 3600         # How long a generated answer may be served from the cache
+DEFAULT_SIMILARITY_THRESHOLD = 0.92     # Cosine similarity a new question needs to reuse a cached answer
+MAX_ENTRIES_PER_INDEX = 1000
+INDEX_VERSIONS_PATH = os.path.join(CACHE_DIR, "index_versions.json")
+# -----------------------------------
+
+
+# ---------- Index versions ----------
+# ingest.py bumps an index's version after (re-)ingesting it. Caches remember the version
+# their entries were built against and drop them when it changes, even across processes.
+
+def _read_index_versions():
+    try:
+        with open(INDEX_VERSIONS_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def get_index_version(index_name):
+    return _read_index_versions().get(index_name)
+
+def mark_index_updated(index_name):
+    """
+    Records that index_name has new content, invalidating answers cached against it.
+    """
+    versions = _read_index_versions()
+    versions[index_name] = uuid.uuid4().hex
+    os.makedirs(os.path.dirname(INDEX_VERSIONS_PATH) or ".", exist_ok=True)
+    tmp_path = f"{INDEX_VERSIONS_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(versions, f)
+    os.replace(tmp_path, INDEX_VERSIONS_PATH) # Atomic, so readers never see a partial file
+    return versions[index_name]
+
+
+class _IndexEntries:
+    def __init__(self, version):
+        self.version = version
+        self.vectors = np.empty((0, 0), dtype=np.float32) # Unit-normalized question embeddings
+        self.answers = []
+        self.questions = []
+        self.created_at = []
+
+
+class SemanticAnswerCache:
+    """
+    Caches generated answers per OpenSearch index, keyed by question embedding. A lookup returns
+    the stored answer of the most similar cached question if its cosine similarity clears the
+    threshold and the entry has not expired or been invalidated by a re-ingest.
+    """
+
+    def __init__(self, ttl_seconds=ANSWER_CACHE_TTL_SECONDS, max_entries_per_index=MAX_ENTRIES_PER_INDEX):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_index = max_entries_per_index
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._versions_mtime = None
+        self.hits = 0
+        self.misses = 0
+
+    def _refresh_versions(self):
+        # Caller holds the lock. Only re-read the versions file when it has changed on disk.
+        try:
+            mtime = os.stat(INDEX_VERSIONS_PATH).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._versions_mtime:
+            return
+        self._versions_mtime = mtime
+        versions = _read_index_versions()
+        for index_name in list(self._indexes):
+            if self._indexes[index_name].version != versions.get(index_name):
+                del self._indexes[index_name]
+
+    def _expire(self, entries):
+        # Caller holds the lock.
+        cutoff = time.time() - self.ttl_seconds
+        keep = [i for i, created in enumerate(entries.created_at) if created >= cutoff]
+        if len(keep) < len(entries.created_at):
+            entries.vectors = entries.vectors[keep]
+            entries.answers = [entries.answers[i] for i in keep]
+            entries.questions = [entries.questions[i] for i in keep]
+            entries.created_at = [entries.created_at[i] for i in keep]
+
+    def lookup(self, index_name, query_embedding, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        """
+        Returns the cached answer for a question close enough to query_embedding, or None.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        with self._lock:
+            self._refresh_versions()
+            entries = self._indexes.get(index_name)
+            if entries is None or norm == 0:
+                self.misses += 1
+                return None
+            self._expire(entries)
+            if not entries.answers:
+                self.misses += 1
+                return None
+
+            similarities = entries.vectors @ (query / norm)
+            best = int(np.argmax(similarities))
+            if similarities[best] < threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entries.answers[best]
+
+    def store(self, index_name, query_embedding, answer, question=None):
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return
+        with self._lock:
+            self._refresh_versions()
+            entries = self._indexes.get(index_name)
+            if entries is None:
+                entries = self._indexes[index_name] = _IndexEntries(get_index_version(index_name))
+                entries.vectors = np.empty((0, query.shape[0]), dtype=np.float32)
+            self._expire(entries)
+
+            entries.vectors = np.vstack([entries.vectors, query / norm])
+            entries.answers.append(answer)
+            entries.questions.append(question)
+            entries.created_at.append(time.time())
+
+            overflow = len(entries.answers) - self.max_entries_per_index
+            if overflow > 0: # Oldest entries go first
+                entries.vectors = entries.vectors[overflow:]
+                del entries.answers[:overflow]
+                del entries.questions[:overflow]
+                del entries.created_at[:overflow]
+
+    def invalidate(self, index_name):
+        with self._lock:
+            self._indexes.pop(index_name, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "lookups": lookups,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": {name: len(entries.answers) for name, entries in self._indexes.items()},
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_answer_cache():
+    """
+    Returns the process-wide SemanticAnswerCache, shared by all Streamlit sessions.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticAnswerCache()
+    return _cache
@@ -1,6 +1,7 @@
+import time
+import itertools
 import streamlit as st
-from bedrock_client import get_embedding, query_llm
-from opensearch_client import search_chunks
+from chat_stream import answer_pieces, render_stream
 
 st.set_page_config(page_title="SkyConnect Chatbot", page_icon="✈️", layout="wide") # Changed to wide layout
 
@@ -48,6 +49,14 @@ def set_bg_from_url(url):
          unsafe_allow_html=True
      )
 
+BOT_KEY = "airline_faq" # Retrieval and generation settings come from chatbot_configs.py
+
+# --- RAG client, created on the first question and shared by every session in the process ---
+@st.cache_resource(show_spinner=False)
+def rag_client():
+    from rag_service import get_rag_client # Deferred: pulls in boto3 and numpy, which the first page render doesn't need
+    return get_rag_client()
+
 # --- !!! DIRECT IMAGE URL !!! ---
 # direct_image_url = "https://img.freepik.com/free-photo/jumbo-jet-flying-sky_23-2150895693.jpg?ga=GA1.1.1907611749.1748313800&semt=ais_hybrid&w=740"
 direct_image_url = "https://img.freepik.com/free-photo/close-up-man-prepared-traveling_23-2151030922.jpg?ga=GA1.1.1907611749.1748313800&semt=ais_hybrid&w=740" 
@@ -79,42 +88,30 @@ if user_query := st.chat_input("Ask me anything about SkyConnect Airlines..."):
 
     # Display assistant response in chat message container
     with st.chat_message("assistant", avatar="✈️"):
+        message_placeholder = st.empty()
+        request_start = time.perf_counter()
+
+        # 1-3. Embed the query, retrieve context and stream the LLM's answer, via the RAG service
+        events = rag_client().answer_stream(BOT_KEY, user_query)
         with st.spinner("✈️ SkyConnect is searching for your answer..."):
-            message_placeholder = st.empty() # For streaming-like effect if LLM supported it easily
-            
-            # 1. Embed user query
-            query_embedding = get_embedding(user_query)
-
-            # 2. Retrieve context from OpenSearch
-            # Consider adding a k parameter to search_chunks if you want to vary number of results
-            results = search_chunks("skyconnect-knowledge-base", query_embedding, k=3) # k=3 for more focused context
-            
-            retrieved_chunks_text = [hit['_source']['chunk_text'] for hit in results]
-            context = "\n\n---\n\n".join(retrieved_chunks_text) # Added separator for clarity
-
-            full_response = ""
-            if not retrieved_chunks_text:
-                answer = "I couldn't find specific information related to your query in my current knowledge base. Could you please try rephrasing, or ask about a different topic like flight schedules or baggage policies?"
-                context_for_display = "No relevant context was retrieved from the knowledge base for this query."
-            else:
-                # 3. Query LLM for final answer
-                answer = query_llm(user_query, context)
-                context_for_display = retrieved_chunks_text
-
-            message_placeholder.markdown(answer)
-            full_response = answer
-            
-            # Add assistant response to chat history
-            st.session_state.messages.append({"role": "assistant", "content": full_response})
-
-            # # Optional: Display retrieved context in an expander
-            # if retrieved_chunks_text: # Only show if context was actually used
-            #     with st.expander("🔍 View Retrieved Context Snippets"):
-            #         for idx, chunk in enumerate(context_for_display if isinstance(context_for_display, list) else [context_for_display], 1):
-            #             st.info(f"**Context Snippet {idx}:**\n{chunk}")
-            # elif context_for_display: # For the "No relevant context" message
-            #      with st.expander("🔍 Retrieval Information"):
-            #         st.warning(context_for_display)
+            first_event = next(events)
+        answer, ttft = render_stream(message_placeholder, answer_pieces(itertools.chain([first_event], events)), request_start)
+
+        total_latency = time.perf_counter() - request_start
+        st.caption(f"⏱️ First token {ttft:.2f}s · Total {total_latency:.2f}s")
+        full_response = answer
+        
+        # Add assistant response to chat history
+        st.session_state.messages.append({"role": "assistant", "content": full_response})
+
+        # # Optional: Display retrieved context in an expander
+        # if retrieved_chunks_text: # Only show if context was actually used
+        #     with st.expander("🔍 View Retrieved Context Snippets"):
+        #         for idx, chunk in enumerate(context_for_display if isinstance(context_for_display, list) else [context_for_display], 1):
+        #             st.info(f"**Context Snippet {idx}:**\n{chunk}")
+        # elif context_for_display: # For the "No relevant context" message
+        #      with st.expander("🔍 Retrieval Information"):
+        #         st.warning(context_for_display)
 
 
 # # --- Footer ---
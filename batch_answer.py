@@ -0,0 +1,188 @@
+# batch_answer.py
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from chatbot_configs import CHATBOT_CONFIGS
+from bedrock_client import PRIORITY_BACKGROUND
+from embedding_cache import CACHE_DIR, normalize_text, print_cache_stats
+from metrics import stage_seconds
+from rag_service import RAGService, LocalRAGClient, HTTPRAGClient, RAG_SERVICE_URL
+
+# ---------- Configuration ----------
+DEFAULT_CONCURRENCY = 8                  # Questions in flight at once
+DEFAULT_OUTPUT_PATH = os.path.join(CACHE_DIR, "reports", "batch_answers.jsonl")
+# -----------------------------------
+
+# Answers a JSONL file of questions ({"question": ..., optional "id" and any other fields, which
+# are copied to the output}) with a bot's RAG pipeline, outside the chat UI. Uses:
+#   - nightly quality runs: --fresh bypasses precomputed and cached answers, so every question
+#     is retrieved and generated, and the output can be diffed against the previous night's;
+#   - pre-warming: with --service-url the questions go to a running rag_service.py, whose
+#     answer cache then holds them for the chat apps. In-process runs only warm the embedding cache.
+# Results are appended to the output as each question finishes, one line per question, with the
+# answer, sources and per-stage timings. A rerun with the same output skips questions that were
+# already answered and retries the ones that failed; readers should take the last line per id.
+
+def question_id(item):
+    return str(item.get("id") or normalize_text(item["question"]))
+
+def load_questions(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def answered_ids(output_path):
+    """
+    :return: IDs of questions the output file already has an answer for (not an error).
+    """
+    done = set()
+    try:
+        with open(output_path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # A line cut short by a killed run
+                if "error" in result:
+                    done.discard(result["id"])
+                else:
+                    done.add(result["id"])
+    except FileNotFoundError:
+        pass
+    return done
+
+def answer_one(client, bot_key, item):
+    result = {**item, "id": question_id(item), "bot": bot_key}
+    start = time.perf_counter()
+    try:
+        answer = client.answer(bot_key, item["question"])
+    except Exception as e:
+        return {**result, "error": str(e), "total_seconds": time.perf_counter() - start}
+    return {
+        **result,
+        "answer": answer.get("answer"),
+        "cached": answer.get("cached", False),
+        "precomputed": answer.get("precomputed", False),
+        "sources": answer.get("sources", []),
+        "ttft_seconds": answer.get("ttft_seconds"),
+        "total_seconds": answer.get("total_seconds"),
+        "stages": stage_seconds(answer.get("spans")),
+    }
+
+def run_batch(client, bot_key, items, output_path, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Answers items with at most concurrency questions in flight, appending each result to
+    output_path as soon as it is done.
+
+    :return: List of the results of this run.
+    """
+    results = []
+    pending = iter(items)
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n": # Finish a line cut short by a killed run, so results start on their own line
+                f.write(b"\n")
+    with open(output_path, "a") as out, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = set()
+        while True:
+            while len(in_flight) < concurrency: # Sliding window: large files are never queued up front
+                item = next(pending, None)
+                if item is None:
+                    break
+                in_flight.add(executor.submit(answer_one, client, bot_key, item))
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                out.write(json.dumps(result) + "\n") # Only this thread writes; workers just answer
+                out.flush()
+                results.append(result)
+                status = f"❌ {result['error']}" if "error" in result else ("💾 cached" if result["cached"] else f"✅ {result['total_seconds']:.2f}s")
+                print(f"[{len(results)}/{len(items)}] {status} — {result['question'][:70]}")
+    return results
+
+def summarize(results, seconds, skipped):
+    answered = [result for result in results if "error" not in result]
+    totals = np.asarray([result["total_seconds"] for result in answered]) * 1000
+    ttfts = np.asarray([result["ttft_seconds"] for result in answered if result.get("ttft_seconds") is not None]) * 1000
+    summary = {
+        "answered": len(answered),
+        "failed": len(results) - len(answered),
+        "skipped": skipped,
+        "cached": sum(1 for result in answered if result["cached"]),
+        "seconds": seconds,
+        "questions_per_second": len(answered) / seconds if seconds > 0 else 0.0,
+    }
+    for name, values in (("total_ms", totals), ("ttft_ms", ttfts)):
+        if len(values):
+            summary[f"{name}_p50"], summary[f"{name}_p95"] = (float(value) for value in np.percentile(values, [50, 95]))
+    stages = {}
+    for result in answered:
+        for stage, stage_secs in result["stages"].items():
+            stages.setdefault(stage, []).append(stage_secs * 1000)
+    summary["stage_ms_mean"] = {stage: float(np.mean(values)) for stage, values in sorted(stages.items())}
+    return summary
+
+def print_summary(summary):
+    print(f"\n📊 {summary['answered']} answered ({summary['cached']} from caches), {summary['failed']} failed, "
+          f"{summary['skipped']} skipped as already answered, in {summary['seconds']:.1f}s — {summary['questions_per_second']:.2f} questions/sec")
+    if "total_ms_p50" in summary:
+        print(f"⏱️ total p50 {summary['total_ms_p50']:.0f} ms, p95 {summary['total_ms_p95']:.0f} ms"
+              + (f"; ttft p50 {summary['ttft_ms_p50']:.0f} ms, p95 {summary['ttft_ms_p95']:.0f} ms" if "ttft_ms_p50" in summary else ""))
+    for stage, mean_ms in summary["stage_ms_mean"].items():
+        print(f"   {stage:<16} mean {mean_ms:8.1f} ms")
+
+if __name__ == "__main__":
+    rag_bots = sorted(key for key, config in CHATBOT_CONFIGS.items() if config.get("rag_enabled"))
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions with a bot's RAG pipeline.")
+    parser.add_argument("questions", help='JSONL file, one {"question": ...} per line (optional "id"; other fields are copied to the output).')
+    parser.add_argument("--bot", default="airline_faq", choices=rag_bots)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH, help="Results JSONL; an existing file is resumed.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Questions in flight at once.")
+    parser.add_argument("--fresh", action="store_true", help="Do not serve or store precomputed and cached answers (quality runs).")
+    parser.add_argument("--service-url", default=RAG_SERVICE_URL,
+                        help="Send the questions to a running rag_service.py (e.g. to warm its answer cache) instead of running the pipeline here.")
+    parser.add_argument("--restart", action="store_true", help="Discard the existing output instead of resuming it.")
+    parser.add_argument("--summary", help="Also write the run summary as JSON to this file.")
+    args = parser.parse_args()
+
+    if args.service_url and args.fresh:
+        sys.exit("❌ --fresh applies to the in-process pipeline; a running service always uses its caches.")
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    items = load_questions(args.questions)
+    done = answered_ids(args.output)
+    todo, seen = [], set(done)
+    for item in items:
+        if question_id(item) not in seen: # Also drops duplicates within the file
+            seen.add(question_id(item))
+            todo.append(item)
+    if done:
+        print(f"⏩ Resuming {args.output}: {len(items) - len(todo)} of {len(items)} question(s) already answered.")
+
+    if args.service_url:
+        client = HTTPRAGClient(args.service_url)
+        print(f"🌐 Sending {len(todo)} question(s) to {args.service_url} ({args.bot})")
+    else:
+        client = LocalRAGClient(RAGService(priority=PRIORITY_BACKGROUND, use_caches=not args.fresh))
+        print(f"🧠 Answering {len(todo)} question(s) with {args.bot}{' (fresh, no caches)' if args.fresh else ''}")
+
+    start = time.perf_counter()
+    results = run_batch(client, args.bot, todo, args.output, args.concurrency)
+    summary = summarize(results, time.perf_counter() - start, len(items) - len(todo))
+    print_summary(summary)
+    if not args.service_url:
+        print_cache_stats()
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+    print(f"💾 Results in {args.output}")
+    if summary["failed"]:
+        sys.exit(1) # Nightly jobs should notice; a rerun retries only the failures
@@ -1,29 +1,295 @@
-import boto3
+import os
 import json
+import time
+import heapq
+import itertools
+import threading
+from embedding_cache import get_embedding_cache
+from metrics import timed, registry
 
-def get_bedrock_runtime(region="us-east-1"):
-    return boto3.client("bedrock-runtime", region_name=region)
+# ---------- Configuration ----------
+# Override with environment variables to point at a different region or model.
+BEDROCK_REGION = os.environ.get("BEDROCK_REGION", "us-east-1")
+EMBEDDING_MODEL_ID = os.environ.get("BEDROCK_EMBEDDING_MODEL_ID", "amazon.titan-embed-text-v1")
+LLM_MODEL_ID = os.environ.get("BEDROCK_LLM_MODEL_ID", "anthropic.claude-v2:1") # Claude v2.1 or v3 Sonnet might offer better instruction following.
+MAX_POOL_CONNECTIONS = int(os.environ.get("BEDROCK_MAX_POOL_CONNECTIONS", "50")) # Keep >= ingest --max-workers
+MAX_RETRY_ATTEMPTS = int(os.environ.get("BEDROCK_MAX_RETRY_ATTEMPTS", "8"))
+# Requests per second admitted per model ID by the scheduler; models not listed are not limited.
+# Keep them at or below the account's Bedrock quotas, which ingest and chat traffic share.
+BEDROCK_RATE_LIMITS = {
+    "amazon.titan-embed-text-v2:0": float(os.environ.get("BEDROCK_EMBEDDING_V2_RPS", "30")), # Used by the titan-v2 index profiles
+    EMBEDDING_MODEL_ID: float(os.environ.get("BEDROCK_EMBEDDING_RPS", "30")),
+    LLM_MODEL_ID: float(os.environ.get("BEDROCK_LLM_RPS", "5")),
+}
+THROTTLE_BACKOFF = 0.5          # Rate multiplier after a throttled request
+RATE_RECOVERY = 0.01            # Fraction of the configured rate regained per unthrottled request
+MIN_RATE_FRACTION = 0.05        # Backoff never goes below this fraction of the configured rate
+THROTTLE_PAUSE_SECONDS = 0.5    # Pause of a model's queue after a ThrottlingException, doubled per consecutive one
+MAX_THROTTLE_PAUSE_SECONDS = 30.0
+MAX_THROTTLE_RETRIES = 3        # ThrottlingExceptions retried by the scheduler, on top of botocore's own retries
+# -----------------------------------
 
-def get_embedding(text, model_id="amazon.titan-embed-text-v1"):
+PRIORITY_INTERACTIVE = 0 # Chat questions, served first
+PRIORITY_BACKGROUND = 1  # Ingest and other batch work
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+# One client per region, shared by every thread and every Streamlit rerun in this process.
+# boto3 clients are thread-safe once created; the lock only guards creation.
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_bedrock_runtime(region=None):
+    """
+    Returns the process-wide bedrock-runtime client for a region, creating it on first use.
+    The client keeps a pool of up to MAX_POOL_CONNECTIONS HTTP connections open and uses
+    botocore's adaptive retry mode, which backs off client-side when Bedrock throttles.
+    """
+    region = region or BEDROCK_REGION
+    client = _clients.get(region)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(region)
+        if client is None:
+            # Imported on first use: boto3 and botocore add noticeably to the apps' cold start.
+            import boto3
+            from botocore.config import Config
+
+            config = Config(
+                max_pool_connections=MAX_POOL_CONNECTIONS,
+                retries={"mode": "adaptive", "max_attempts": MAX_RETRY_ATTEMPTS},
+            )
+            # A dedicated session: the default boto3 session is not safe to share across threads.
+            client = boto3.session.Session().client("bedrock-runtime", region_name=region, config=config)
+            _clients[region] = client
+    return client
+
+def set_bedrock_runtime(client, region=None):
+    """
+    Replaces the bedrock-runtime client used for a region, e.g. with a local stand-in for
+    benchmarks. Returns the previous client (None if none was created yet).
+    """
+    region = region or BEDROCK_REGION
+    with _clients_lock:
+        previous = _clients.get(region)
+        _clients[region] = client
+    return previous
+
+def _retry_attempts(response):
+    # botocore reports how many retries (e.g. after throttling) it made before this response.
+    return response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+
+
+# ---------- Request scheduler ----------
+# Every Bedrock request of this process first takes a token from its model's token bucket.
+# Requests waiting for a token queue by priority, then arrival, so a chat question overtakes an
+# ingest run's backlog instead of queueing behind it. The rate adapts: a ThrottlingException
+# halves the model's rate and pauses its queue, a response botocore had to retry halves the rate,
+# and every clean response wins back RATE_RECOVERY of the configured rate.
+
+class _ModelQueue:
+    def __init__(self, rate):
+        self.max_rate = rate
+        self.rate = rate
+        self.tokens = max(1.0, rate)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.consecutive_throttles = 0
+        self.waiters = [] # Heap of (priority, arrival) tickets
+
+
+class BedrockScheduler:
+    """
+    Token-bucket rate limits per model ID with priority lanes and adaptive backoff. Thread-safe;
+    exports queue depth, wait time, throttles and the current rate as skyconnect_bedrock_* metrics.
+    """
+
+    def __init__(self, rate_limits=None):
+        self.rate_limits = dict(BEDROCK_RATE_LIMITS if rate_limits is None else rate_limits)
+        self._queues = {}
+        self._cond = threading.Condition()
+        self._arrivals = itertools.count()
+
+    def _queue(self, model_id):
+        queue = self._queues.get(model_id)
+        if queue is None:
+            queue = self._queues[model_id] = _ModelQueue(self.rate_limits[model_id])
+            self._report_rate(model_id, queue)
+        return queue
+
+    def _report_depth(self, model_id, queue):
+        for priority, name in PRIORITY_NAMES.items():
+            depth = sum(1 for ticket in queue.waiters if ticket[0] == priority)
+            registry.set("skyconnect_bedrock_queue_depth", depth, "Bedrock requests waiting for the scheduler.", model_id=model_id, priority=name)
+
+    def _report_rate(self, model_id, queue):
+        registry.set("skyconnect_bedrock_rate_limit", queue.rate, "Requests per second currently admitted per model.", model_id=model_id)
+
+    def acquire(self, model_id, priority=PRIORITY_INTERACTIVE):
+        """
+        Blocks until a request to model_id may be sent.
+        :return: Seconds spent waiting.
+        """
+        if not self.rate_limits.get(model_id):
+            return 0.0
+        start = time.monotonic()
+        with self._cond:
+            queue = self._queue(model_id)
+            ticket = (priority, next(self._arrivals))
+            heapq.heappush(queue.waiters, ticket)
+            self._report_depth(model_id, queue)
+            while True:
+                now = time.monotonic()
+                queue.tokens = min(max(1.0, queue.rate), queue.tokens + (now - queue.updated) * queue.rate)
+                queue.updated = now
+                if queue.waiters[0] != ticket:
+                    self._cond.wait() # Woken when the head of the queue changes
+                    continue
+                if now >= queue.paused_until and queue.tokens >= 1:
+                    break
+                self._cond.wait(max(queue.paused_until - now, (1 - queue.tokens) / queue.rate, 0.001))
+            queue.tokens -= 1
+            heapq.heappop(queue.waiters)
+            self._report_depth(model_id, queue)
+            self._cond.notify_all()
+        waited = time.monotonic() - start
+        registry.observe("skyconnect_bedrock_wait_seconds", waited, "Time Bedrock requests waited for the scheduler.", model_id=model_id, priority=PRIORITY_NAMES[priority])
+        return waited
+
+    def throttled(self, model_id):
+        """
+        Records a ThrottlingException: lowers the model's rate and pauses its queue.
+        :return: False if the model is not rate limited, so nothing was paused.
+        """
+        registry.inc("skyconnect_bedrock_throttles_total", 1, "ThrottlingExceptions returned by Bedrock.", model_id=model_id)
+        if not self.rate_limits.get(model_id):
+            return False
+        with self._cond:
+            queue = self._queue(model_id)
+            queue.consecutive_throttles += 1
+            queue.rate = max(queue.max_rate * MIN_RATE_FRACTION, queue.rate * THROTTLE_BACKOFF)
+            queue.tokens = 0.0
+            pause = min(MAX_THROTTLE_PAUSE_SECONDS, THROTTLE_PAUSE_SECONDS * 2 ** (queue.consecutive_throttles - 1))
+            queue.paused_until = max(queue.paused_until, time.monotonic() + pause)
+            self._report_rate(model_id, queue)
+            self._cond.notify_all()
+        return True
+
+    def succeeded(self, model_id, retried=False):
+        """
+        Records a response. retried means botocore had to retry it, a sign of throttling too.
+        """
+        if not self.rate_limits.get(model_id):
+            return
+        with self._cond:
+            queue = self._queue(model_id)
+            if retried:
+                queue.rate = max(queue.max_rate * MIN_RATE_FRACTION, queue.rate * THROTTLE_BACKOFF)
+            else:
+                queue.consecutive_throttles = 0
+                queue.rate = min(queue.max_rate, queue.rate + queue.max_rate * RATE_RECOVERY)
+            self._report_rate(model_id, queue)
+
+    def stats(self):
+        with self._cond:
+            return {
+                model_id: {"rate": queue.rate, "max_rate": queue.max_rate, "waiting": len(queue.waiters),
+                           "paused_seconds": max(0.0, queue.paused_until - time.monotonic())}
+                for model_id, queue in self._queues.items()
+            }
+
+scheduler = BedrockScheduler()
+
+def set_scheduler(new_scheduler):
+    """
+    Replaces the scheduler every Bedrock call goes through, e.g. with an unthrottled
+    BedrockScheduler({}) when the runtime is a local stand-in. Returns the previous scheduler.
+    """
+    global scheduler
+    previous, scheduler = scheduler, new_scheduler
+    return previous
+
+def _is_throttling(error):
+    # botocore's ClientError carries the service error code; checked by name so botocore stays a lazy import.
+    response = getattr(error, "response", None)
+    return isinstance(response, dict) and response.get("Error", {}).get("Code") == "ThrottlingException"
+
+def _scheduled_call(model_id, priority, span, call):
+    """
+    Sends call() once the scheduler admits it, retrying it up to MAX_THROTTLE_RETRIES times after a
+    ThrottlingException. Adds priority, queue_seconds and throttles to span.
+    """
+    span["priority"] = PRIORITY_NAMES[priority]
+    span.setdefault("queue_seconds", 0.0)
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        span["queue_seconds"] += scheduler.acquire(model_id, priority)
+        try:
+            response = call()
+        except Exception as e:
+            if not _is_throttling(e):
+                raise
+            paused = scheduler.throttled(model_id)
+            span["throttles"] = span.get("throttles", 0) + 1
+            if attempt == MAX_THROTTLE_RETRIES:
+                raise
+            if not paused:
+                time.sleep(THROTTLE_PAUSE_SECONDS * 2 ** attempt)
+            continue
+        scheduler.succeeded(model_id, retried=_retry_attempts(response) > 0)
+        return response
+
+def _invoke_embedding(text, model_id, span=None, priority=PRIORITY_INTERACTIVE, dimensions=None):
     client = get_bedrock_runtime()
     payload = {
         "inputText": text
     }
+    if dimensions: # Titan v2 only: 256, 512 or 1024, unit-normalized
+        payload["dimensions"] = dimensions
+        payload["normalize"] = True
+    body = json.dumps(payload)
 
-    response = client.invoke_model(
+    response = _scheduled_call(model_id, priority, span if span is not None else {}, lambda: client.invoke_model(
         modelId=model_id,
         contentType="application/json",
-        body=json.dumps(payload)
-    )
+        body=body
+    ))
 
-    response_body = json.loads(response['body'].read())
+    raw = response['body'].read()
+    if span is not None:
+        span["request_bytes"] = len(body)
+        span["response_bytes"] = len(raw)
+        span["retries"] = _retry_attempts(response)
+    response_body = json.loads(raw)
     return response_body['embedding']
 
-def query_llm(question, context, persona_prompt_template):
+def get_embedding(text, model_id=None, use_cache=True, priority=PRIORITY_INTERACTIVE, dimensions=None):
+    """
+    Returns the embedding for text. Embeddings are looked up in the shared embedding cache
+    first (keyed by model ID and normalized text), so repeated chunks and questions skip Bedrock.
+    Timed as the "embed" stage, with cache_hit recorded. Pass priority=PRIORITY_BACKGROUND for
+    batch work, so it yields to chat questions in the scheduler. dimensions selects a smaller
+    output size on models that support it (Titan v2).
+    """
+    model_id = model_id or EMBEDDING_MODEL_ID
+    cache_key = f"{model_id}@{dimensions}" if dimensions else model_id
+    with timed("embed", model_id=model_id) as span:
+        if not use_cache:
+            return _invoke_embedding(text, model_id, span, priority, dimensions)
+
+        span["cache_hit"] = True
+        def compute(t):
+            span["cache_hit"] = False
+            return _invoke_embedding(t, model_id, span, priority, dimensions)
+        return get_embedding_cache().get_or_compute(cache_key, text, compute)
+
+def _build_llm_body(question, context, persona_prompt_template, history=None):
     # Updated prompt for more precise, context-bound answers
+    # history is an optional summary of earlier turns of the conversation (chat_history.py)
+    earlier = f"\nEarlier in this conversation:\n{history}\n" if history else ""
     prompt = f"""
 Human: {persona_prompt_template}
-
+{earlier}
 Context:
 {context}
 
@@ -31,8 +297,6 @@ Question: {question}
 
 Assistant:"""
 
-    bedrock = boto3.client('bedrock-runtime', region_name="us-east-1")
-
     body = {
         "prompt": prompt,
         "max_tokens_to_sample": 512, # Increased slightly for potentially more detailed context-based answers
@@ -40,13 +304,68 @@ Assistant:"""
         "top_p": 0.9,
         "stop_sequences": ["\n\nHuman:"]
     }
+    return json.dumps(body)
+
+def query_llm(question, context, persona_prompt_template, model_id=None, priority=PRIORITY_INTERACTIVE, history=None):
+    bedrock = get_bedrock_runtime()
+    model_id = model_id or LLM_MODEL_ID
+    body = _build_llm_body(question, context, persona_prompt_template, history)
+
+    with timed("llm", model_id=model_id, request_bytes=len(body)) as span:
+        response = _scheduled_call(model_id, priority, span, lambda: bedrock.invoke_model(
+            body=body,
+            modelId=model_id,
+            accept="application/json",
+            contentType="application/json"
+        ))
+
+        raw = response['body'].read()
+        span["response_bytes"] = len(raw)
+        span["retries"] = _retry_attempts(response)
+        response_body = json.loads(raw)
+        return response_body['completion'].strip()
+
+def query_llm_stream(question, context, persona_prompt_template, model_id=None, stats=None, priority=PRIORITY_INTERACTIVE, history=None):
+    """
+    Streams the answer with invoke_model_with_response_stream, yielding pieces of text as
+    Bedrock produces them. If a stats dict is passed, it receives ttft_seconds (time to the
+    first token) and total_seconds, both measured from the request being sent, so time spent
+    waiting for the scheduler (the span's queue_seconds) is not included. The whole stream is
+    timed as the "llm_stream" stage. history is an optional summary of earlier turns that is
+    added to the prompt.
+    """
+    bedrock = get_bedrock_runtime()
+    model_id = model_id or LLM_MODEL_ID
+    body = _build_llm_body(question, context, persona_prompt_template, history)
+
+    with timed("llm_stream", model_id=model_id, request_bytes=len(body)) as span:
+        start = time.perf_counter()
+        response = _scheduled_call(model_id, priority, span, lambda: bedrock.invoke_model_with_response_stream(
+            body=body,
+            modelId=model_id,
+            accept="application/json",
+            contentType="application/json"
+        ))
+        start += span["queue_seconds"] # Start the clock when the scheduler let the request go
+        span["retries"] = _retry_attempts(response)
+        span["response_bytes"] = 0
 
-    response = bedrock.invoke_model(
-        body=json.dumps(body),
-        modelId="anthropic.claude-v2:1", # Ensure this is the model you intend to use. Claude v2.1 or v3 Sonnet might offer better instruction following.
-        accept="application/json",
-        contentType="application/json"
-    )
+        first_token = True
+        for event in response['body']:
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            span["response_bytes"] += len(chunk['bytes'])
+            text = json.loads(chunk['bytes']).get('completion', '')
+            if first_token:
+                text = text.lstrip() # Claude opens its completion with whitespace
+                if not text:
+                    continue
+                first_token = False
+                span["ttft_seconds"] = time.perf_counter() - start
+                if stats is not None:
+                    stats["ttft_seconds"] = span["ttft_seconds"]
+            yield text
 
-    response_body = json.loads(response['body'].read())
-    return response_body['completion'].strip() 
\ No newline at end of file
+        if stats is not None:
+            stats["total_seconds"] = time.perf_counter() - start
@@ -0,0 +1,204 @@
+# benchmark.py
+import os
+import sys
+import json
+import glob
+import time
+import tempfile
+import argparse
+import platform
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# Benchmarks always start from empty caches, so cold-path regressions are not hidden by a warm
+# .cache/. This has to happen before embedding_cache is imported, which reads the directory.
+# Results still go to the real cache directory, captured first.
+REPORTS_DIR = os.path.join(os.environ.get("SKYCONNECT_CACHE_DIR", ".cache"), "reports")
+os.environ["SKYCONNECT_CACHE_DIR"] = tempfile.mkdtemp(prefix="skyconnect-bench-")
+
+import numpy as np
+import bedrock_client
+import opensearch_client
+import fake_services
+from fake_services import FakeBedrockRuntime, FakeOpenSearch
+from bedrock_client import BedrockScheduler, BEDROCK_RATE_LIMITS
+from rag_service import RAGService, LocalRAGClient
+from metrics import stage_seconds
+from chatbot_configs import CHATBOT_CONFIGS
+from eval_retrieval import load_eval_set, DEFAULT_EVAL_FILE
+from ingest import rebuild_index, DEFAULT_BATCH_SIZE, DEFAULT_MAX_WORKERS
+
+# Measures ingest throughput and RAG query latency with the local stand-ins from fake_services.py,
+# so no AWS access is needed. Latencies of the fakes are fixed, so differences between runs come
+# from this project's own code: chunking, batching, caching, retrieval and fusion. The Bedrock
+# scheduler runs unthrottled by default; its production rate limits would otherwise dominate
+# the numbers once the fake latencies are small.
+
+# ---------- Configuration ----------
+DEFAULT_RESULTS_PATH = os.path.join(REPORTS_DIR, "benchmark_results.json")
+DEFAULT_TOLERANCE = 0.2   # Relative slowdown against a baseline that counts as a regression
+BENCH_INDEX = "skyconnect-knowledge-base"
+BENCH_BOT = "airline_faq"
+RETRIEVE_STAGES = ("search_knn", "search_hybrid", "rerank") # rerank includes fetching candidate vectors
+# -----------------------------------
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    values = np.asarray(samples, dtype=np.float64) * 1000 # Reported in milliseconds
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "mean": float(values.mean()), "max": float(values.max())}
+
+def bench_ingest(pdf_files, batch_size, max_workers, processes):
+    """
+    Rebuilds the benchmark index from pdf_files through ingest.rebuild_index.
+
+    :return: Dict with chunks, wall seconds and chunks per second.
+    """
+    start = time.perf_counter()
+    totals = rebuild_index(pdf_files, BENCH_INDEX, batch_size, max_workers, backend=opensearch_client, processes=processes)
+    seconds = time.perf_counter() - start
+    return {
+        "files": len(pdf_files),
+        "chunks": totals["indexed"],
+        "failed": totals["failed"],
+        "seconds": seconds,
+        "chunks_per_second": totals["indexed"] / seconds if seconds > 0 else 0.0,
+    }
+
+def bench_queries(questions, retrieval_mode, rounds, concurrency, use_answer_cache):
+    """
+    Replays questions through rag_service.RAGService, the pipeline the chat apps are served by
+    (precomputed answers, answer cache, request coalescing, retrieval, context, streaming), with
+    the airline bot pointed at the benchmark index. Stage timings come from the request spans.
+    """
+    config = {**CHATBOT_CONFIGS[BENCH_BOT], "opensearch_index_name": BENCH_INDEX, "retrieval_backend": "opensearch", "retrieval_mode": retrieval_mode}
+    client = LocalRAGClient(RAGService(configs={BENCH_BOT: config}, use_caches=use_answer_cache))
+    workload = [question for _ in range(rounds) for question in questions]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        runs = list(executor.map(lambda question: client.answer(BENCH_BOT, question), workload))
+    seconds = time.perf_counter() - start
+
+    stages = [stage_seconds(run["spans"]) for run in runs]
+    retrieved = [sum(run_stages.get(stage, 0.0) for stage in RETRIEVE_STAGES) for run_stages in stages if any(stage in run_stages for stage in RETRIEVE_STAGES)]
+    context_tokens = [span["estimated_tokens"] for run in runs for span in run["spans"] if span["stage"] == "context"]
+    return {
+        "queries": len(runs),
+        "concurrency": concurrency,
+        "retrieval_mode": retrieval_mode,
+        "answer_cache": use_answer_cache,
+        "answer_cache_hits": sum(1 for run in runs if run["cached"]),
+        "queries_per_second": len(runs) / seconds if seconds > 0 else 0.0,
+        "embed_ms": percentiles([run_stages.get("embed", 0.0) for run_stages in stages]),
+        "retrieve_ms": percentiles(retrieved),
+        "ttft_ms": percentiles([run["ttft_seconds"] for run in runs]),
+        "total_ms": percentiles([run["total_seconds"] for run in runs]),
+        "context_tokens_mean": float(np.mean(context_tokens or [0])),
+    }
+
+# Metrics compared against a baseline: (path in the results, True if higher is better)
+REGRESSION_METRICS = [
+    (("ingest", "chunks_per_second"), True),
+    (("query", "total_ms", "p50"), False),
+    (("query", "total_ms", "p95"), False),
+    (("query", "retrieve_ms", "p95"), False),
+]
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    :return: List of human-readable descriptions of metrics that got worse by more than tolerance.
+    """
+    regressions = []
+    for path, higher_is_better in REGRESSION_METRICS:
+        try:
+            current, previous = results, baseline
+            for key in path:
+                current, previous = current[key], previous[key]
+        except KeyError:
+            continue
+        if not previous:
+            continue
+        change = (current - previous) / previous
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append(f"{'.'.join(path)}: {previous:.2f} -> {current:.2f} ({change:+.0%})")
+    return regressions
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline ingest and RAG latency benchmark with local stand-ins for Bedrock and OpenSearch.")
+    parser.add_argument("--pdfs", nargs="+", default=sorted(glob.glob("data/*.pdf")))
+    parser.add_argument("--eval-file", default=DEFAULT_EVAL_FILE, help="Questions to replay (JSONL with a question field).")
+    parser.add_argument("--rounds", type=int, default=3, help="Times each question is replayed.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Queries in flight at once.")
+    parser.add_argument("--retrieval-mode", choices=["knn", "hybrid"], default="hybrid")
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="Serve repeated questions from precomputed answers and the semantic answer cache, as the chat apps do.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--embedding-latency", type=float, default=fake_services.FAKE_EMBEDDING_LATENCY, help="Seconds per fake embedding call.")
+    parser.add_argument("--llm-ttft", type=float, default=fake_services.FAKE_LLM_TTFT, help="Seconds before the fake LLM's first token.")
+    parser.add_argument("--llm-token-latency", type=float, default=fake_services.FAKE_LLM_TOKEN_LATENCY)
+    parser.add_argument("--search-latency", type=float, default=fake_services.FAKE_SEARCH_LATENCY, help="Seconds per fake OpenSearch round trip.")
+    parser.add_argument("--rate-limits", choices=["none", "production"], default="none",
+                        help="Bedrock scheduler limits: none (unthrottled) or production (BEDROCK_RATE_LIMITS), e.g. to see queueing under load.")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_PATH)
+    parser.add_argument("--baseline", help="Earlier results file; exit with status 1 if a key metric regressed.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    fake_bedrock = FakeBedrockRuntime(args.embedding_latency, args.llm_ttft, args.llm_token_latency)
+    bedrock_client.set_bedrock_runtime(fake_bedrock)
+    rate_limits = dict(BEDROCK_RATE_LIMITS) if args.rate_limits == "production" else {}
+    bedrock_client.set_scheduler(BedrockScheduler(rate_limits))
+    print(f"🚦 Bedrock rate limits: {', '.join(f'{model_id} {rps:g} rps' for model_id, rps in rate_limits.items()) or 'none (unthrottled)'}")
+    opensearch_client.set_client(FakeOpenSearch(args.search_latency, serializer=opensearch_client.serializer))
+
+    print(f"\n--- Ingest: {len(args.pdfs)} PDF(s) ---")
+    ingest_results = bench_ingest(args.pdfs, args.batch_size, args.max_workers, args.processes)
+
+    questions = [item["question"] for item in load_eval_set(args.eval_file)]
+    print(f"\n--- Queries: {len(questions)} questions x {args.rounds} round(s), concurrency {args.concurrency} ---")
+    query_results = bench_queries(questions, args.retrieval_mode, args.rounds, args.concurrency, args.answer_cache)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "fakes": {
+            "embedding_latency": args.embedding_latency,
+            "llm_ttft": args.llm_ttft,
+            "llm_token_latency": args.llm_token_latency,
+            "search_latency": args.search_latency,
+            "rate_limits": rate_limits,
+        },
+        "ingest": ingest_results,
+        "query": query_results,
+        "bedrock_calls": dict(fake_bedrock.calls),
+        "transport": opensearch_client.get_transport_stats(),
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n📊 Ingest: {ingest_results['chunks']} chunks in {ingest_results['seconds']:.2f}s — {ingest_results['chunks_per_second']:.1f} chunks/sec")
+    for name in ["embed_ms", "retrieve_ms", "ttft_ms", "total_ms"]:
+        stats = query_results[name]
+        print(f"⏱️ {name:<12} p50 {stats['p50']:8.1f}  p95 {stats['p95']:8.1f}  p99 {stats['p99']:8.1f}")
+    print(f"💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%} against {args.baseline}:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
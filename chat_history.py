@@ -0,0 +1,148 @@
+# chat_history.py
+import os
+import itertools
+
+# ---------- Configuration ----------
+CHAT_WINDOW_MESSAGES = int(os.environ.get("SKYCONNECT_CHAT_WINDOW_MESSAGES", 20))     # Recent messages rendered live on every rerun
+CHAT_HISTORY_PAGE_SIZE = 20                                                           # Older messages shown per page when expanded
+CHAT_MAX_MESSAGES = int(os.environ.get("SKYCONNECT_CHAT_MAX_MESSAGES", 200))          # Messages kept per bot; older ones go to the summary
+SESSION_MEMORY_CHARS = int(os.environ.get("SKYCONNECT_SESSION_MEMORY_CHARS", 200_000)) # Ceiling on kept message text across all bots of a session
+SUMMARY_MAX_CHARS = 2000                                                              # Summary of dropped turns, per bot
+SUMMARY_LINE_CHARS = 160                                                              # Each summarized question or answer is cut to this
+# -----------------------------------
+
+# Streamlit re-runs the whole script on every interaction, so anything kept in session_state is
+# re-rendered and held in memory for as long as the session lives. ChatHistory keeps one
+# conversation per bot, bounded three ways:
+#   - only the last CHAT_WINDOW_MESSAGES are meant to be rendered on every rerun; older kept
+#     messages are paged on demand,
+#   - each bot keeps at most CHAT_MAX_MESSAGES,
+#   - all bots of a session together keep at most SESSION_MEMORY_CHARS of text. Messages are
+#     dropped from the least recently used bot first, and never from the active bot's window.
+# Dropped messages are folded into a short per-bot summary (questions asked and the first
+# sentence of each answer), so earlier turns stay visible as context.
+
+_use_clock = itertools.count() # Orders conversations by last use
+
+def _first_sentence(text, max_chars=SUMMARY_LINE_CHARS):
+    text = " ".join(text.split())
+    end = text.find(". ")
+    if 0 < end < max_chars:
+        return text[:end + 1]
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+
+class _Conversation:
+    def __init__(self):
+        self.messages = []
+        self.summary_lines = []
+        self.dropped = 0
+        self.chars = 0
+        self.last_used = next(_use_clock)
+
+
+class ChatHistory:
+    """
+    Bounded per-bot chat history for one Streamlit session. Messages are dicts with role and content.
+    """
+
+    def __init__(self, window=CHAT_WINDOW_MESSAGES, max_messages=CHAT_MAX_MESSAGES, max_chars=SESSION_MEMORY_CHARS):
+        self.window = window
+        self.max_messages = max_messages
+        self.max_chars = max_chars
+        self.active_bot = None
+        self._conversations = {}
+
+    def activate(self, bot_key, initial_message=None):
+        """
+        Makes bot_key the active conversation, starting it with initial_message if it is new.
+        :return: True if the conversation was created.
+        """
+        self.active_bot = bot_key
+        conversation = self._conversations.get(bot_key)
+        created = conversation is None
+        if created:
+            conversation = self._conversations[bot_key] = _Conversation()
+            if initial_message:
+                self.append("assistant", initial_message)
+        conversation.last_used = next(_use_clock)
+        return created
+
+    def append(self, role, content, bot_key=None):
+        conversation = self._conversations[bot_key or self.active_bot]
+        conversation.messages.append({"role": role, "content": content})
+        conversation.chars += len(content)
+        conversation.last_used = next(_use_clock)
+        self._enforce_limits()
+
+    def clear(self, bot_key=None):
+        self._conversations.pop(bot_key or self.active_bot, None)
+
+    def recent(self, bot_key=None):
+        """
+        :return: The messages of the live window, oldest first.
+        """
+        conversation = self._conversations.get(bot_key or self.active_bot)
+        return conversation.messages[-self.window:] if conversation else []
+
+    def older_pages(self, bot_key=None):
+        conversation = self._conversations.get(bot_key or self.active_bot)
+        older = len(conversation.messages) - self.window if conversation else 0
+        return max(0, -(-older // CHAT_HISTORY_PAGE_SIZE))
+
+    def older_page(self, page, bot_key=None):
+        """
+        :param page: 1 is the page right before the live window, higher pages go further back.
+        :return: The kept messages on that page, oldest first.
+        """
+        conversation = self._conversations.get(bot_key or self.active_bot)
+        if not conversation or page < 1:
+            return []
+        end = len(conversation.messages) - self.window - (page - 1) * CHAT_HISTORY_PAGE_SIZE
+        return conversation.messages[max(0, end - CHAT_HISTORY_PAGE_SIZE):max(0, end)]
+
+    def summary(self, bot_key=None):
+        conversation = self._conversations.get(bot_key or self.active_bot)
+        return "\n".join(conversation.summary_lines) if conversation else ""
+
+    def dropped(self, bot_key=None):
+        conversation = self._conversations.get(bot_key or self.active_bot)
+        return conversation.dropped if conversation else 0
+
+    def total_chars(self):
+        return sum(conversation.chars for conversation in self._conversations.values())
+
+    def stats(self):
+        return {
+            "bots": len(self._conversations),
+            "messages": sum(len(c.messages) for c in self._conversations.values()),
+            "chars": self.total_chars(),
+            "dropped": sum(c.dropped for c in self._conversations.values()),
+        }
+
+    def _drop_oldest(self, conversation):
+        message = conversation.messages.pop(0)
+        conversation.chars -= len(message["content"])
+        conversation.dropped += 1
+        prefix = "Q: " if message["role"] == "user" else "A: "
+        conversation.summary_lines.append(prefix + _first_sentence(message["content"]))
+        while sum(len(line) + 1 for line in conversation.summary_lines) > SUMMARY_MAX_CHARS:
+            conversation.summary_lines.pop(0)
+
+    def _enforce_limits(self):
+        for conversation in self._conversations.values():
+            while len(conversation.messages) > self.max_messages:
+                self._drop_oldest(conversation)
+
+        total = self.total_chars()
+        if total <= self.max_chars:
+            return
+        active = self._conversations.get(self.active_bot)
+        for conversation in sorted(self._conversations.values(), key=lambda c: c.last_used):
+            keep = self.window if conversation is active else 0
+            while total > self.max_chars and len(conversation.messages) > keep:
+                before = conversation.chars
+                self._drop_oldest(conversation)
+                total -= before - conversation.chars
+            if total <= self.max_chars:
+                return
@@ -0,0 +1,39 @@
+# chat_stream.py
+import time
+
+# Rendering of streamed RAG answers, shared by app.py and multiApp.py. Kept free of Streamlit
+# and boto3 imports: it only needs a placeholder with a markdown() method.
+
+SORRY_MESSAGE = "Sorry, something went wrong while answering. Please try again."
+
+def answer_pieces(events, turn=None):
+    """
+    Yields the answer text of rag_service events (delta events, or an apology for an error
+    event). If a turn dict is passed, it receives the other events by type (meta, done, error).
+    """
+    for event in events:
+        if event["type"] == "delta":
+            yield event["text"]
+        elif event["type"] == "error":
+            if turn is not None:
+                turn["error"] = event
+            yield SORRY_MESSAGE
+        elif turn is not None:
+            turn[event["type"]] = event
+
+def render_stream(placeholder, text_stream, request_start):
+    """
+    Writes each streamed piece into the placeholder. Returns the full answer and the
+    time to first token, measured from request_start.
+    """
+    answer = ""
+    ttft = None
+    for piece in text_stream:
+        if ttft is None:
+            ttft = time.perf_counter() - request_start
+        answer += piece
+        placeholder.markdown(answer + "▌")
+    placeholder.markdown(answer)
+    if ttft is None:
+        ttft = time.perf_counter() - request_start
+    return answer.strip(), ttft
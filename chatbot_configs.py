@@ -0,0 +1,64 @@
+# chatbot_configs.py
+
+# One entry per bot. The UI keys (titles, colors, avatar, ...) are used by multiApp.py; the
+# retrieval and generation keys (opensearch_index_name, retrieval_*, llm_persona_prompt, ...) by
+# rag_service.py. Bots with "rag_enabled" set are answered by the RAG pipeline.
+CHATBOT_CONFIGS = {
+    "airline_faq": {
+        "display_name": "✈️ SkyConnect Airlines Concierge",
+        "page_title": "SkyConnect Chatbot", # Used for initial st.set_page_config
+        "page_icon": "✈️",                 # Used for initial st.set_page_config
+        "header_title": "✈️ SkyConnect Airlines Concierge",
+        "header_subtitle": "Your personal assistant for flight schedules, baggage policies, and more!",
+        "header_title_color": "#000001",  # CHANGED TO BLACK
+        "header_subtitle_color": "#000001",
+        "background_image_url": "https://img.freepik.com/free-photo/airplane-runway-airport-sunset-travel-concept_587448-8154.jpg?ga=GA1.1.1907611749.1748313800&semt=ais_hybrid&w=740",
+        "rag_enabled": True, # Answered by rag_service.py; the other bots are UI placeholders for now
+        "opensearch_index_name": "skyconnect-knowledge-base",
+        "retrieval_backend": "opensearch", # "opensearch" or "local" (in-process vector store, see local_vector_store.py)
+        "local_hnsw": False, # Local backend only: approximate HNSW search (needs hnswlib) instead of exact scoring
+        "index_profile": "nmslib-float", # Embedding model and vector storage; compare with index_report.py, switch with ingest.py --mode rebuild
+        "retrieval_mode": "hybrid", # "knn" or "hybrid" (BM25 + k-NN fused with reciprocal rank fusion)
+        "hybrid_weights": {"lexical": 1.0, "vector": 1.0}, # Tune with eval_retrieval.py
+        "retrieval_k": 3, # Chunks retrieved per question
+        "rerank": {"candidates": 20, "lambda": 0.7, "min_relevance": None}, # MMR over 20 candidates; omit to disable (see rerank.py)
+        "context_token_budget": 1200, # Estimated prompt tokens for retrieved context; see context_builder.py
+        "answer_cache_similarity_threshold": 0.92, # Cosine similarity needed to reuse a cached answer
+        "faq": {"similarity_threshold": 0.93}, # Serve answers precomputed by faq_precompute.py to questions this close; omit to disable
+        "no_context_message": "I couldn't find specific information related to your query in my current knowledge base. Could you please try rephrasing, or ask about a different topic like flight schedules or baggage policies?",
+        "initial_assistant_message": "Hi there! I'm your SkyConnect Airlines Concierge. How can I assist you today regarding flights, baggage, or our policies?",
+        "assistant_avatar": "✈️",
+        "chat_input_placeholder": "Ask about SkyConnect flights or policies...",
+        "llm_persona_prompt": """You are SkyConnect Airlines' friendly and helpful assistant...""" # Truncated for brevity
+    },
+    "university_course": {
+        "display_name": "🎓 University Course Advisor",
+        "page_title": "University Course Chatbot",
+        "page_icon": "🎓",
+        "header_title": "🎓 University Course Advisor",
+        "header_subtitle": "Ask about course details, prerequisites, and academic programs.",
+        "header_title_color": "#000001",
+        "header_subtitle_color": "#000001",
+        "background_image_url": "https://images.pexels.com/photos/267885/pexels-photo-267885.jpeg?auto=compress&cs=tinysrgb&w=1260&h=750&dpr=1",
+        "opensearch_index_name": "university-course-knowledge-base",
+        "initial_assistant_message": "Hello! I'm the University Course Advisor. Backend for this bot is under construction.",
+        "assistant_avatar": "🎓",
+        "chat_input_placeholder": "Ask about courses (UI Demo)...",
+        "llm_persona_prompt": "Placeholder persona for University Bot."
+    },
+    "coffee_shop": {
+        "display_name": "☕ Coffee Corner Bot",
+        "page_title": "Coffee Corner Chatbot",
+        "page_icon": "☕",
+        "header_title": "☕ Coffee Corner Bot",
+        "header_subtitle": "Your guide to our menu, special offers, and opening hours!",
+        "header_title_color": "#000001",
+        "header_subtitle_color": "#000001",
+        "background_image_url": "https://images.pexels.com/photos/302899/pexels-photo-302899.jpeg?auto=compress&cs=tinysrgb&w=1260&h=750&dpr=1",
+        "opensearch_index_name": "coffee-shop-knowledge-base",
+        "initial_assistant_message": "Welcome to Coffee Corner! Backend for this bot is coming soon.",
+        "assistant_avatar": "☕",
+        "chat_input_placeholder": "Ask about our coffee (UI Demo)...",
+        "llm_persona_prompt": "Placeholder persona for Coffee Bot."
+    }
+}
@@ -0,0 +1,174 @@
+# context_builder.py
+import os
+import re
+from embedding_cache import normalize_text
+
+# ---------- Configuration ----------
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1200  # Prompt tokens the retrieved context may use, unless a bot sets context_token_budget
+CHARS_PER_TOKEN = 4                  # Rough estimate for English text with Claude's tokenizer
+MIN_OVERLAP_CHARS = 20               # Shortest suffix/prefix match treated as chunk overlap rather than coincidence
+MIN_DUPLICATE_LINE_CHARS = 40        # Shorter repeated lines (headings, "Flight:" labels) are kept
+MIN_TRUNCATED_TOKENS = 60            # Don't squeeze in a passage cut shorter than this
+PASSAGE_SEPARATOR = "\n\n---\n\n"
+# -----------------------------------
+
+# Ingest splits documents with chunk_overlap, so neighbouring chunks of one file share up to
+# CHUNK_OVERLAP characters and top-k hits often repeat text. build_context turns ranked hits into
+# a prompt context that:
+#   1. drops hits whose text is already contained in a better-ranked hit,
+#   2. merges chunks of the same file whose end and start overlap into one passage,
+#   3. compacts whitespace (PyPDF2 puts most words of our PDFs on their own line, padded with blank
+#      lines, which costs tokens but carries no structure) and removes lines repeated from an
+#      earlier passage,
+#   4. keeps passages in relevance order until the token budget is full (the last one may be cut
+#      at a sentence or line break), then
+#   5. lays them out grouped by file and in page order, each labelled with its source.
+
+_WHITESPACE_RUN = re.compile(r"\s+")
+
+def compact_whitespace(text):
+    """
+    Turns whitespace runs spanning three or more line breaks into one line break (item or
+    paragraph boundaries in our PDFs) and every other run into a single space.
+    """
+    return _WHITESPACE_RUN.sub(lambda m: "\n" if m.group().count("\n") >= 3 else " ", text).strip()
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _overlap(a, b, min_overlap=MIN_OVERLAP_CHARS):
+    """
+    Length of the longest suffix of a that is also a prefix of b, or 0 if shorter than min_overlap.
+    """
+    if len(a) < min_overlap or len(b) < min_overlap:
+        return 0
+    probe = b[:min_overlap]
+    start = a.find(probe)
+    while start != -1: # Earliest match first, so the first one that fits is the longest overlap
+        size = len(a) - start
+        if size <= len(b) and b.startswith(a[start:]):
+            return size
+        start = a.find(probe, start + 1)
+    return 0
+
+def _passage(hit, rank):
+    source = hit.get("_source", hit)
+    return {
+        "text": source["chunk_text"].strip(),
+        "source_file": source.get("source_file"),
+        "page_start": source.get("page_start"),
+        "page_end": source.get("page_end"),
+        "rank": rank,
+    }
+
+def _merge_overlapping(passages):
+    # Repeatedly joins two passages of the same file where one ends with the start of the other.
+    merged = True
+    while merged:
+        merged = False
+        for i, first in enumerate(passages):
+            for j, second in enumerate(passages):
+                if i == j or first["source_file"] != second["source_file"]:
+                    continue
+                size = _overlap(first["text"], second["text"])
+                if not size:
+                    continue
+                first["text"] += second["text"][size:]
+                pages = [p for p in (first["page_start"], first["page_end"], second["page_start"], second["page_end"]) if p is not None]
+                if pages:
+                    first["page_start"], first["page_end"] = min(pages), max(pages)
+                first["rank"] = min(first["rank"], second["rank"])
+                del passages[j]
+                merged = True
+                break
+            if merged:
+                break
+    return passages
+
+def _drop_repeated_lines(passages):
+    seen = set()
+    for passage in sorted(passages, key=lambda p: p["rank"]): # Better-ranked passages keep their lines
+        kept = []
+        for line in compact_whitespace(passage["text"]).split("\n"):
+            key = normalize_text(line)
+            if len(key) >= MIN_DUPLICATE_LINE_CHARS:
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.append(line)
+        passage["text"] = "\n".join(kept).strip()
+    return [passage for passage in passages if passage["text"]]
+
+def _truncate(text, max_chars):
+    # Cuts at the last sentence end or line break before max_chars, falling back to a word boundary.
+    cut = text[:max_chars]
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    if boundary < max_chars // 2:
+        boundary = cut.rfind(" ")
+    return cut[:boundary + 1].rstrip() + " …" if boundary > 0 else ""
+
+def _label(passage):
+    name = os.path.basename(passage["source_file"]) if passage["source_file"] else "unknown source"
+    if passage["page_start"] is None:
+        return f"[{name}]"
+    if passage["page_end"] in (None, passage["page_start"]):
+        return f"[{name}, p. {passage['page_start']}]"
+    return f"[{name}, pp. {passage['page_start']}-{passage['page_end']}]"
+
+def build_context(hits, token_budget=None, separator=PASSAGE_SEPARATOR, source_labels=True):
+    """
+    Builds the LLM context from ranked search hits (best first).
+
+    :param token_budget: Estimated tokens the context may use. Defaults to DEFAULT_CONTEXT_TOKEN_BUDGET.
+    :return: Tuple of (context text, stats dict with hits, passages, input_chars, output_chars,
+             estimated_tokens and truncated).
+    """
+    token_budget = token_budget or DEFAULT_CONTEXT_TOKEN_BUDGET
+    passages = []
+    seen_texts = []
+    for rank, hit in enumerate(hits):
+        passage = _passage(hit, rank)
+        key = normalize_text(passage["text"])
+        if not key or any(key in other for other in seen_texts): # Same text, or contained in a better hit
+            continue
+        seen_texts.append(key)
+        passages.append(passage)
+
+    passages = _drop_repeated_lines(_merge_overlapping(passages))
+
+    selected = []
+    truncated = False
+    remaining = token_budget
+    for passage in sorted(passages, key=lambda p: p["rank"]):
+        label = _label(passage) + "\n" if source_labels else ""
+        cost = estimate_tokens(label + passage["text"] + separator)
+        if cost <= remaining:
+            selected.append(passage)
+            remaining -= cost
+            continue
+        room = (remaining - estimate_tokens(label + separator)) * CHARS_PER_TOKEN
+        if room < MIN_TRUNCATED_TOKENS * CHARS_PER_TOKEN:
+            continue # A shorter, less relevant passage may still fit
+        passage["text"] = _truncate(passage["text"], room)
+        if passage["text"]:
+            selected.append(passage)
+            truncated = True
+        break # The budget is now full
+
+    # Group by file, files in order of their best passage, passages in page order
+    file_rank = {}
+    for passage in selected:
+        file_rank[passage["source_file"]] = min(file_rank.get(passage["source_file"], passage["rank"]), passage["rank"])
+    selected.sort(key=lambda p: (file_rank[p["source_file"]], p["page_start"] or 0, p["rank"]))
+
+    blocks = [(_label(p) + "\n" if source_labels else "") + p["text"] for p in selected]
+    context = separator.join(blocks)
+    stats = {
+        "hits": len(hits),
+        "passages": len(selected),
+        "input_chars": sum(len(hit.get("_source", hit)["chunk_text"]) for hit in hits),
+        "output_chars": len(context),
+        "estimated_tokens": estimate_tokens(context),
+        "truncated": truncated,
+    }
+    return context, stats
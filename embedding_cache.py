@@ -0,0 +1,166 @@
+# embedding_cache.py
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+# ---------- Configuration ----------
+CACHE_DIR = os.environ.get("SKYCONNECT_CACHE_DIR", ".cache")
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite3")
+MEMORY_CACHE_SIZE = 2048          # Embeddings kept in the in-process LRU tier
+DISK_CACHE_MAX_ENTRIES = 200000   # Rows kept on disk before the least recently used are evicted
+# -----------------------------------
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_text(text):
+    """
+    Collapses runs of whitespace and strips the ends, so chunks that only differ in
+    PDF layout spacing share one cache entry.
+    """
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+def cache_key(model_id, text):
+    """
+    Content address of an embedding: the model ID plus a SHA-256 of the normalized text.
+    """
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_id}:{digest}"
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-memory LRU in front of a SQLite store on disk.
+    Safe to share between threads; the SQLite file can be shared between processes
+    (e.g. ingest.py and the Streamlit app).
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, memory_size=MEMORY_CACHE_SIZE, max_entries=DISK_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model_id TEXT NOT NULL, embedding BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def _remember(self, key, embedding):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, model_id, text):
+        """
+        Returns the cached embedding for (model_id, text), or None on a miss.
+        """
+        key = cache_key(model_id, text)
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return embedding
+
+            row = self._conn.execute("SELECT embedding FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            embedding = array("f", row[0]).tolist()
+            self._conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self._remember(key, embedding)
+            self.disk_hits += 1
+            return embedding
+
+    def put(self, model_id, text, embedding):
+        key = cache_key(model_id, text)
+        blob = array("f", embedding).tobytes()
+        with self._lock:
+            self._remember(key, list(embedding))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model_id, embedding, last_used) VALUES (?, ?, ?, ?)",
+                (key, model_id, blob, time.time()),
+            )
+            self._conn.commit()
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 100:
+                self._evict()
+
+    def get_or_compute(self, model_id, text, compute):
+        """
+        Returns the cached embedding, calling compute(text) and storing the result on a miss.
+        """
+        embedding = self.get(model_id, text)
+        if embedding is None:
+            embedding = compute(text)
+            self.put(model_id, text, embedding)
+        return embedding
+
+    def _evict(self):
+        # Caller holds the lock.
+        self._writes_since_evict = 0
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            (disk_entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "lookups": lookups,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_embedding_cache():
+    """
+    Returns the process-wide EmbeddingCache, opening it on first use.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
+
+def print_cache_stats():
+    stats = get_embedding_cache().stats()
+    print(
+        f"🧠 Embedding cache: {stats['hit_rate']:.0%} hit rate "
+        f"({stats['memory_hits']} memory, {stats['disk_hits']} disk, {stats['misses']} misses; "
+        f"{stats['disk_entries']} entries on disk)"
+    )
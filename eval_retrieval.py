@@ -0,0 +1,94 @@
+# eval_retrieval.py
+import json
+import argparse
+from embedding_cache import normalize_text
+from retrieval import get_backend, embed_for_bot, BACKENDS, DEFAULT_BACKEND
+from rerank import rerank_hits, DEFAULT_CANDIDATES, DEFAULT_LAMBDA
+from index_profiles import get_profile, encode_vector
+
+DEFAULT_EVAL_FILE = "data/retrieval_eval.jsonl"
+
+# Each line of the eval file is {"question": ..., "expected": ...}. A question counts as recalled at k
+# if any of the top k chunks contains the expected text (compared with whitespace normalized).
+
+def load_eval_set(path=DEFAULT_EVAL_FILE):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def recall_at_k(eval_set, retrieve, k, embed=None, batch=False):
+    """
+    :param retrieve: Function (question, query_embedding, k) -> list of hits. With batch=True,
+                     (questions, query_embeddings, k) -> list of hit lists, so every question
+                     can go out in one request (e.g. search_chunks_batch).
+    :param embed: Function question -> query_embedding; defaults to the default index profile's model.
+    :return: Tuple of (recall, list of questions that were missed).
+    """
+    embed = embed or (lambda question: embed_for_bot({}, question))
+    questions = [item["question"] for item in eval_set]
+    embeddings = [embed(question) for question in questions]
+    if batch:
+        hit_lists = retrieve(questions, embeddings, k)
+    else:
+        hit_lists = [retrieve(question, embedding, k) for question, embedding in zip(questions, embeddings)]
+    missed = []
+    for item, hits in zip(eval_set, hit_lists):
+        expected = normalize_text(item["expected"])
+        if not any(expected in normalize_text(hit["_source"]["chunk_text"]) for hit in hits):
+            missed.append(item["question"])
+    return 1 - len(missed) / len(eval_set), missed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare recall@k of k-NN-only, hybrid and MMR re-ranked hybrid retrieval.")
+    parser.add_argument("--index", default="skyconnect-knowledge-base")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND)
+    parser.add_argument("--eval-file", default=DEFAULT_EVAL_FILE)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--lexical-weight", type=float, default=1.0)
+    parser.add_argument("--vector-weight", type=float, default=1.0)
+    parser.add_argument("--candidates", type=int, default=DEFAULT_CANDIDATES, help="Hits re-ranked by MMR in hybrid+mmr.")
+    parser.add_argument("--mmr-lambda", type=float, default=DEFAULT_LAMBDA)
+    parser.add_argument("--index-profile", default=None, help="The profile the index was built with (see index_profiles.py).")
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend)
+    eval_set = load_eval_set(args.eval_file)
+    profile = get_profile(args.index_profile)
+    embed = lambda question: embed_for_bot({"index_profile": profile["name"]}, question)
+    modes = {
+        "knn": lambda questions, embeddings, k: backend.search_chunks_batch(args.index, [encode_vector(profile, embedding) for embedding in embeddings], k=k),
+        "hybrid": lambda question, embedding, k: backend.hybrid_search_chunks(
+            args.index, question, encode_vector(profile, embedding), k=k,
+            lexical_weight=args.lexical_weight, vector_weight=args.vector_weight
+        ),
+        "hybrid+mmr": lambda question, embedding, k: rerank_hits(
+            backend.hybrid_search_chunks(
+                args.index, question, encode_vector(profile, embedding), k=args.candidates, candidates=args.candidates,
+                lexical_weight=args.lexical_weight, vector_weight=args.vector_weight
+            ),
+            embedding, k, args.mmr_lambda, backend=backend, index_name=args.index
+        ),
+    }
+
+    print(f"\n--- Retrieval eval: {len(eval_set)} questions on {args.index} ({args.backend}, {profile['name']} profile) ---")
+    print(f"{'k':>3} " + " ".join(f"{mode:>8}" for mode in modes))
+    missed_by_mode = {}
+    for k in args.k:
+        row = []
+        for mode, retrieve in modes.items():
+            recall, missed = recall_at_k(eval_set, retrieve, k, embed, batch=mode == "knn") # k-NN queries go out in one _msearch
+            missed_by_mode[mode] = missed
+            row.append(f"{recall:>8.0%}")
+        print(f"{k:>3} " + " ".join(row))
+
+    for mode, missed in missed_by_mode.items():
+        if missed:
+            print(f"\n❓ Missed by {mode} at k={args.k[-1]}:")
+            for question in missed:
+                print(f"   - {question}")
+
+    if hasattr(backend, "get_transport_stats"):
+        stats = backend.get_transport_stats()
+        print(
+            f"\n📦 {stats['responses']} responses, avg {stats['avg_response_bytes'] / 1024:.1f} KB, "
+            f"avg {stats['avg_deserialize_ms']:.2f} ms to deserialize"
+        )
@@ -0,0 +1,279 @@
+# fake_services.py
+import io
+import re
+import json
+import math
+import time
+import zlib
+import threading
+import numpy as np
+
+# Deterministic local stand-ins for the bedrock-runtime client and the OpenSearch client, so the
+# RAG pipeline can be run and measured without AWS. Install them with
+# bedrock_client.set_bedrock_runtime(FakeBedrockRuntime()) and
+# opensearch_client.set_client(FakeOpenSearch(serializer=opensearch_client.serializer)).
+
+# ---------- Configuration ----------
+FAKE_EMBEDDING_DIM = 1536               # Same size as Titan v1, so payloads and matmuls are realistic
+FAKE_EMBEDDING_LATENCY = 0.05           # Seconds per invoke_model embedding call
+FAKE_LLM_TTFT = 0.4                     # Seconds before the first streamed token
+FAKE_LLM_TOKEN_LATENCY = 0.01           # Seconds between streamed tokens
+FAKE_ANSWER_TOKENS = 60                 # Tokens in every generated answer
+FAKE_SEARCH_LATENCY = 0.01              # Seconds per search/msearch/bulk round trip
+# -----------------------------------
+
+class FakeThrottlingException(Exception):
+    """
+    Shaped like botocore's ClientError for a throttled request.
+    """
+
+    def __init__(self, operation):
+        super().__init__(f"An error occurred (ThrottlingException) when calling the {operation} operation: Too many requests")
+        self.response = {"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}}
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def _tokens(text):
+    return _TOKEN_PATTERN.findall(text.lower())
+
+def fake_embedding(text, dim=FAKE_EMBEDDING_DIM):
+    """
+    Hashed bag-of-words vector, unit-normalized. Deterministic across processes, and texts that
+    share words get similar vectors, so k-NN results are meaningful.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in _tokens(text):
+        h = zlib.crc32(token.encode("utf-8"))
+        vector[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class FakeBedrockRuntime:
+    """
+    Answers invoke_model (Titan embeddings or a Claude completion) and
+    invoke_model_with_response_stream with the same response shapes as boto3, after sleeping
+    for the configured latencies. Thread-safe; counts calls. If quota_per_second is set, calls
+    beyond that many in any one-second window raise FakeThrottlingException, like Bedrock's
+    on-demand quotas.
+    """
+
+    def __init__(self, embedding_latency=FAKE_EMBEDDING_LATENCY, llm_ttft=FAKE_LLM_TTFT,
+                 llm_token_latency=FAKE_LLM_TOKEN_LATENCY, answer_tokens=FAKE_ANSWER_TOKENS, dim=FAKE_EMBEDDING_DIM,
+                 quota_per_second=None):
+        self.embedding_latency = embedding_latency
+        self.llm_ttft = llm_ttft
+        self.llm_token_latency = llm_token_latency
+        self.answer_tokens = answer_tokens
+        self.dim = dim
+        self.quota_per_second = quota_per_second
+        self._lock = threading.Lock()
+        self._recent = [] # Start times of calls in the last second
+        self.calls = {"embedding": 0, "completion": 0, "stream": 0, "throttled": 0}
+
+    def _count(self, kind, operation):
+        with self._lock:
+            if self.quota_per_second:
+                now = time.monotonic()
+                self._recent = [t for t in self._recent if now - t < 1.0]
+                if len(self._recent) >= self.quota_per_second:
+                    self.calls["throttled"] += 1
+                    raise FakeThrottlingException(operation)
+                self._recent.append(now)
+            self.calls[kind] += 1
+
+    def _answer_tokens(self, prompt):
+        # Echo words from the prompt's context, so answers vary with what was retrieved.
+        words = _tokens(prompt) or ["ok"]
+        return [" " + words[(i * 7) % len(words)] for i in range(self.answer_tokens)]
+
+    def invoke_model(self, modelId=None, body=None, **kwargs):
+        payload = json.loads(body)
+        if "inputText" in payload:
+            self._count("embedding", "InvokeModel")
+            time.sleep(self.embedding_latency)
+            dim = payload.get("dimensions", self.dim) # Titan v2 requests pick their own size
+            result = {"embedding": fake_embedding(payload["inputText"], dim), "inputTextTokenCount": len(_tokens(payload["inputText"]))}
+        else:
+            self._count("completion", "InvokeModel")
+            tokens = self._answer_tokens(payload.get("prompt", ""))
+            time.sleep(self.llm_ttft + self.llm_token_latency * len(tokens))
+            result = {"completion": "".join(tokens), "stop_reason": "stop_sequence"}
+        return {"body": io.BytesIO(json.dumps(result).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId=None, body=None, **kwargs):
+        self._count("stream", "InvokeModelWithResponseStream")
+        tokens = self._answer_tokens(json.loads(body).get("prompt", ""))
+
+        def events():
+            time.sleep(self.llm_ttft)
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(self.llm_token_latency)
+                yield {"chunk": {"bytes": json.dumps({"completion": token}).encode("utf-8")}}
+
+        return {"body": events()}
+
+
+class _FakeIndex:
+    def __init__(self):
+        self.docs = {}
+        self._matrix = None # (ids, vectors), rebuilt lazily after writes
+
+    def matrix(self):
+        if self._matrix is None:
+            ids = [doc_id for doc_id, doc in self.docs.items() if "embedding" in doc]
+            vectors = np.array([self.docs[doc_id]["embedding"] for doc_id in ids], dtype=np.float32)
+            self._matrix = (ids, vectors)
+        return self._matrix
+
+
+class _FakeIndices:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def exists(self, index):
+        return index in self._fake.indexes or index in self._fake.aliases
+
+    def create(self, index, body=None):
+        self._fake.indexes[index] = _FakeIndex()
+        return {"acknowledged": True, "index": index}
+
+    def delete(self, index):
+        self._fake.indexes.pop(self._fake.resolve(index))
+        return {"acknowledged": True}
+
+    def exists_alias(self, name):
+        return name in self._fake.aliases
+
+    def get_alias(self, name):
+        return {self._fake.aliases[name]: {"aliases": {name: {}}}}
+
+    def update_aliases(self, body):
+        for action in body["actions"]:
+            if "remove" in action:
+                self._fake.aliases.pop(action["remove"]["alias"], None)
+            if "add" in action:
+                self._fake.aliases[action["add"]["alias"]] = action["add"]["index"]
+        return {"acknowledged": True}
+
+
+class FakeOpenSearch:
+    """
+    In-memory stand-in for the opensearch-py client, covering what opensearch_client uses:
+    indices (exists/create/delete/aliases), bulk, mget, search and msearch with knn (l2, scored like
+    OpenSearch as 1 / (1 + d^2)) and match (BM25) queries, and _source excludes. If a serializer
+    is passed, responses make a JSON round trip through it, so transport stats stay meaningful.
+    """
+
+    def __init__(self, latency=FAKE_SEARCH_LATENCY, serializer=None):
+        self.latency = latency
+        self.serializer = serializer
+        self.indexes = {}
+        self.aliases = {}
+        self.indices = _FakeIndices(self)
+        self._lock = threading.Lock()
+
+    def resolve(self, name):
+        return self.aliases.get(name, name)
+
+    def _respond(self, response):
+        time.sleep(self.latency)
+        if self.serializer is None:
+            return response
+        return self.serializer.loads(json.dumps(response))
+
+    def bulk(self, body):
+        items = []
+        with self._lock:
+            i = 0
+            while i < len(body):
+                action = body[i]
+                if "index" in action:
+                    meta = action["index"]
+                    index = self.indexes[self.resolve(meta["_index"])]
+                    index.docs[meta.get("_id") or f"auto-{len(index.docs)}"] = body[i + 1]
+                    index._matrix = None
+                    items.append({"index": {"_id": meta.get("_id"), "status": 201}})
+                    i += 2
+                else:
+                    meta = action["delete"]
+                    index = self.indexes[self.resolve(meta["_index"])]
+                    found = index.docs.pop(meta["_id"], None) is not None
+                    index._matrix = None
+                    items.append({"delete": {"_id": meta["_id"], "status": 200 if found else 404}})
+                    i += 1
+        return self._respond({"errors": False, "items": items})
+
+    def _search(self, index_name, body):
+        with self._lock:
+            index = self.indexes[self.resolve(index_name)]
+            size = body.get("size", 10)
+            query = body["query"]
+            if "knn" in query:
+                ids, vectors = index.matrix()
+                if not ids:
+                    scored = []
+                else:
+                    target = np.asarray(query["knn"]["embedding"]["vector"], dtype=np.float32)
+                    distances = ((vectors - target) ** 2).sum(axis=1)
+                    top = np.argsort(distances)[:size]
+                    scored = [(ids[i], 1.0 / (1.0 + float(distances[i]))) for i in top]
+            else:
+                scored = self._bm25(index, query["match"]["chunk_text"], size)
+
+            excludes = set(body.get("_source", {}).get("excludes", []))
+            hits = [
+                {"_index": self.resolve(index_name), "_id": doc_id, "_score": score,
+                 "_source": {field: value for field, value in index.docs[doc_id].items() if field not in excludes}}
+                for doc_id, score in scored
+            ]
+        return {"hits": {"total": {"value": len(hits)}, "hits": hits}}
+
+    def _bm25(self, index, query_text, size, k1=1.2, b=0.75):
+        terms = set(_tokens(query_text))
+        docs = {doc_id: _tokens(doc.get("chunk_text", "")) for doc_id, doc in index.docs.items()}
+        if not docs or not terms:
+            return []
+        avg_len = sum(len(tokens) for tokens in docs.values()) / len(docs)
+        df = {term: sum(1 for tokens in docs.values() if term in tokens) for term in terms}
+        scores = {}
+        for doc_id, tokens in docs.items():
+            score = 0.0
+            for term in terms:
+                tf = tokens.count(term)
+                if tf:
+                    idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                    score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(tokens) / avg_len))
+            if score > 0:
+                scores[doc_id] = score
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:size]
+
+    def search(self, index, body):
+        return self._respond(self._search(index, body))
+
+    def msearch(self, body):
+        responses = []
+        for header, query in zip(body[0::2], body[1::2]):
+            try:
+                responses.append(self._search(header["index"], query))
+            except KeyError as e:
+                responses.append({"error": {"type": "index_not_found_exception", "reason": str(e)}, "status": 404})
+        return self._respond({"responses": responses})
+
+    def mget(self, index, body, _source_includes=None):
+        includes = set(_source_includes.split(",")) if _source_includes else None
+        with self._lock:
+            docs = self.indexes[self.resolve(index)].docs
+            found = []
+            for doc_id in body["ids"]:
+                doc = docs.get(doc_id)
+                if doc is None:
+                    found.append({"_index": self.resolve(index), "_id": doc_id, "found": False})
+                    continue
+                source = {field: value for field, value in doc.items() if includes is None or field in includes}
+                found.append({"_index": self.resolve(index), "_id": doc_id, "found": True, "_source": source})
+        return self._respond({"docs": found})
+
+    def index(self, index, body, id=None):
+        return self.bulk([{"index": {"_index": index, "_id": id}}, body])
@@ -0,0 +1,268 @@
+# faq_precompute.py
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from embedding_cache import CACHE_DIR
+from ingest_manifest import load_manifest, manifest_path
+
+# ---------- Configuration ----------
+FAQ_DIR = os.path.join(CACHE_DIR, "faq")
+DEFAULT_FAQ_SIMILARITY_THRESHOLD = 0.93  # Cosine similarity a question needs to get a precomputed answer, unless a bot sets faq["similarity_threshold"]
+QUESTIONS_PER_SECTION = 4                # Canonical questions generated per document section
+SECTION_CHARS = 3000                     # Consecutive chunks of a file are grouped into sections of about this size
+DEFAULT_MAX_WORKERS = 4                  # Sections processed at once
+QUESTION_PERSONA = (
+    "You write the questions customers of SkyConnect Airlines most often ask. From the context, "
+    "write up to {count} short, self-contained questions that it fully answers, one per line, "
+    "without numbering or answers."
+)
+# -----------------------------------
+
+# Most airline questions are predictable (baggage allowance, check-in cutoffs, pet policy, flight
+# times), so answers to them can be generated ahead of time instead of on every request.
+# precompute_faq splits the ingested PDFs into sections, asks the LLM for the questions each
+# section answers, answers every question with the bot's normal retrieve -> context -> LLM path,
+# and stores the pairs with their question embeddings. All Bedrock calls run at background
+# priority, so this never competes with chat traffic.
+#
+# Store, per backend and index: {FAQ_DIR}/{backend}/{index}.json with the entries and a .npy file
+# of their unit-normalized question embeddings in the same order. Each entry records the chunk
+# IDs its answer was generated from. Chunk IDs change with chunk content (see ingest_manifest.py),
+# so an entry is only served while all of its source chunks are still in the index's ingest
+# manifest: re-ingesting changed documents invalidates exactly the affected answers.
+
+def faq_paths(index_name, backend_name="opensearch_client"):
+    base = os.path.join(FAQ_DIR, backend_name, index_name)
+    return f"{base}.json", f"{base}.npy"
+
+def _section_key(chunk_ids):
+    return hashlib.sha256("|".join(chunk_ids).encode("utf-8")).hexdigest()[:16]
+
+def _read_store(index_name, backend_name):
+    json_path, vectors_path = faq_paths(index_name, backend_name)
+    try:
+        with open(json_path) as f:
+            entries = json.load(f)["entries"]
+        vectors = np.load(vectors_path)
+    except (FileNotFoundError, json.JSONDecodeError, ValueError):
+        return [], np.empty((0, 0), dtype=np.float32)
+    if len(vectors) != len(entries): # Written by an interrupted save
+        return [], np.empty((0, 0), dtype=np.float32)
+    return entries, vectors
+
+def _write_store(index_name, backend_name, entries, vectors):
+    json_path, vectors_path = faq_paths(index_name, backend_name)
+    os.makedirs(os.path.dirname(json_path), exist_ok=True)
+    tmp_suffix = f".{os.getpid()}.tmp"
+    with open(vectors_path + tmp_suffix, "wb") as f:
+        np.save(f, np.asarray(vectors, dtype=np.float32))
+    with open(json_path + tmp_suffix, "w") as f:
+        json.dump({"entries": entries}, f, indent=2)
+    os.replace(vectors_path + tmp_suffix, vectors_path)
+    os.replace(json_path + tmp_suffix, json_path) # Atomic, so readers never see a partial file
+
+def _live_chunk_ids(index_name, backend_name):
+    manifest = load_manifest(index_name, backend_name)
+    return {chunk["chunk_id"] for entry in manifest["files"].values() for chunk in entry["chunks"]}
+
+def valid_entries(index_name, backend_name="opensearch_client"):
+    """
+    :return: Tuple of (entries, vectors) whose source chunks are all still ingested.
+    """
+    entries, vectors = _read_store(index_name, backend_name)
+    live_ids = _live_chunk_ids(index_name, backend_name)
+    keep = [i for i, entry in enumerate(entries) if entry["sources"] and all(source["chunk_id"] in live_ids for source in entry["sources"])]
+    return [entries[i] for i in keep], vectors[keep] if keep else np.empty((0, vectors.shape[1] if vectors.ndim == 2 else 0), dtype=np.float32)
+
+
+class FAQStore:
+    """
+    Process-wide read side of the precomputed answers. Reloads an index's entries only when its
+    store or ingest manifest changed on disk.
+    """
+
+    def __init__(self):
+        self._loaded = {} # (backend, index) -> (signature, entries, vectors)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _signature(self, index_name, backend_name):
+        signature = []
+        for path in (*faq_paths(index_name, backend_name), manifest_path(index_name, backend_name)):
+            try:
+                signature.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _entries(self, index_name, backend_name):
+        key = (backend_name, index_name)
+        signature = self._signature(index_name, backend_name)
+        loaded = self._loaded.get(key)
+        if loaded is None or loaded[0] != signature:
+            entries, vectors = valid_entries(index_name, backend_name) if signature[0] is not None else ([], np.empty((0, 0), dtype=np.float32))
+            loaded = self._loaded[key] = (signature, entries, vectors)
+        return loaded[1], loaded[2]
+
+    def lookup(self, index_name, query_embedding, threshold=DEFAULT_FAQ_SIMILARITY_THRESHOLD, backend_name="opensearch_client"):
+        """
+        :return: The entry (question, answer, sources, similarity) closest to query_embedding, or None.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        with self._lock:
+            entries, vectors = self._entries(index_name, backend_name)
+            if not entries or norm == 0 or vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            similarities = vectors @ (query / norm)
+            best = int(np.argmax(similarities))
+            if similarities[best] < threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {**entries[best], "similarity": float(similarities[best])}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_faq_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FAQStore()
+    return _store
+
+
+# ---------- Offline generation ----------
+
+def iter_sections(pdf_files, section_chars=SECTION_CHARS):
+    """
+    Yields sections of consecutive chunks of each file: dicts with key, source_file, chunk_ids,
+    page_start, page_end and text.
+    """
+    from ingest import extract_pdfs, pdf_documents # Deferred: ingest pulls in the extraction stack
+
+    def section(pdf, docs):
+        pages = [page for doc in docs for page in (doc.get("page_start"), doc.get("page_end")) if page is not None]
+        chunk_ids = [doc["chunk_id"] for doc in docs]
+        return {
+            "key": _section_key(chunk_ids),
+            "source_file": pdf,
+            "chunk_ids": chunk_ids,
+            "page_start": min(pages) if pages else None,
+            "page_end": max(pages) if pages else None,
+            "text": "\n".join(doc["chunk_text"] for doc in docs),
+        }
+
+    for pdf, chunks in extract_pdfs([pdf for pdf in pdf_files if os.path.exists(pdf)]):
+        docs, size = [], 0
+        for doc in pdf_documents(pdf, chunks):
+            if docs and size + len(doc["chunk_text"]) > section_chars:
+                yield section(pdf, docs)
+                docs, size = [], 0
+            docs.append(doc)
+            size += len(doc["chunk_text"])
+        if docs:
+            yield section(pdf, docs)
+
+_NUMBERING = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+def parse_questions(text, limit=QUESTIONS_PER_SECTION):
+    questions = []
+    for line in text.splitlines():
+        question = _NUMBERING.sub("", line).strip()
+        if len(question) >= 10 and question not in questions:
+            questions.append(question)
+    return questions[:limit]
+
+def _answer_question(config, question):
+    # The bot's own retrieve -> context -> LLM path, at background priority.
+    from bedrock_client import query_llm, PRIORITY_BACKGROUND
+    from retrieval import embed_for_bot, search_for_bot
+    from context_builder import build_context
+
+    embedding = embed_for_bot(config, question, priority=PRIORITY_BACKGROUND)
+    hits = search_for_bot(config, question, embedding, k=config.get("retrieval_k", 3))
+    if not hits:
+        return None
+    context, _ = build_context(hits, config.get("context_token_budget"))
+    answer = query_llm(question, context, config["llm_persona_prompt"], priority=PRIORITY_BACKGROUND)
+    sources = [
+        {"chunk_id": hit["_source"].get("chunk_id", hit["_id"]), **{key: hit["_source"].get(key) for key in ("source_file", "page_start", "page_end")}}
+        for hit in hits
+    ]
+    return {"question": question, "answer": answer, "sources": sources, "embedding": embedding}
+
+def _precompute_section(config, section, questions_per_section):
+    from bedrock_client import query_llm, PRIORITY_BACKGROUND
+
+    instruction = "List the questions this context answers."
+    persona = QUESTION_PERSONA.format(count=questions_per_section)
+    questions = parse_questions(query_llm(instruction, section["text"], persona, priority=PRIORITY_BACKGROUND), questions_per_section)
+    entries = []
+    for question in questions:
+        entry = _answer_question(config, question)
+        if entry is not None:
+            entries.append({**entry, "section": section["key"], "created": time.time()})
+    return entries
+
+def precompute_faq(config, pdf_files, max_workers=DEFAULT_MAX_WORKERS, questions_per_section=QUESTIONS_PER_SECTION, refresh=False):
+    """
+    Generates precomputed answers for a bot's index from pdf_files. Sections that already have
+    valid entries are skipped unless refresh is set; entries whose sources changed are dropped.
+
+    :return: Dict with sections, skipped, generated and kept counts.
+    """
+    from retrieval import get_backend
+    from index_profiles import profile_for_config
+
+    backend_name = get_backend(config.get("retrieval_backend")).__name__
+    index_name = config["opensearch_index_name"]
+    existing, existing_vectors = valid_entries(index_name, backend_name)
+    if existing and existing_vectors.shape[1] != profile_for_config(config)["dimensions"]:
+        print("⚠️ Stored answers were embedded for a different index profile; regenerating all of them.")
+        existing, existing_vectors = [], existing_vectors[:0]
+    sections = list(iter_sections(pdf_files))
+    current_keys = {section["key"] for section in sections}
+    done_keys = set() if refresh else {entry["section"] for entry in existing}
+    todo = [section for section in sections if section["key"] not in done_keys]
+    print(f"🧠 Precomputing answers for {index_name}: {len(todo)} of {len(sections)} section(s) need questions.")
+
+    generated = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for section, entries in zip(todo, executor.map(lambda s: _precompute_section(config, s, questions_per_section), todo)):
+            print(f"✅ {section['source_file']} pp. {section['page_start']}-{section['page_end']}: {len(entries)} answer(s)")
+            generated.extend(entries)
+
+    keep = [i for i, entry in enumerate(existing) if entry["section"] in current_keys and entry["section"] in done_keys]
+    entries = [existing[i] for i in keep] + [{key: value for key, value in entry.items() if key != "embedding"} for entry in generated]
+    vectors = [existing_vectors[i] for i in keep]
+    for entry in generated:
+        vector = np.asarray(entry["embedding"], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        vectors.append(vector / norm if norm else vector)
+    _write_store(index_name, backend_name, entries, np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32))
+    stats = {"sections": len(sections), "skipped": len(sections) - len(todo), "generated": len(generated), "kept": len(keep)}
+    print(f"📊 {stats['generated']} answer(s) generated, {stats['kept']} kept, {stats['skipped']} section(s) unchanged.")
+    return stats
+
+if __name__ == "__main__":
+    from chatbot_configs import CHATBOT_CONFIGS
+
+    parser = argparse.ArgumentParser(description="Precompute answers to the questions a bot's documents answer.")
+    parser.add_argument("--bot", default="airline_faq", choices=sorted(key for key, config in CHATBOT_CONFIGS.items() if config.get("rag_enabled")))
+    parser.add_argument("--pdfs", nargs="+", default=["data/SkyConnect_Flights.pdf", "data/SkyConnect_Baggage_And_Policies.pdf"])
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--questions-per-section", type=int, default=QUESTIONS_PER_SECTION)
+    parser.add_argument("--refresh", action="store_true", help="Regenerate every section, not only new or changed ones.")
+    args = parser.parse_args()
+    precompute_faq(CHATBOT_CONFIGS[args.bot], args.pdfs, args.max_workers, args.questions_per_section, args.refresh)
@@ -0,0 +1,146 @@
+# index_profiles.py
+import os
+import json
+import numpy as np
+
+# ---------- Configuration ----------
+TITAN_V1 = "amazon.titan-embed-text-v1"
+TITAN_V2 = "amazon.titan-embed-text-v2:0"
+DEFAULT_INDEX_PROFILE = os.environ.get("SKYCONNECT_INDEX_PROFILE", "nmslib-float")
+TUNED_PROFILES_FILE = os.environ.get( # Written by tune_hnsw.py --save-profile; next to this module, whatever the working directory
+    "SKYCONNECT_TUNED_PROFILES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tuned_index_profiles.json"))
+HNSW_OVERHEAD = 1.1          # OpenSearch's sizing rule: ~1.1 * (vector bytes + 8 * m) per vector for HNSW
+BYTE_QUANTIZATION_RANGE = 0.2 # Unit-vector components in [-range, range] map to int8 [-127, 127]; larger ones are clipped
+# -----------------------------------
+
+# An index profile fixes everything that decides a vector's footprint: which embedding model and
+# output dimension produce it, and how the k-NN index stores it. Bots pick one with
+# "index_profile" in CHATBOT_CONFIGS; ingest.py builds the index with the same profile, so
+# queries and documents always agree. index_report.py measures recall, memory and latency of
+# each profile on our own documents, and tune_hnsw.py measures HNSW parameters for one; profiles
+# it saves to TUNED_PROFILES_FILE are added to the ones below.
+#
+#   vector_encoding  "float": stored as sent. "fp16": OpenSearch faiss scalar quantization (the
+#                    server halves the vectors). "byte": the client quantizes unit-normalized
+#                    vectors to int8 before sending them (data_type byte), a quarter of float.
+#
+# Product quantization is not offered: faiss PQ needs a model trained on a sample through the
+# k-NN training API before the index can be created, which ingest.py does not manage.
+INDEX_PROFILES = {
+    "nmslib-float": { # What create_index always built before profiles existed
+        "embedding_model_id": TITAN_V1, "dimensions": 1536, "engine": "nmslib", "space_type": "l2",
+        "m": 48, "ef_construction": 256, "ef_search": 100, "vector_encoding": "float",
+    },
+    "faiss-fp16": {
+        "embedding_model_id": TITAN_V1, "dimensions": 1536, "engine": "faiss", "space_type": "l2",
+        "m": 16, "ef_construction": 128, "ef_search": 100, "vector_encoding": "fp16",
+    },
+    "faiss-byte": {
+        "embedding_model_id": TITAN_V1, "dimensions": 1536, "engine": "faiss", "space_type": "l2",
+        "m": 16, "ef_construction": 128, "ef_search": 100, "vector_encoding": "byte",
+    },
+    "titan-v2-512-fp16": {
+        "embedding_model_id": TITAN_V2, "dimensions": 512, "engine": "faiss", "space_type": "l2",
+        "m": 16, "ef_construction": 128, "ef_search": 100, "vector_encoding": "fp16",
+    },
+    "titan-v2-256-byte": {
+        "embedding_model_id": TITAN_V2, "dimensions": 256, "engine": "faiss", "space_type": "l2",
+        "m": 16, "ef_construction": 128, "ef_search": 100, "vector_encoding": "byte",
+    },
+}
+
+_BYTES_PER_DIMENSION = {"float": 4, "fp16": 2, "byte": 1}
+_LOCAL_DTYPES = {"float": "float32", "fp16": "float16", "byte": "int8"}
+
+def _load_tuned_profiles(path=TUNED_PROFILES_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_tuned_profile(name, profile, path=TUNED_PROFILES_FILE):
+    """
+    Adds profile under name to TUNED_PROFILES_FILE and to INDEX_PROFILES.
+    """
+    profile = {key: value for key, value in profile.items() if key != "name"}
+    tuned = _load_tuned_profiles(path)
+    tuned[name] = profile
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(tuned, f, indent=2)
+    os.replace(tmp_path, path)
+    INDEX_PROFILES[name] = profile
+
+INDEX_PROFILES.update(_load_tuned_profiles())
+
+def get_profile(name=None):
+    """
+    :param name: A profile name (DEFAULT_INDEX_PROFILE if None), or a custom profile dict.
+    :return: The profile dict, with its name added ("custom" for a dict without one).
+    """
+    if isinstance(name, dict):
+        return {"name": "custom", **name}
+    name = name or DEFAULT_INDEX_PROFILE
+    if name not in INDEX_PROFILES:
+        raise ValueError(f"Unknown index profile '{name}'. Choose one of: {', '.join(sorted(INDEX_PROFILES))}")
+    return {"name": name, **INDEX_PROFILES[name]}
+
+def profile_for_config(config):
+    return get_profile(config.get("index_profile"))
+
+def embedding_dimensions(profile):
+    # Titan v1 has a fixed output size; only v2 takes a dimensions parameter.
+    return profile["dimensions"] if profile["embedding_model_id"] != TITAN_V1 else None
+
+def knn_mapping(profile):
+    """
+    The "embedding" field mapping and index settings create_index uses for a profile.
+    """
+    method = {
+        "name": "hnsw",
+        "space_type": profile["space_type"],
+        "engine": profile["engine"],
+        "parameters": {"ef_construction": profile["ef_construction"], "m": profile["m"]},
+    }
+    if profile["vector_encoding"] == "fp16":
+        method["parameters"]["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+    field = {"type": "knn_vector", "dimension": profile["dimensions"], "method": method}
+    if profile["vector_encoding"] == "byte":
+        field["data_type"] = "byte"
+    settings = {"knn": True}
+    if profile["engine"] == "nmslib":
+        settings["knn.algo_param.ef_search"] = profile["ef_search"]
+    else:
+        method["parameters"]["ef_search"] = profile["ef_search"]
+    return field, settings
+
+def encode_vector(profile, vector):
+    """
+    Converts an embedding into what the profile's index stores and is queried with: unchanged for
+    float and fp16 (the server quantizes fp16), int8 values as a list for byte.
+    """
+    if profile["vector_encoding"] != "byte":
+        return vector
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector = vector / norm
+    return np.clip(np.rint(vector * (127 / BYTE_QUANTIZATION_RANGE)), -127, 127).astype(np.int8).tolist()
+
+def stored_list(profile, vector):
+    """
+    A vector that is already encoded (e.g. read back from an index or snapshot) as a list for a
+    _bulk body: byte fields only take integers.
+    """
+    vector = np.asarray(vector)
+    return vector.astype(np.int8).tolist() if profile["vector_encoding"] == "byte" else vector.astype(np.float32).tolist()
+
+def local_dtype(profile):
+    return _LOCAL_DTYPES[profile["vector_encoding"]]
+
+def bytes_per_vector(profile):
+    """
+    Estimated k-NN memory per vector: the stored vector plus the HNSW graph links.
+    """
+    return HNSW_OVERHEAD * (_BYTES_PER_DIMENSION[profile["vector_encoding"]] * profile["dimensions"] + 8 * profile["m"])
@@ -0,0 +1,142 @@
+# index_report.py
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import bedrock_client
+from embedding_cache import CACHE_DIR
+from bedrock_client import get_embedding, BedrockScheduler, PRIORITY_BACKGROUND
+from fake_services import FakeBedrockRuntime
+from local_vector_store import LocalVectorStore
+from eval_retrieval import load_eval_set, recall_at_k, DEFAULT_EVAL_FILE
+from ingest import extract_pdfs, pdf_documents, DEFAULT_MAX_WORKERS
+from index_profiles import INDEX_PROFILES, get_profile, embedding_dimensions, encode_vector, local_dtype, bytes_per_vector
+
+# Compares the index profiles of index_profiles.py on our own documents before one is rolled
+# out: recall@k on the retrieval eval set, how many of the top k hits match what unquantized
+# vectors of the same model return, the k-NN memory estimate, and search latency.
+# Every profile is searched exactly in a temporary local store holding vectors the way the
+# profile stores them (float32, float16 or int8), so the numbers isolate what the embedding model,
+# dimension and encoding cost; HNSW's own approximation comes on top in OpenSearch.
+
+# ---------- Configuration ----------
+DEFAULT_REPORT_PATH = os.path.join(CACHE_DIR, "reports", "index_report.json")
+DEFAULT_K = 5
+LATENCY_ROUNDS = 20   # Searches per eval question when timing
+# -----------------------------------
+
+def _embed_all(texts, profile, use_cache, max_workers):
+    model_id, dimensions = profile["embedding_model_id"], embedding_dimensions(profile)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+            lambda text: get_embedding(text, model_id=model_id, use_cache=use_cache, priority=PRIORITY_BACKGROUND, dimensions=dimensions),
+            texts,
+        ))
+
+def _build_store(path, profile, documents, embeddings):
+    store = LocalVectorStore(path, dimension=profile["dimensions"], dtype=local_dtype(profile))
+    store.upsert([{**doc, "embedding": encode_vector(profile, embedding)} for doc, embedding in zip(documents, embeddings)])
+    return store
+
+def _latency(store, profile, query_embeddings, k, rounds=LATENCY_ROUNDS):
+    samples = []
+    for _ in range(rounds):
+        for embedding in query_embeddings:
+            query = encode_vector(profile, embedding)
+            start = time.perf_counter()
+            store.search(query, k=k)
+            samples.append(time.perf_counter() - start)
+    p50, p95 = np.percentile(np.asarray(samples) * 1000, [50, 95])
+    return float(p50), float(p95)
+
+def profile_report(profile, documents, eval_set, k, use_cache=True, max_workers=DEFAULT_MAX_WORKERS, embeddings_by_model=None):
+    """
+    Measures one profile on documents (chunk dicts) and eval_set.
+    embeddings_by_model caches embeddings between profiles that share a model and dimension.
+
+    :return: Dict of recall, overlap, memory and latency figures.
+    """
+    embeddings_by_model = {} if embeddings_by_model is None else embeddings_by_model
+    model_key = (profile["embedding_model_id"], profile["dimensions"])
+    if model_key not in embeddings_by_model:
+        questions = [item["question"] for item in eval_set]
+        embeddings_by_model[model_key] = (
+            _embed_all([doc["chunk_text"] for doc in documents], profile, use_cache, max_workers),
+            dict(zip(questions, _embed_all(questions, profile, use_cache, max_workers))),
+        )
+    chunk_embeddings, question_embeddings = embeddings_by_model[model_key]
+
+    with tempfile.TemporaryDirectory(prefix="skyconnect-index-report-") as tmp:
+        store = _build_store(f"{tmp}/profile", profile, documents, chunk_embeddings)
+        exact = _build_store(f"{tmp}/exact", {**profile, "vector_encoding": "float"}, documents, chunk_embeddings)
+        retrieve = lambda question, embedding, k: store.search(encode_vector(profile, embedding), k=k)
+        recall, missed = recall_at_k(eval_set, retrieve, k, embed=question_embeddings.get)
+
+        overlaps = []
+        for embedding in question_embeddings.values():
+            expected = {hit["_id"] for hit in exact.search(embedding, k=k)}
+            found = {hit["_id"] for hit in retrieve(None, embedding, k)}
+            overlaps.append(len(expected & found) / len(expected) if expected else 1.0)
+        p50, p95 = _latency(store, profile, list(question_embeddings.values()), k)
+
+    return {
+        "profile": profile["name"],
+        "embedding_model_id": profile["embedding_model_id"],
+        "dimensions": profile["dimensions"],
+        "vector_encoding": profile["vector_encoding"],
+        "engine": profile["engine"],
+        f"recall@{k}": recall,
+        f"overlap@{k}": float(np.mean(overlaps)) if overlaps else 1.0,
+        "missed": missed,
+        "bytes_per_vector": bytes_per_vector(profile),
+        "knn_memory_mb": bytes_per_vector(profile) * len(documents) / 2**20,
+        "search_p50_ms": p50,
+        "search_p95_ms": p95,
+    }
+
+def print_report(reports, k, chunks):
+    print(f"\n--- Index profiles on {chunks} chunks (k={k}) ---")
+    print(f"{'profile':<20} {'recall':>7} {'overlap':>8} {'bytes/vec':>10} {'memory MB':>10} {'p50 ms':>7} {'p95 ms':>7}")
+    for report in reports:
+        print(f"{report['profile']:<20} {report[f'recall@{k}']:>7.0%} {report[f'overlap@{k}']:>8.0%} "
+              f"{report['bytes_per_vector']:>10.0f} {report['knn_memory_mb']:>10.2f} "
+              f"{report['search_p50_ms']:>7.2f} {report['search_p95_ms']:>7.2f}")
+    print("overlap: share of the top k that unquantized vectors of the same model also return. "
+          "memory: OpenSearch k-NN estimate, vectors plus HNSW graph.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare recall, memory and latency of the index profiles on our documents.")
+    parser.add_argument("--profiles", nargs="+", choices=sorted(INDEX_PROFILES), default=list(INDEX_PROFILES))
+    parser.add_argument("--pdfs", nargs="+", default=["data/SkyConnect_Flights.pdf", "data/SkyConnect_Baggage_And_Policies.pdf"])
+    parser.add_argument("--eval-file", default=DEFAULT_EVAL_FILE)
+    parser.add_argument("--k", type=int, default=DEFAULT_K)
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS, help="Concurrent embedding calls.")
+    parser.add_argument("--fake", action="store_true",
+                        help="Embed with the hashed stand-in from fake_services.py instead of Bedrock (checks the tool, not the models).")
+    parser.add_argument("--output", default=DEFAULT_REPORT_PATH)
+    args = parser.parse_args()
+
+    if args.fake:
+        bedrock_client.set_bedrock_runtime(FakeBedrockRuntime(embedding_latency=0.0))
+        bedrock_client.set_scheduler(BedrockScheduler({})) # The stand-in has no quota to protect
+    documents = [doc for pdf, chunks in extract_pdfs(args.pdfs) for doc in pdf_documents(pdf, chunks)]
+    if not documents:
+        sys.exit("❌ No chunks extracted from the PDFs.")
+    eval_set = load_eval_set(args.eval_file)
+
+    embeddings_by_model = {}
+    reports = []
+    for name in args.profiles:
+        print(f"📏 Measuring {name} ...")
+        # Fake embeddings must not land in the shared embedding cache under real model IDs.
+        reports.append(profile_report(get_profile(name), documents, eval_set, args.k, not args.fake, args.max_workers, embeddings_by_model))
+
+    print_report(reports, args.k, len(documents))
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"chunks": len(documents), "k": args.k, "fake": args.fake, "profiles": reports}, f, indent=2)
+    print(f"\n💾 Report written to {args.output}")
@@ -1,24 +1,48 @@
 # ingest.py
 import os
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter # Import LangChain's splitter
-from bedrock_client import get_embedding
-from opensearch_client import index_chunk, create_index
+import time
+import argparse
+from bisect import bisect_right
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from bedrock_client import get_embedding, PRIORITY_BACKGROUND
+from index_profiles import get_profile, embedding_dimensions, encode_vector, DEFAULT_INDEX_PROFILE
+from embedding_cache import print_cache_stats
+from answer_cache import mark_index_updated
+from metrics import timed, write_metrics_file
+from retrieval import get_backend, BACKENDS, DEFAULT_BACKEND
+from ingest_manifest import file_hash, iter_chunk_documents, load_manifest, save_manifest, manifest_entry
+from ingest_checkpoint import IngestCheckpoint
 
-def read_and_split_pdf_text(file_path, chunk_size=500, chunk_overlap=75):
+DEFAULT_BATCH_SIZE = 50   # Chunks per _bulk request
+DEFAULT_MAX_WORKERS = 8   # Concurrent embedding calls to Bedrock
+CHUNK_SIZE = 1000         # Characters per chunk
+CHUNK_OVERLAP = 150       # Characters shared by consecutive chunks
+WINDOW_CHUNKS = 8         # Chunks' worth of text buffered during extraction
+
+def _page_at(page_offsets, page_numbers, offset):
+    # Page whose text contains the given buffer offset.
+    return page_numbers[max(bisect_right(page_offsets, offset) - 1, 0)]
+
+def iter_pdf_chunks(file_path, chunk_size=1000, chunk_overlap=150, window_chunks=WINDOW_CHUNKS, first_page=1, last_page=None):
     """
-    Reads text from a PDF and splits it into chunks using RecursiveCharacterTextSplitter.
+    Extracts a PDF page by page and yields chunks as soon as they are final, so memory stays
+    bounded by a window of about window_chunks * chunk_size characters whatever the document size.
+
+    Pages are appended to a rolling buffer. Once the buffer holds a full window it is split with
+    RecursiveCharacterTextSplitter; every chunk but the last is yielded, and the buffer restarts
+    at the last chunk, which is split again together with the following pages. Chunk sizes and
+    overlap follow the same splitter rules as splitting the whole text at once.
+
+    Each chunk is a dict: {"chunk_text", "source_file", "page_start", "page_end"} (1-based pages).
+    first_page/last_page (inclusive) restrict extraction to a page range.
     """
-    reader = PdfReader(file_path)
-    full_text = ""
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            full_text += page_text + "\n" # Add newline to help splitter identify page breaks if needed
+    # Imported here rather than at module level: langchain is slow to import, and only extraction needs it.
+    from PyPDF2 import PdfReader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter # Import LangChain's splitter
 
-    if not full_text.strip():
-        print(f"⚠️ No text extracted from {file_path}")
-        return []
+    reader = PdfReader(file_path)
+    last_page = min(last_page or len(reader.pages), len(reader.pages))
 
     # Initialize the RecursiveCharacterTextSplitter
     # You can experiment with different separators.
@@ -28,41 +52,432 @@ def read_and_split_pdf_text(file_path, chunk_size=500, chunk_overlap=75):
         chunk_overlap=chunk_overlap,
         length_function=len,
         is_separator_regex=False, # If your separators are not regex
+        add_start_index=True, # Lets us map each chunk back to the pages it came from
     )
 
-    # Split the text into documents (LangChain's term for chunks)
-    # LangChain's splitter returns Document objects, we need the page_content (text)
-    documents = text_splitter.create_documents([full_text])
-    
-    # Extract the text content from each Document object
-    text_chunks = [doc.page_content for doc in documents]
-    
+    buffer_parts = []
+    buffer_length = 0
+    page_offsets = [] # Buffer offset at which each buffered page starts
+    page_numbers = []
+
+    def split_buffer(final):
+        nonlocal buffer_parts, buffer_length, page_offsets, page_numbers
+        buffer = "".join(buffer_parts)
+        documents = text_splitter.create_documents([buffer])
+        ready = documents if final else documents[:-1]
+        for doc in ready:
+            if not doc.page_content.strip(): # Skip empty chunks that might result from splitting
+                continue
+            start = doc.metadata["start_index"]
+            yield {
+                "chunk_text": doc.page_content,
+                "source_file": file_path,
+                "page_start": _page_at(page_offsets, page_numbers, start),
+                "page_end": _page_at(page_offsets, page_numbers, start + len(doc.page_content) - 1),
+            }
+        if final or not documents:
+            return
+
+        # Keep the last chunk's text (and the pages it spans) for the next split
+        keep_from = documents[-1].metadata["start_index"]
+        first_page = max(bisect_right(page_offsets, keep_from) - 1, 0)
+        page_numbers = page_numbers[first_page:]
+        page_offsets = [max(offset - keep_from, 0) for offset in page_offsets[first_page:]]
+        buffer_parts = [buffer[keep_from:]]
+        buffer_length = len(buffer_parts[0])
+
+    for page_number in range(first_page, last_page + 1):
+        page_text = reader.pages[page_number - 1].extract_text()
+        if not page_text:
+            continue
+        page_offsets.append(buffer_length)
+        page_numbers.append(page_number)
+        buffer_parts.append(page_text + "\n") # Add newline to help splitter identify page breaks if needed
+        buffer_length += len(page_text) + 1
+        if buffer_length >= window_chunks * chunk_size:
+            yield from split_buffer(final=False)
+
+    if buffer_length:
+        yield from split_buffer(final=True)
+
+def read_and_split_pdf_text(file_path, chunk_size=500, chunk_overlap=75):
+    """
+    Reads text from a PDF and splits it into chunks using RecursiveCharacterTextSplitter.
+    Returns the chunk texts only; use iter_pdf_chunks to stream chunks with their page ranges.
+    """
+    text_chunks = [chunk["chunk_text"] for chunk in iter_pdf_chunks(file_path, chunk_size, chunk_overlap)]
+    if not text_chunks:
+        print(f"⚠️ No text extracted from {file_path}")
+        return []
     print(f"📄 Extracted and split {file_path} into {len(text_chunks)} chunks.")
     return text_chunks
 
-def ingest_pdf(file_path, index_name):
-    print(f"\n📥 Ingesting: {file_path}")
-    # Use the new function for reading and splitting
-    chunks = read_and_split_pdf_text(file_path, chunk_size=1000, chunk_overlap=150) # Adjusted chunk_size and added overlap
+def _embed_with_retry(text, profile=None, max_retries=3, retry_backoff=1.0):
+    """
+    Embeds a single chunk with the index profile's model and dimensions, encoded the way the
+    index stores it, retrying it on failure. Returns None if every attempt fails.
+    """
+    profile = profile or get_profile()
+    for attempt in range(max_retries + 1):
+        try:
+            embedding = get_embedding(text, model_id=profile["embedding_model_id"], dimensions=embedding_dimensions(profile),
+                                      priority=PRIORITY_BACKGROUND) # Yields to chat questions sharing the quota
+            return encode_vector(profile, embedding)
+        except Exception as e:
+            if attempt == max_retries:
+                print(f"❌ Embedding failed after {max_retries} retries: {e}")
+                return None
+            time.sleep(retry_backoff * (2 ** attempt))
+
+def index_documents(documents, index_name, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS, backend=None,
+                    on_indexed=None, index_profile=None):
+    """
+    Embeds documents (dicts with chunk_text and metadata) through a bounded worker pool and
+    writes them to OpenSearch in _bulk batches of batch_size. documents may be any iterable,
+    including a generator still extracting the PDF; only one batch is held at a time.
+    If given, on_indexed is called with the documents of each batch that were written.
+    index_profile (see index_profiles.py) must be the one the index was created with.
+
+    :return: Dict with the number of chunks indexed, failed and the elapsed seconds.
+    """
+    backend = backend or get_backend()
+    profile = get_profile(index_profile)
+    stats = {"indexed": 0, "failed": 0, "seconds": 0.0}
+    start = time.perf_counter()
+    documents = iter(documents)
+    done = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            with timed("ingest_extract", index=index_name) as span: # Chunks are pulled lazily, so this is extraction time
+                batch = list(islice(documents, batch_size))
+                span["chunks"] = len(batch)
+            if not batch:
+                break
+            with timed("ingest_embed", index=index_name, chunks=len(batch)) as span:
+                embeddings = list(executor.map(lambda text: _embed_with_retry(text, profile), [doc["chunk_text"] for doc in batch]))
+                span["failed"] = sum(1 for embedding in embeddings if embedding is None)
+
+            embedded = [
+                {**doc, "embedding": embedding}
+                for doc, embedding in zip(batch, embeddings)
+                if embedding is not None
+            ]
+            stats["failed"] += len(batch) - len(embedded)
+
+            indexed, failed = backend.bulk_index_chunks(index_name, embedded)
+            stats["indexed"] += indexed
+            stats["failed"] += len(failed)
+            if on_indexed is not None:
+                failed_ids = {doc.get("chunk_id") for doc in failed}
+                on_indexed([doc for doc in embedded if doc["chunk_id"] not in failed_ids])
+            print(f"✅ Indexed chunks {done + 1}-{done + len(batch)}")
+            done += len(batch)
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+def _extract_task(file_path, first_page, last_page):
+    # Runs in a worker process: extract and chunk one page range, return the chunks and the time it took.
+    start = time.perf_counter()
+    chunks = list(iter_pdf_chunks(file_path, CHUNK_SIZE, CHUNK_OVERLAP, first_page=first_page, last_page=last_page))
+    return chunks, time.perf_counter() - start
 
-    if not chunks:
+def iter_parallel_pdf_chunks(pdf_files, processes, pages_per_task=0):
+    """
+    Fans PDF extraction and chunking out over a pool of processes: one task per file, or per
+    range of pages_per_task pages when it is set. Yields (file_path, chunks) as soon as all tasks of
+    a file have finished, so embedding and indexing of one file overlaps extraction of the others.
+    Chunk overlap is not carried across page-range boundaries.
+    """
+    from PyPDF2 import PdfReader
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {}
+        files = {}
+        for pdf in pdf_files:
+            page_count = len(PdfReader(pdf).pages)
+            step = pages_per_task or max(page_count, 1)
+            ranges = [(first, min(first + step - 1, page_count)) for first in range(1, page_count + 1, step)] or [(1, 0)]
+            files[pdf] = {"tasks": len(ranges), "parts": {}, "cpu_seconds": 0.0, "started": time.perf_counter()}
+            for first, last in ranges:
+                futures[pool.submit(_extract_task, pdf, first, last)] = (pdf, first)
+
+        for future in as_completed(futures):
+            pdf, first = futures[future]
+            chunks, seconds = future.result()
+            progress = files[pdf]
+            progress["parts"][first] = chunks
+            progress["cpu_seconds"] += seconds
+            if len(progress["parts"]) < progress["tasks"]:
+                continue
+
+            ordered = [chunk for first_page in sorted(progress["parts"]) for chunk in progress["parts"][first_page]]
+            print(
+                f"⏱️ Extracted {pdf}: {len(ordered)} chunks in {time.perf_counter() - progress['started']:.1f}s "
+                f"({progress['cpu_seconds']:.1f}s of extraction across {progress['tasks']} task(s))"
+            )
+            del files[pdf]
+            yield pdf, ordered
+
+def extract_pdfs(pdf_files, processes=1, pages_per_task=0):
+    """
+    Yields (file_path, chunks) for each file. With one process, chunks is a lazy stream extracted
+    in this process, in file order; otherwise extraction runs on a process pool and files are
+    yielded in the order they finish.
+    """
+    if processes > 1 and pdf_files:
+        yield from iter_parallel_pdf_chunks(pdf_files, processes, pages_per_task)
+    else:
+        for pdf in pdf_files:
+            yield pdf, iter_pdf_chunks(pdf, CHUNK_SIZE, CHUNK_OVERLAP)
+
+def pdf_documents(file_path, chunks=None):
+    """
+    Streams a PDF's chunks as documents ready for index_documents.
+    """
+    if chunks is None:
+        chunks = iter_pdf_chunks(file_path, CHUNK_SIZE, CHUNK_OVERLAP)
+    return iter_chunk_documents(file_path, chunks)
+
+def _track(documents, seen):
+    # Passes documents through, remembering each one's chunk_id and chunk_hash for the manifest.
+    for doc in documents:
+        seen.append({"chunk_id": doc["chunk_id"], "chunk_hash": doc["chunk_hash"]})
+        yield doc
+
+def _open_checkpoint(index_name, backend, mode, index_profile):
+    # Returns the index's checkpoint, loaded if a run of the same mode and profile was interrupted, else None for the header.
+    checkpoint = IngestCheckpoint(index_name, backend.__name__)
+    run = checkpoint.load()
+    if run is not None and (run["mode"], run.get("index_profile", index_profile)) != (mode, index_profile):
+        print(f"⚠️ Discarding the checkpoint of an interrupted {run['mode']} run of {index_name}.")
+        checkpoint.clear()
+        run = None
+    return checkpoint, run
+
+def _remove_orphans(checkpoint, index_name, backend, digests, keep_ids=()):
+    # Deletes chunks the interrupted run wrote for file versions that are no longer being ingested.
+    orphans = checkpoint.orphaned(digests, keep_ids)
+    if not orphans:
+        return 0
+    print(f"🗑️ Removing {len(orphans)} chunk(s) written by the interrupted run for files that changed since")
+    deleted, failed_ids = backend.bulk_delete_chunks(index_name, orphans)
+    if failed_ids:
+        raise RuntimeError(f"Could not delete {len(failed_ids)} orphaned chunk(s) from {index_name}; re-run to retry.")
+    return deleted
+
+def _resumable(documents, done, skipped):
+    # Drops documents the interrupted run already indexed, counting them in skipped["chunks"].
+    for doc in documents:
+        if doc["chunk_id"] in done:
+            skipped["chunks"] += 1
+            continue
+        yield doc
+
+def ingest_pdf(file_path, index_name, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS, backend=None):
+    """
+    Chunks, embeds and indexes every chunk of a PDF.
+
+    :return: Dict with the number of chunks indexed, failed and the elapsed seconds.
+    """
+    print(f"\n📥 Ingesting: {file_path}")
+    stats = index_documents(pdf_documents(file_path), index_name, batch_size, max_workers, backend)
+    if not stats["indexed"] and not stats["failed"]:
         print(f"No chunks to ingest for {file_path}.")
-        return
+    return stats
+
+def _add_stats(totals, stats):
+    for key, value in stats.items():
+        totals[key] = totals.get(key, 0) + value
+
+def ingest_incremental(pdf_files, index_name, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS, backend=None,
+                       processes=1, pages_per_task=0, index_profile=None):
+    """
+    Brings index_name in line with pdf_files without dropping it. Files whose hash matches the
+    manifest are skipped. For changed files only chunks with new content are embedded and
+    indexed, and chunks that disappeared are deleted afterwards. Chunks of files that no longer
+    exist or are no longer listed are deleted. A file's manifest entry is only updated once all
+    of its writes succeeded, so a failed run is simply picked up again by the next one.
+    Every written batch is also recorded in a checkpoint (see ingest_checkpoint.py), so a run
+    that was killed part-way through a file resumes after the last chunk it wrote.
+    With processes > 1, changed files are extracted on a process pool (see extract_pdfs).
+    The index must have been built with index_profile; switching profiles takes a rebuild.
+
+    :return: Dict with indexed, failed, deleted, resumed and seconds totals.
+    """
+    backend = backend or get_backend()
+    profile_name = get_profile(index_profile)["name"]
+    totals = {"indexed": 0, "failed": 0, "deleted": 0, "resumed": 0, "seconds": 0.0}
+    manifest = load_manifest(index_name, backend.__name__)
+    built_with = manifest.get("index_profile", "nmslib-float") # Manifests from before profiles describe nmslib-float indexes
+    if manifest["files"] and built_with != profile_name:
+        raise ValueError(f"{index_name} was built with the {built_with} index profile, not {profile_name}; run --mode rebuild to switch.")
+    manifest["index_profile"] = profile_name
+    backend.create_index(index_to_create=index_name, recreate=False, profile=profile_name)
+    checkpoint, run = _open_checkpoint(index_name, backend, "incremental", profile_name)
+    if run is None:
+        checkpoint.start("incremental", index_name, profile_name)
+    else:
+        print(f"⏩ Resuming an interrupted run: {checkpoint.chunk_count()} chunk(s) were already written.")
+
+    present_files = [pdf for pdf in pdf_files if os.path.exists(pdf)]
+    for pdf in pdf_files:
+        if pdf not in present_files:
+            print(f"⚠️ PDF file not found: {pdf}. Its chunks will be removed from the index.")
+
+    digests = {}
+    for pdf in present_files:
+        digest = file_hash(pdf)
+        previous = manifest["files"].get(pdf)
+        if previous and previous["file_hash"] == digest:
+            print(f"⏭️ Unchanged: {pdf}")
+        else:
+            digests[pdf] = digest
+
+    manifest_ids = {chunk["chunk_id"] for entry in manifest["files"].values() for chunk in entry["chunks"]}
+    totals["deleted"] += _remove_orphans(checkpoint, index_name, backend, {**{pdf: entry["file_hash"] for pdf, entry in manifest["files"].items()}, **digests}, manifest_ids)
+
+    for pdf, chunks in extract_pdfs(list(digests), processes, pages_per_task):
+        digest = digests[pdf]
+        previous = manifest["files"].get(pdf)
+        print(f"\n📥 Ingesting changes in: {pdf}")
+        previous_ids = {chunk["chunk_id"] for chunk in previous["chunks"]} if previous else set()
+        current = []
+        skipped = {"chunks": 0}
+        new_documents = _resumable(
+            (doc for doc in _track(pdf_documents(pdf, chunks), current) if doc["chunk_id"] not in previous_ids),
+            checkpoint.completed(pdf, digest), skipped
+        )
+
+        stats = index_documents(new_documents, index_name, batch_size, max_workers, backend,
+                                on_indexed=lambda docs, pdf=pdf, digest=digest: checkpoint.record(pdf, digest, docs),
+                                index_profile=profile_name)
+        _add_stats(totals, stats)
+        totals["resumed"] += skipped["chunks"]
+        stale_ids = sorted(previous_ids - {chunk["chunk_id"] for chunk in current})
+        unchanged = len(current) - stats["indexed"] - stats["failed"] - skipped["chunks"]
+        print(f"🔍 {stats['indexed'] + stats['failed']} new or changed chunk(s), {len(stale_ids)} to remove, {unchanged} unchanged"
+              + (f", {skipped['chunks']} already written by the interrupted run." if skipped["chunks"] else "."))
+        if stats["failed"]:
+            print(f"⚠️ {stats['failed']} chunk(s) of {pdf} failed. Keeping its old chunks; re-run to retry.")
+            continue
+
+        deleted, failed_ids = backend.bulk_delete_chunks(index_name, stale_ids)
+        totals["deleted"] += deleted
+        if failed_ids:
+            print(f"⚠️ Could not delete {len(failed_ids)} stale chunk(s) of {pdf}; re-run to retry.")
+            continue
+
+        manifest["files"][pdf] = manifest_entry(digest, current)
+        save_manifest(index_name, manifest, backend.__name__)
 
-    for i, chunk_text in enumerate(chunks):
-        if not chunk_text.strip(): # Skip empty chunks that might result from splitting
-            print(f"⚠️ Skipping empty chunk {i+1}/{len(chunks)}")
+    for pdf in list(manifest["files"]):
+        if pdf in present_files:
             continue
-        embedding = get_embedding(chunk_text)
-        index_chunk(index_name, chunk_text, embedding)
-        print(f"✅ Indexed chunk {i+1}/{len(chunks)}")
+        stale_ids = [chunk["chunk_id"] for chunk in manifest["files"][pdf]["chunks"]]
+        print(f"🗑️ Removing {len(stale_ids)} chunk(s) of removed document {pdf}")
+        deleted, failed_ids = backend.bulk_delete_chunks(index_name, stale_ids)
+        totals["deleted"] += deleted
+        if not failed_ids:
+            del manifest["files"][pdf]
+            save_manifest(index_name, manifest, backend.__name__)
+
+    if not totals["failed"]:
+        checkpoint.clear()
+    return totals
+
+def rebuild_index(pdf_files, alias, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS, backend=None,
+                  processes=1, pages_per_task=0, index_profile=None):
+    """
+    Full rebuild without downtime: ingests every file into a fresh, timestamped index, then
+    atomically points alias at it and deletes the index it replaced. The live index keeps
+    serving until the swap, and is left untouched if any chunk fails. If a previous rebuild was
+    interrupted (or failed), its checkpoint is picked up: the run continues in the same new index
+    and skips the chunks already written there. The new index is created with index_profile
+    (see index_profiles.py), which is also how an index moves to a different profile.
+
+    :return: Dict with indexed, failed, resumed and seconds totals.
+    """
+    backend = backend or get_backend()
+    profile_name = get_profile(index_profile)["name"]
+    totals = {"indexed": 0, "failed": 0, "resumed": 0, "seconds": 0.0}
+    checkpoint, run = _open_checkpoint(alias, backend, "rebuild", profile_name)
+    if run is not None:
+        new_index = run["target_index"]
+        if backend.create_index(index_to_create=new_index, recreate=False, profile=profile_name):
+            checkpoint.start("rebuild", new_index, profile_name) # The index was gone, so start over in a fresh one
+        else:
+            print(f"⏩ Resuming the interrupted rebuild into {new_index}: {checkpoint.chunk_count()} chunk(s) were already written.")
+    else:
+        new_index = f"{alias}-{time.strftime('%Y%m%d%H%M%S')}"
+        backend.create_index(index_to_create=new_index, profile=profile_name)
+        checkpoint.start("rebuild", new_index, profile_name)
+
+    manifest = {"index_profile": profile_name, "files": {}}
+    digests = {}
+    for pdf in pdf_files:
+        if os.path.exists(pdf):
+            digests[pdf] = file_hash(pdf)
+        else:
+            print(f"⚠️ PDF file not found: {pdf}. Skipping.")
+    _remove_orphans(checkpoint, new_index, backend, digests)
+
+    for pdf, chunks in extract_pdfs(list(digests), processes, pages_per_task):
+        print(f"\n📥 Ingesting: {pdf}")
+        seen = []
+        skipped = {"chunks": 0}
+        documents = _resumable(_track(pdf_documents(pdf, chunks), seen), checkpoint.completed(pdf, digests[pdf]), skipped)
+        _add_stats(totals, index_documents(documents, new_index, batch_size, max_workers, backend,
+                                           on_indexed=lambda docs, pdf=pdf: checkpoint.record(pdf, digests[pdf], docs),
+                                           index_profile=profile_name))
+        totals["resumed"] += skipped["chunks"]
+        if skipped["chunks"]:
+            print(f"⏩ Skipped {skipped['chunks']} chunk(s) already written by the interrupted run.")
+        manifest["files"][pdf] = manifest_entry(digests[pdf], seen)
+
+    if totals["failed"]:
+        print(f"❌ {totals['failed']} chunk(s) failed. {alias} still points to the previous index; re-run to retry them in {new_index}.")
+        return totals
+
+    for old_index in backend.swap_alias(alias, new_index):
+        backend.delete_index(old_index)
+        print(f"🗑️ Deleted previous index: {old_index}")
+    save_manifest(alias, manifest, backend.__name__)
+    checkpoint.clear()
+    return totals
+
+def print_throughput(stats):
+    rate = stats["indexed"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    print(f"📊 Indexed {stats['indexed']} chunks ({stats['failed']} failed) in {stats['seconds']:.1f}s — {rate:.1f} chunks/sec")
+    if stats.get("deleted"):
+        print(f"🗑️ Deleted {stats['deleted']} stale chunks")
+    if stats.get("resumed"):
+        print(f"⏩ Resumed after {stats['resumed']} chunks written by an interrupted run")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest PDF files into an OpenSearch index.")
+    parser.add_argument("--mode", choices=["incremental", "rebuild"], default="incremental",
+                        help="incremental: only embed new/changed chunks. rebuild: build a new index and swap the alias.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help="Where to write the chunks: the OpenSearch collection or the local vector store.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Chunks per _bulk request.")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS, help="Concurrent embedding calls.")
+    parser.add_argument("--processes", type=int, default=1, help="Processes for PDF extraction (1 = extract in this process).")
+    parser.add_argument("--pages-per-task", type=int, default=0, help="Split each PDF into page ranges of this size (0 = one task per file).")
+    parser.add_argument("--precompute-faq", action="store_true",
+                        help="Afterwards, precompute answers for new or changed sections for the bots using this index (see faq_precompute.py).")
+    parser.add_argument("--index-profile", default=None,
+                        help="Embedding model, dimensions and vector encoding of the index (see index_profiles.py). "
+                             "Defaults to the index_profile of the bot using this index.")
+    args = parser.parse_args()
+
     # Set your OpenSearch index name
     # This should match one of the keys in CHATBOT_CONFIGS or be passed as an argument
     # For simplicity, keeping it hardcoded for SkyConnect for this example.
     # If you are using the multi-bot setup from app.py, you'd want to make this
     # dynamic (e.g., run this script separately for each bot's index_name).
+    # In rebuild mode this name is an alias pointing at a timestamped index.
 
     # To ingest for SkyConnect:
     target_index_name = "skyconnect-knowledge-base"
@@ -78,14 +493,30 @@ if __name__ == "__main__":
     #     "data/university_academic_policies.pdf"
     # ]
 
-    print(f"\n--- Preparing to ingest data for index: {target_index_name} ---")
-    create_index(index_to_create=target_index_name) # Assuming create_index is modified
+    from chatbot_configs import CHATBOT_CONFIGS
+    index_profile = args.index_profile or next(
+        (config["index_profile"] for config in CHATBOT_CONFIGS.values()
+         if config.get("opensearch_index_name") == target_index_name and config.get("index_profile")),
+        DEFAULT_INDEX_PROFILE,
+    )
 
-    # Step 2: PDF files to ingest
-    for pdf in target_pdf_files:
-        if os.path.exists(pdf):
-            ingest_pdf(pdf, target_index_name)
-        else:
-            print(f"⚠️ PDF file not found: {pdf}. Skipping.")
-    
-    print("\n--- Ingestion process complete. ---")
\ No newline at end of file
+    print(f"\n--- Preparing to ingest data for index: {target_index_name} ({args.mode}, {index_profile} profile) ---")
+    backend = get_backend(args.backend)
+    if args.mode == "rebuild":
+        totals = rebuild_index(target_pdf_files, target_index_name, args.batch_size, args.max_workers, backend,
+                               args.processes, args.pages_per_task, index_profile)
+    else:
+        totals = ingest_incremental(target_pdf_files, target_index_name, args.batch_size, args.max_workers, backend,
+                                    args.processes, args.pages_per_task, index_profile)
+
+    if totals["indexed"] or totals.get("deleted"):
+        mark_index_updated(target_index_name) # Drop answers cached against the old content
+    if args.precompute_faq and not totals["failed"]:
+        from faq_precompute import precompute_faq # Deferred: faq_precompute imports this module
+        for bot_key, config in CHATBOT_CONFIGS.items():
+            if config.get("faq") and config.get("opensearch_index_name") == target_index_name:
+                precompute_faq({**config, "retrieval_backend": args.backend}, target_pdf_files)
+    print("\n--- Ingestion process complete. ---")
+    print_throughput(totals)
+    print_cache_stats()
+    print(f"📈 Stage metrics written to {write_metrics_file()}")
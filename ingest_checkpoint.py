@@ -0,0 +1,113 @@
+# ingest_checkpoint.py
+import os
+import json
+import time
+from embedding_cache import CACHE_DIR
+
+# ---------- Configuration ----------
+CHECKPOINT_DIR = os.path.join(CACHE_DIR, "checkpoints")
+# -----------------------------------
+
+# A checkpoint is the write-ahead record of an ingest run that has not finished yet. It is an
+# append-only JSON-lines file per backend and index: a header naming the run, then one line per
+# _bulk batch that was written, listing the chunks it indexed:
+#
+#   {"run": {"mode": "rebuild", "target_index": "skyconnect-knowledge-base-20250101120000", "index_profile": "nmslib-float", "started": ...}}
+#   {"file": "data/SkyConnect_Flights.pdf", "file_hash": "...", "chunks": [["<chunk_id>", "<chunk_hash>"], ...]}
+#
+# Lines are flushed and fsynced before the next batch starts, so after a crash or kill the file
+# lists every chunk that made it into the index; at most the last line is cut short, and it is
+# ignored. A restarted run skips those chunks. Document IDs are deterministic (see
+# ingest_manifest.chunk_id), so a chunk written again by an overlapping run overwrites itself.
+# Embeddings are not repeated here: they are already stored by the embedding cache, keyed by
+# content, so chunks embedded but not yet written are not re-embedded either.
+# The file is deleted once the run has completed.
+
+class IngestCheckpoint:
+    def __init__(self, index_name, backend_name="opensearch_client"):
+        self.path = os.path.join(CHECKPOINT_DIR, backend_name, f"{index_name}.jsonl")
+        self.run = None
+        self._done = {} # (file, file_hash) -> {chunk_id: chunk_hash}
+
+    def load(self):
+        """
+        Reads an existing checkpoint.
+        :return: The interrupted run's header dict, or None if there is no checkpoint.
+        """
+        self.run, self._done = None, {}
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return None
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue # A line cut short by the crash
+            if "run" in entry:
+                self.run = entry["run"]
+                continue
+            self._done.setdefault((entry["file"], entry["file_hash"]), {}).update(entry["chunks"])
+        return self.run
+
+    def start(self, mode, target_index, index_profile=None):
+        """
+        Starts a new checkpoint for a run, replacing any previous one.
+        """
+        self.run = {"mode": mode, "target_index": target_index, "index_profile": index_profile, "started": time.time()}
+        self._done = {}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            f.write(json.dumps({"run": self.run}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record(self, file_path, file_digest, documents):
+        """
+        Appends the chunks of one written batch and makes the line durable before returning.
+        """
+        if not documents:
+            return
+        chunks = [[doc["chunk_id"], doc["chunk_hash"]] for doc in documents]
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"file": file_path, "file_hash": file_digest, "chunks": chunks}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._done.setdefault((file_path, file_digest), {}).update(chunks)
+
+    def completed(self, file_path, file_digest):
+        """
+        :return: Set of chunk IDs of this version of the file that the run already indexed.
+        """
+        return set(self._done.get((file_path, file_digest), {}))
+
+    def orphaned(self, current_digests, keep_ids=()):
+        """
+        Chunk IDs the interrupted run indexed for file versions that are no longer current (the
+        file changed or was dropped since), excluding IDs that current versions also use.
+
+        :param current_digests: Dict of {file: file_hash} being ingested now.
+        :param keep_ids: Further IDs that must not be deleted, e.g. from the manifest.
+        """
+        current_ids = set(keep_ids)
+        for (file_path, file_digest), chunks in self._done.items():
+            if current_digests.get(file_path) == file_digest:
+                current_ids.update(chunks)
+        return sorted(
+            chunk_id
+            for (file_path, file_digest), chunks in self._done.items()
+            if current_digests.get(file_path) != file_digest
+            for chunk_id in chunks
+            if chunk_id not in current_ids
+        )
+
+    def chunk_count(self):
+        return sum(len(chunks) for chunks in self._done.values())
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.run, self._done = None, {}
@@ -0,0 +1,81 @@
+# ingest_manifest.py
+import os
+import json
+import hashlib
+from embedding_cache import CACHE_DIR, normalize_text
+
+# ---------- Configuration ----------
+MANIFEST_DIR = os.path.join(CACHE_DIR, "manifests")
+# -----------------------------------
+
+# The manifest records, per index, which source files were ingested and the content hash and
+# document ID of every chunk they produced:
+#
+#   {"index_profile": "nmslib-float",
+#    "files": {"data/SkyConnect_Flights.pdf": {"file_hash": "...",
+#                                              "chunks": [{"chunk_id": "...", "chunk_hash": "..."}]}}}
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_hash(chunk_text):
+    return hashlib.sha256(normalize_text(chunk_text).encode("utf-8")).hexdigest()
+
+def chunk_id(source_file, chunk_text_hash, occurrence=0):
+    """
+    Deterministic OpenSearch document ID for a chunk. The same chunk of the same file always maps
+    to the same ID, so re-indexing it overwrites instead of duplicating. occurrence tells apart
+    identical chunks repeated within one file.
+    """
+    return hashlib.sha256(f"{source_file}|{chunk_text_hash}|{occurrence}".encode("utf-8")).hexdigest()[:32]
+
+def iter_chunk_documents(source_file, chunks):
+    """
+    Turns a file's chunks (texts, or dicts with chunk_text and page metadata) into documents
+    carrying source_file, chunk_hash and chunk_id. Works on a stream of chunks.
+    """
+    seen = {}
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = {"chunk_text": chunk}
+        text_hash = chunk_hash(chunk["chunk_text"])
+        occurrence = seen.get(text_hash, 0)
+        seen[text_hash] = occurrence + 1
+        yield {
+            **chunk,
+            "chunk_id": chunk_id(source_file, text_hash, occurrence),
+            "chunk_hash": text_hash,
+            "source_file": source_file,
+        }
+
+def build_chunk_documents(source_file, chunks):
+    return list(iter_chunk_documents(source_file, chunks))
+
+def manifest_path(index_name, backend_name="opensearch_client"):
+    # One manifest per backend, so the same index name can be ingested into OpenSearch and locally.
+    return os.path.join(MANIFEST_DIR, backend_name, f"{index_name}.json")
+
+def load_manifest(index_name, backend_name="opensearch_client"):
+    try:
+        with open(manifest_path(index_name, backend_name)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"files": {}}
+
+def save_manifest(index_name, manifest, backend_name="opensearch_client"):
+    path = manifest_path(index_name, backend_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path) # Atomic, so a crash never leaves a half-written manifest
+
+def manifest_entry(file_digest, documents):
+    return {
+        "file_hash": file_digest,
+        "chunks": [{"chunk_id": doc["chunk_id"], "chunk_hash": doc["chunk_hash"]} for doc in documents],
+    }
@@ -0,0 +1,519 @@
+# local_vector_store.py
+import os
+import re
+import math
+import json
+import uuid
+import shutil
+import threading
+import numpy as np
+from embedding_cache import CACHE_DIR
+from retrieval import reciprocal_rank_fusion
+from metrics import timed
+from index_profiles import get_profile, local_dtype
+
+# ---------- Configuration ----------
+LOCAL_STORE_DIR = os.environ.get("SKYCONNECT_LOCAL_STORE_DIR", os.path.join(CACHE_DIR, "vector_store"))
+EMBEDDING_DIM = 1536         # Titan Embedding model output size
+DEFAULT_DTYPE = "float32"    # "float16"/"int8" cut memory and disk; queries cast them to float32 block by block, so they are slower
+SEARCH_BLOCK_ROWS = 1024     # Rows cast to float32 at a time when scoring a float16 matrix
+COMPACT_RATIO = 0.25         # Rewrite the files once this share of rows is deleted
+BM25_K1 = 1.2                # Same BM25 defaults as OpenSearch
+BM25_B = 0.75
+# -----------------------------------
+
+# On-disk layout of one store (one directory per index):
+#   embeddings.bin  raw row-major matrix of float32/float16/int8, memory-mapped for search
+#   chunks.jsonl    one JSON document per row, in row order (chunk text and metadata)
+#   meta.json       {"dimension", "dtype", "rows", "deleted": [row, ...]}, written last
+# Writes only ever append rows; deletes and overwrites are tombstones until compaction.
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+def _tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+def _matvec(matrix, query):
+    # BLAS only handles float32/float64; a float16 or int8 matmul falls back to a slow loop, so
+    # score those matrices in float32 blocks instead.
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    scores = np.empty(matrix.shape[0], dtype=np.float32)
+    for start in range(0, matrix.shape[0], SEARCH_BLOCK_ROWS):
+        block = matrix[start:start + SEARCH_BLOCK_ROWS]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query
+    return scores
+
+def _inverse_norms(matrix):
+    # Block by block too, so loading a float16/int8 store never materialises a float32 copy.
+    norms = np.empty(matrix.shape[0], dtype=np.float32)
+    for start in range(0, matrix.shape[0], SEARCH_BLOCK_ROWS):
+        block = matrix[start:start + SEARCH_BLOCK_ROWS]
+        norms[start:start + len(block)] = np.linalg.norm(block.astype(np.float32), axis=1)
+    norms[norms == 0] = 1.0
+    return 1.0 / norms
+
+
+class LocalVectorStore:
+    """
+    In-process vector store: embeddings live in a memory-mapped contiguous matrix with the chunk
+    documents alongside, and top-k queries are answered by vectorized cosine similarity (or an
+    optional in-memory HNSW graph built with hnswlib). Results have the same shape as OpenSearch
+    hits, so it can stand in for opensearch_client. use_hnsw is the default for search(); each
+    call can override it.
+    """
+
+    def __init__(self, path, dimension=EMBEDDING_DIM, dtype=DEFAULT_DTYPE, use_hnsw=False):
+        self.path = path
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.use_hnsw = use_hnsw
+        self._lock = threading.RLock()
+        self._meta_mtime = None
+        self._hnsw = None
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # ---------- Files ----------
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._file("meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self):
+        meta = {"dimension": self.dimension, "dtype": self.dtype.name, "rows": self.rows, "deleted": sorted(self._deleted)}
+        tmp_path = self._file(f"meta.json.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._file("meta.json"))
+        self._meta_mtime = os.stat(self._file("meta.json")).st_mtime_ns
+
+    def _load(self):
+        with self._lock:
+            meta = self._read_meta()
+            if meta is None:
+                self.rows = 0
+                self._deleted = set()
+                self._documents = []
+            else:
+                self.dimension = meta["dimension"]
+                self.dtype = np.dtype(meta["dtype"])
+                self.rows = meta["rows"]
+                self._deleted = set(meta["deleted"])
+                self._documents = []
+                with open(self._file("chunks.jsonl")) as f:
+                    for line in f:
+                        if len(self._documents) == self.rows: # Ignore lines past a crashed append
+                            break
+                        self._documents.append(json.loads(line))
+                self._meta_mtime = os.stat(self._file("meta.json")).st_mtime_ns
+
+            self._map_matrix()
+            self._inv_norms_buffer = _inverse_norms(self._matrix)
+            self._inv_norms = self._inv_norms_buffer
+            self._ids = {doc["chunk_id"]: row for row, doc in enumerate(self._documents) if row not in self._deleted}
+            self._deleted_rows = None
+            self._hnsw = None
+            self._postings = None
+
+    def _map_matrix(self):
+        # Re-mapping after an append is cheap: nothing is read until a search touches the pages.
+        if self.rows:
+            self._matrix = np.memmap(self._file("embeddings.bin"), dtype=self.dtype, mode="r", shape=(self.rows, self.dimension))
+        else:
+            self._matrix = np.empty((0, self.dimension), dtype=self.dtype)
+
+    def _appended(self, first_row, vectors, replaced_rows):
+        # Brings the in-memory state up to date after upsert appended rows first_row.. without
+        # re-reading the store: norms, the HNSW graph and the BM25 postings grow by the new rows only.
+        self._map_matrix()
+        if len(self._inv_norms_buffer) < self.rows: # Grow geometrically so batched ingest stays linear
+            buffer = np.empty(max(self.rows, 2 * len(self._inv_norms_buffer)), dtype=np.float32)
+            buffer[:first_row] = self._inv_norms_buffer[:first_row]
+            self._inv_norms_buffer = buffer
+        self._inv_norms_buffer[first_row:self.rows] = _inverse_norms(vectors)
+        self._inv_norms = self._inv_norms_buffer[:self.rows]
+        new_rows = range(first_row, self.rows)
+        if self._hnsw is not None:
+            if self._hnsw.get_max_elements() < self.rows:
+                self._hnsw.resize_index(max(self.rows, 2 * self._hnsw.get_max_elements()))
+            self._hnsw.add_items(np.asarray(vectors, dtype=np.float32), np.asarray(new_rows))
+        if self._postings is not None:
+            for row in new_rows:
+                self._index_terms(row)
+        self._removed(replaced_rows)
+
+    def _removed(self, rows):
+        # Same for rows that were tombstoned by an overwrite or delete.
+        self._deleted_rows = None
+        for row in rows:
+            if self._hnsw is not None:
+                self._hnsw.mark_deleted(row)
+            if self._postings is not None:
+                self._unindex_terms(row)
+
+    def _reload_if_changed(self):
+        # Another process (e.g. ingest.py) may have written to the store since we loaded it.
+        try:
+            mtime = os.stat(self._file("meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._meta_mtime:
+            self._load()
+
+    # ---------- Writes ----------
+    def upsert(self, documents):
+        """
+        Adds documents (dicts with an embedding plus chunk_text and metadata). A document whose
+        chunk_id is already stored replaces the old one.
+
+        :return: Number of documents written.
+        """
+        if not documents:
+            return 0
+        with self._lock:
+            self._reload_if_changed()
+            vectors = np.asarray([doc["embedding"] for doc in documents], dtype=self.dtype)
+            if not self.rows:
+                self.dimension = vectors.shape[1] # An empty store takes the dimension of its first write
+            if vectors.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-dim embeddings, got {vectors.shape[1]}")
+
+            records = []
+            replaced_rows = []
+            for row, doc in enumerate(documents, start=self.rows):
+                record = {key: value for key, value in doc.items() if key != "embedding"}
+                record.setdefault("chunk_id", uuid.uuid4().hex)
+                if record["chunk_id"] in self._ids:
+                    replaced_rows.append(self._ids[record["chunk_id"]])
+                    self._deleted.add(replaced_rows[-1])
+                self._ids[record["chunk_id"]] = row
+                records.append(record)
+
+            with open(self._file("embeddings.bin"), "ab") as f:
+                f.write(np.ascontiguousarray(vectors).tobytes())
+            with open(self._file("chunks.jsonl"), "a") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            first_row = self.rows
+            self.rows += len(records)
+            self._documents.extend(records)
+            self._write_meta()
+            if self._compact_if_needed():
+                self._load()
+            else:
+                self._appended(first_row, vectors, replaced_rows)
+            return len(records)
+
+    def delete(self, chunk_ids):
+        """
+        :return: Number of IDs handled (missing IDs count as deleted, like a 404 on OpenSearch).
+        """
+        with self._lock:
+            self._reload_if_changed()
+            removed_rows = [self._ids.pop(chunk_id) for chunk_id in set(chunk_ids) if chunk_id in self._ids]
+            self._deleted.update(removed_rows)
+            self._write_meta()
+            if self._compact_if_needed():
+                self._load()
+            else:
+                self._removed(removed_rows)
+            return len(chunk_ids)
+
+    def _compact_if_needed(self):
+        # Caller holds the lock. Returns True if the files were rewritten, so rows were renumbered.
+        if not self.rows or len(self._deleted) / self.rows < COMPACT_RATIO:
+            return False
+        keep = [row for row in range(self.rows) if row not in self._deleted]
+        matrix = np.memmap(self._file("embeddings.bin"), dtype=self.dtype, mode="r", shape=(self.rows, self.dimension))
+        with open(self._file("embeddings.bin.tmp"), "wb") as f:
+            f.write(np.ascontiguousarray(matrix[keep]).tobytes())
+        del matrix
+        with open(self._file("chunks.jsonl.tmp"), "w") as f:
+            for row in keep:
+                f.write(json.dumps(self._documents[row]) + "\n")
+        os.replace(self._file("embeddings.bin.tmp"), self._file("embeddings.bin"))
+        os.replace(self._file("chunks.jsonl.tmp"), self._file("chunks.jsonl"))
+        self.rows = len(keep)
+        self._deleted = set()
+        self._write_meta()
+        return True
+
+    def attach(self, embeddings_path, chunks_path, rows):
+        """
+        Fills an empty store with files already in its on-disk layout (raw matrix of its dtype
+        and dimension, one JSON document per row), e.g. from a snapshot. They are copied, not
+        linked, since later upserts append to them, and memory-mapped like any other store.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            if self.rows:
+                raise ValueError(f"Can only attach files to an empty store; {self.path} has {self.rows} rows")
+            expected = rows * self.dimension * self.dtype.itemsize
+            if os.path.getsize(embeddings_path) != expected:
+                raise ValueError(f"{embeddings_path} has {os.path.getsize(embeddings_path)} bytes, expected {expected}")
+            for source, name in ((embeddings_path, "embeddings.bin"), (chunks_path, "chunks.jsonl")):
+                shutil.copyfile(source, self._file(name))
+            self.rows = rows
+            self._deleted = set()
+            self._write_meta()
+            self._load()
+
+    # ---------- Reads ----------
+    def __len__(self):
+        return len(self._ids)
+
+    def _build_hnsw(self):
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("use_hnsw=True needs the hnswlib package: pip install hnswlib")
+        live_rows = np.array(sorted(self._ids.values()), dtype=np.int64)
+        index = hnswlib.Index(space="cosine", dim=self.dimension)
+        index.init_index(max_elements=max(self.rows, 1), ef_construction=200, M=16)
+        for start in range(0, len(live_rows), SEARCH_BLOCK_ROWS):
+            rows = live_rows[start:start + SEARCH_BLOCK_ROWS]
+            index.add_items(np.asarray(self._matrix[rows], dtype=np.float32), rows)
+        index.set_ef(100)
+        self._hnsw = index
+
+    def _build_postings(self):
+        # Inverted index over chunk_text for BM25: term -> {row: term frequency}.
+        self._postings = {}
+        self._doc_lengths = {}
+        self._total_doc_length = 0
+        for row in self._ids.values():
+            self._index_terms(row)
+
+    def _index_terms(self, row):
+        tokens = _tokenize(self._documents[row].get("chunk_text", ""))
+        self._doc_lengths[row] = len(tokens)
+        self._total_doc_length += len(tokens)
+        for token in tokens:
+            frequencies = self._postings.setdefault(token, {})
+            frequencies[row] = frequencies.get(row, 0) + 1
+
+    def _unindex_terms(self, row):
+        self._total_doc_length -= self._doc_lengths.pop(row, 0)
+        for token in set(_tokenize(self._documents[row].get("chunk_text", ""))):
+            frequencies = self._postings.get(token, {})
+            frequencies.pop(row, None)
+            if not frequencies:
+                self._postings.pop(token, None)
+
+    def lexical_search(self, query_text, k=5, include_vectors=False):
+        """
+        Returns the top k chunks by BM25 over chunk_text, as OpenSearch-style hits.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            if self._postings is None:
+                self._build_postings()
+            doc_count = len(self._doc_lengths)
+            avg_doc_length = self._total_doc_length / doc_count if doc_count else 0.0
+            scores = {}
+            for token in set(_tokenize(query_text)):
+                frequencies = self._postings.get(token)
+                if not frequencies:
+                    continue
+                idf = math.log(1 + (doc_count - len(frequencies) + 0.5) / (len(frequencies) + 0.5))
+                for row, tf in frequencies.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[row] / avg_doc_length)
+                    scores[row] = scores.get(row, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            top = sorted(scores, key=scores.get, reverse=True)[:k]
+            return [self._hit(row, scores[row], include_vectors) for row in top]
+
+    def _hit(self, row, score, include_vectors=False):
+        source = self._documents[row]
+        if include_vectors:
+            source = {**source, "embedding": np.asarray(self._matrix[row], dtype=np.float32).tolist()}
+        return {"_index": os.path.basename(self.path), "_id": self._documents[row]["chunk_id"], "_score": float(score), "_source": source}
+
+    def get_vectors(self, chunk_ids):
+        """
+        Returns {chunk_id: float32 vector} for the given IDs that exist in the store.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            return {
+                chunk_id: np.asarray(self._matrix[self._ids[chunk_id]], dtype=np.float32)
+                for chunk_id in chunk_ids if chunk_id in self._ids
+            }
+
+    def get_documents(self, chunk_ids):
+        """
+        Returns {chunk_id: document with its float32 embedding as a list} for the given IDs that exist.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            return {
+                chunk_id: self._hit(self._ids[chunk_id], 0.0, include_vectors=True)["_source"]
+                for chunk_id in chunk_ids if chunk_id in self._ids
+            }
+
+    def search(self, query_embedding, k=5, include_vectors=False, use_hnsw=None):
+        """
+        Returns the top k chunks by cosine similarity, as OpenSearch-style hits:
+        [{"_id": ..., "_score": ..., "_source": {...}}]. The stored embedding is only added to
+        _source when include_vectors is True. use_hnsw (default: the store's setting) answers
+        from the approximate HNSW graph, built on first use, instead of scoring every row.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            if not self._ids:
+                return []
+            query = np.asarray(query_embedding, dtype=np.float32)
+            query_norm = np.linalg.norm(query)
+            if query_norm == 0:
+                return []
+            k = min(k, len(self._ids))
+
+            if self.use_hnsw if use_hnsw is None else use_hnsw:
+                if self._hnsw is None:
+                    self._build_hnsw()
+                labels, distances = self._hnsw.knn_query(query, k=k)
+                rows, scores = labels[0], 1.0 - distances[0]
+            else:
+                # Score every row in place and rule out tombstones afterwards; selecting the live
+                # rows first would copy the whole matrix out of the memory map on every query.
+                similarities = _matvec(self._matrix, query) * self._inv_norms / query_norm
+                if self._deleted:
+                    if self._deleted_rows is None:
+                        self._deleted_rows = np.fromiter(self._deleted, dtype=np.int64, count=len(self._deleted))
+                    similarities[self._deleted_rows] = -np.inf
+                top = np.argpartition(-similarities, k - 1)[:k]
+                rows = top[np.argsort(-similarities[top])]
+                scores = similarities[rows]
+
+            return [self._hit(row, score, include_vectors) for row, score in zip(rows, scores)]
+
+
+# ---------- Drop-in functions mirroring opensearch_client ----------
+# One store per index name, each in its own directory under LOCAL_STORE_DIR. Aliases (used by
+# ingest.py --mode rebuild) are kept in aliases.json.
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def _aliases_path():
+    return os.path.join(LOCAL_STORE_DIR, "aliases.json")
+
+def _read_aliases():
+    try:
+        with open(_aliases_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _resolve(index_name):
+    return _read_aliases().get(index_name, index_name)
+
+def get_store(index_name):
+    """
+    Returns the process-wide LocalVectorStore for an index (or alias), opening it on first use.
+    Stores are shared by every bot, so HNSW is chosen per search (use_hnsw below), not per store.
+    """
+    index_name = _resolve(index_name)
+    with _stores_lock:
+        store = _stores.get(index_name)
+        if store is None:
+            store = _stores[index_name] = LocalVectorStore(os.path.join(LOCAL_STORE_DIR, index_name))
+        return store
+
+def delete_index(index_name):
+    with _stores_lock:
+        _stores.pop(index_name, None)
+    shutil.rmtree(os.path.join(LOCAL_STORE_DIR, index_name), ignore_errors=True)
+
+def create_index(index_to_create, recreate=True, profile=None):
+    # The profile's dimension and vector encoding (float32, float16 or int8 rows) apply; its HNSW
+    # parameters are OpenSearch-only.
+    store_path = os.path.join(LOCAL_STORE_DIR, _resolve(index_to_create))
+    if os.path.exists(os.path.join(store_path, "meta.json")):
+        if not recreate:
+            print(f"ℹ️ Local store {index_to_create} already exists. Keeping it.")
+            return False
+        delete_index(_resolve(index_to_create))
+    profile = get_profile(profile)
+    store = get_store(index_to_create)
+    with store._lock:
+        store.dimension, store.dtype = profile["dimensions"], np.dtype(local_dtype(profile))
+        for name in ("embeddings.bin", "chunks.jsonl"):
+            open(store._file(name), "ab").close()
+        store._write_meta()
+        store._load()
+    print(f"✅ Created local store: {index_to_create} ({profile['name']} profile)")
+    return True
+
+def bulk_index_chunks(index_name, documents, max_retries=3, retry_backoff=1.0):
+    with timed("bulk_index", index=index_name, backend="local"):
+        return get_store(index_name).upsert(documents), []
+
+def bulk_delete_chunks(index_name, chunk_ids, max_retries=3, retry_backoff=1.0):
+    with timed("bulk_delete", index=index_name, backend="local"):
+        return get_store(index_name).delete(chunk_ids), []
+
+def swap_alias(alias, new_index):
+    aliases = _read_aliases()
+    old_index = aliases.get(alias)
+    if old_index is None and os.path.exists(os.path.join(LOCAL_STORE_DIR, alias)):
+        delete_index(alias)
+        print(f"🗑️ Deleted local store {alias} so it can become an alias")
+    aliases[alias] = new_index
+    os.makedirs(LOCAL_STORE_DIR, exist_ok=True)
+    tmp_path = f"{_aliases_path()}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(aliases, f)
+    os.replace(tmp_path, _aliases_path())
+    print(f"🔀 Alias {alias} now points to {new_index}")
+    return [old_index] if old_index else []
+
+def get_chunk_vectors(index_name, chunk_ids):
+    if not chunk_ids:
+        return {}
+    return get_store(index_name).get_vectors(chunk_ids)
+
+def get_chunk_documents(index_name, chunk_ids):
+    if not chunk_ids:
+        return {}
+    return get_store(index_name).get_documents(chunk_ids)
+
+def attach_files(index_name, embeddings_path, chunks_path, rows):
+    # Local-only bulk load for snapshot.py: no per-row writes, the files are mapped as they are.
+    get_store(index_name).attach(embeddings_path, chunks_path, rows)
+    print(f"✅ Attached {rows} rows to local store: {index_name}")
+
+# use_hnsw is local-only: retrieval.search_for_bot passes it for bots with "local_hnsw" set.
+def search_chunks(index_name, query_embedding, k=5, include_vectors=False, use_hnsw=False):
+    if not index_name:
+        print("⚠️ Index name cannot be empty for searching. Returning empty results.")
+        return []
+    with timed("search_knn", index=index_name, k=k, backend="local", hnsw=use_hnsw):
+        return get_store(index_name).search(query_embedding, k=k, include_vectors=include_vectors, use_hnsw=use_hnsw)
+
+def search_chunks_batch(index_name, query_embeddings, k=5, include_vectors=False, use_hnsw=False):
+    if not index_name:
+        print("⚠️ Index name cannot be empty for searching. Returning empty results.")
+        return [[] for _ in query_embeddings]
+    with timed("search_knn_batch", index=index_name, k=k, queries=len(query_embeddings), backend="local", hnsw=use_hnsw):
+        store = get_store(index_name)
+        return [store.search(query_embedding, k=k, include_vectors=include_vectors, use_hnsw=use_hnsw) for query_embedding in query_embeddings]
+
+def hybrid_search_chunks(index_name, query_text, query_embedding, k=5, lexical_weight=1.0, vector_weight=1.0, candidates=None, include_vectors=False, use_hnsw=False):
+    if not index_name:
+        print("⚠️ Index name cannot be empty for searching. Returning empty results.")
+        return []
+    candidates = candidates or 4 * k
+    with timed("search_hybrid", index=index_name, k=k, candidates=candidates, backend="local", hnsw=use_hnsw):
+        store = get_store(index_name)
+        ranked_lists = [
+            store.lexical_search(query_text, k=candidates, include_vectors=include_vectors),
+            store.search(query_embedding, k=candidates, include_vectors=include_vectors, use_hnsw=use_hnsw),
+        ]
+    return reciprocal_rank_fusion(ranked_lists, weights=[lexical_weight, vector_weight], k=k)
@@ -0,0 +1,227 @@
+# metrics.py
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from embedding_cache import CACHE_DIR
+
+# ---------- Configuration ----------
+METRICS_FILE = os.environ.get("SKYCONNECT_METRICS_FILE", os.path.join(CACHE_DIR, "metrics.prom")) # Prometheus text format
+METRICS_FLUSH_SECONDS = float(os.environ.get("SKYCONNECT_METRICS_FLUSH_SECONDS", "10")) # Minimum time between file writes
+METRICS_PORT = int(os.environ.get("SKYCONNECT_METRICS_PORT", "0"))   # Serve /metrics on this port; 0 disables it
+METRICS_LOG = os.environ.get("SKYCONNECT_METRICS_LOG")                # Also append one JSON line per stage to this file
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) # Seconds
+# -----------------------------------
+
+# Every timed stage (an embedding call, a search, an LLM call, an ingest batch) becomes a span:
+# a dict with stage, seconds, status and whatever the caller adds (request_bytes, response_bytes,
+# retries, cache_hit, ...). Spans are
+#   - logged as one JSON line on the "skyconnect.metrics" logger (errors at WARNING),
+#   - aggregated into Prometheus counters and histograms labelled by stage and status,
+#   - collected into the current trace, if the thread has one open (see trace()).
+
+logger = logging.getLogger("skyconnect.metrics")
+if METRICS_LOG:
+    _handler = logging.FileHandler(METRICS_LOG)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, gauges and histograms, rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}   # (name, labels) -> value
+        self._gauges = {}     # (name, labels) -> value
+        self._histograms = {} # (name, labels) -> [bucket counts..., sum, count]
+        self._help = {}
+
+    def inc(self, name, value=1, help_text=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def set(self, name, value, help_text=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def observe(self, name, value, help_text=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def render(self):
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}" if pairs else ""
+
+        lines = []
+        with self._lock:
+            for kind, series in (("counter", self._counters), ("gauge", self._gauges), ("histogram", self._histograms)):
+                for name in sorted({name for name, _ in series}):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (series_name, labels), value in sorted(series.items()):
+                        if series_name != name:
+                            continue
+                        if kind != "histogram":
+                            lines.append(f"{name}{label_text(labels)} {value}")
+                            continue
+                        for bound, count in zip(self.buckets, value):
+                            lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {count}")
+                        lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {value[-1]}")
+                        lines.append(f"{name}_sum{label_text(labels)} {value[-2]}")
+                        lines.append(f"{name}_count{label_text(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+_local = threading.local()
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+def record_span(span):
+    """
+    Logs a finished span, adds it to the metrics and to the trace it was started in.
+    """
+    stage, status = span["stage"], span["status"]
+    registry.observe("skyconnect_stage_seconds", span["seconds"], "Duration of each pipeline stage.", stage=stage, status=status)
+    for direction in ("request", "response"):
+        if span.get(f"{direction}_bytes"):
+            registry.inc("skyconnect_stage_bytes_total", span[f"{direction}_bytes"], "Payload bytes sent and received per stage.", stage=stage, direction=direction)
+    if span.get("retries"):
+        registry.inc("skyconnect_stage_retries_total", span["retries"], "Retries made within each stage.", stage=stage)
+    if "cache_hit" in span:
+        registry.inc("skyconnect_cache_lookups_total", 1, "Cache lookups per stage by result.", stage=stage, result="hit" if span["cache_hit"] else "miss")
+
+    logger.log(logging.WARNING if status == "error" else logging.INFO, json.dumps(span, default=str))
+    maybe_write_metrics_file()
+
+@contextmanager
+def timed(stage, **fields):
+    """
+    Times the with-block as a span for stage. The yielded dict can be filled in by the block;
+    set "error" on it to record a failure that was handled rather than raised.
+    """
+    span = {"stage": stage, **fields}
+    spans = getattr(_local, "spans", None) # Captured now, so spans closed later (e.g. by a generator) still land in this trace
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit): # A stream closed early is not an error
+            span.setdefault("error", repr(e))
+        raise
+    finally:
+        span["seconds"] = time.perf_counter() - start
+        span["status"] = "error" if "error" in span else "ok"
+        span["timestamp"] = time.time()
+        if spans is not None:
+            spans.append(span)
+        record_span(span)
+
+@contextmanager
+def trace():
+    """
+    Collects the spans finished on this thread during the with-block into the yielded list,
+    e.g. the timing breakdown of one chat turn.
+    """
+    previous = getattr(_local, "spans", None)
+    _local.spans = spans = []
+    try:
+        yield spans
+    finally:
+        _local.spans = previous
+
+def stage_seconds(spans):
+    """
+    :return: Total seconds per stage (embed, search_hybrid, llm_stream, ...) of a trace's spans.
+    """
+    stages = {}
+    for span in spans or []:
+        stages[span["stage"]] = stages.get(span["stage"], 0.0) + span.get("seconds", 0.0)
+    return stages
+
+def write_metrics_file(path=None):
+    """
+    Writes all metrics to path (METRICS_FILE by default) in Prometheus text format, e.g. for the
+    node_exporter textfile collector.
+    """
+    global _last_flush
+    path = path or METRICS_FILE
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path) # Atomic, so a scraper never reads a partial file
+    _last_flush = time.monotonic()
+    return path
+
+def maybe_write_metrics_file():
+    if time.monotonic() - _last_flush < METRICS_FLUSH_SECONDS or not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        write_metrics_file()
+    except OSError as e:
+        logger.warning(json.dumps({"stage": "metrics_flush", "error": repr(e)}))
+    finally:
+        _flush_lock.release()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes would otherwise be printed to stderr
+
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port=None):
+    """
+    Serves /metrics over HTTP from a daemon thread. Safe to call on every Streamlit rerun;
+    only the first call starts the server. Does nothing if the port is 0.
+    """
+    global _server
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            print(f"📈 Serving metrics on http://0.0.0.0:{port}/metrics")
+    return _server
@@ -5,54 +5,9 @@ import streamlit as st
 # and might require re-running the app with query params, which we'll avoid for now.
 INITIAL_BOT_KEY = "airline_faq" # Default bot
 
-# --- CHATBOT CONFIGURATIONS (Keep this defined early) ---
-CHATBOT_CONFIGS = {
-    "airline_faq": {
-        "display_name": "✈️ SkyConnect Airlines Concierge",
-        "page_title": "SkyConnect Chatbot", # Used for initial st.set_page_config
-        "page_icon": "✈️",                 # Used for initial st.set_page_config
-        "header_title": "✈️ SkyConnect Airlines Concierge",
-        "header_subtitle": "Your personal assistant for flight schedules, baggage policies, and more!",
-        "header_title_color": "#000001",  # CHANGED TO BLACK
-        "header_subtitle_color": "#000001",
-        "background_image_url": "https://img.freepik.com/free-photo/airplane-runway-airport-sunset-travel-concept_587448-8154.jpg?ga=GA1.1.1907611749.1748313800&semt=ais_hybrid&w=740",
-        "opensearch_index_name": "skyconnect-knowledge-base",
-        "initial_assistant_message": "Hi there! I'm your SkyConnect Airlines Concierge. How can I assist you today regarding flights, baggage, or our policies?",
-        "assistant_avatar": "✈️",
-        "chat_input_placeholder": "Ask about SkyConnect flights or policies...",
-        "llm_persona_prompt": """You are SkyConnect Airlines' friendly and helpful assistant...""" # Truncated for brevity
-    },
-    "university_course": {
-        "display_name": "🎓 University Course Advisor",
-        "page_title": "University Course Chatbot",
-        "page_icon": "🎓",
-        "header_title": "🎓 University Course Advisor",
-        "header_subtitle": "Ask about course details, prerequisites, and academic programs.",
-        "header_title_color": "#000001",
-        "header_subtitle_color": "#000001",
-        "background_image_url": "https://images.pexels.com/photos/267885/pexels-photo-267885.jpeg?auto=compress&cs=tinysrgb&w=1260&h=750&dpr=1",
-        "opensearch_index_name": "university-course-knowledge-base",
-        "initial_assistant_message": "Hello! I'm the University Course Advisor. Backend for this bot is under construction.",
-        "assistant_avatar": "🎓",
-        "chat_input_placeholder": "Ask about courses (UI Demo)...",
-        "llm_persona_prompt": "Placeholder persona for University Bot."
-    },
-    "coffee_shop": {
-        "display_name": "☕ Coffee Corner Bot",
-        "page_title": "Coffee Corner Chatbot",
-        "page_icon": "☕",
-        "header_title": "☕ Coffee Corner Bot",
-        "header_subtitle": "Your guide to our menu, special offers, and opening hours!",
-        "header_title_color": "#000001",
-        "header_subtitle_color": "#000001",
-        "background_image_url": "https://images.pexels.com/photos/302899/pexels-photo-302899.jpeg?auto=compress&cs=tinysrgb&w=1260&h=750&dpr=1",
-        "opensearch_index_name": "coffee-shop-knowledge-base",
-        "initial_assistant_message": "Welcome to Coffee Corner! Backend for this bot is coming soon.",
-        "assistant_avatar": "☕",
-        "chat_input_placeholder": "Ask about our coffee (UI Demo)...",
-        "llm_persona_prompt": "Placeholder persona for Coffee Bot."
-    }
-}
+# --- CHATBOT CONFIGURATIONS ---
+# Shared with rag_service.py, which serves the bots' RAG pipeline without Streamlit.
+from chatbot_configs import CHATBOT_CONFIGS
 
 # Determine initial config for set_page_config
 # If session state has a current bot, use that, otherwise use the default.
@@ -69,8 +24,19 @@ st.set_page_config(
 )
 
 # Now import other necessary modules
-from bedrock_client import get_embedding, query_llm # Still needed for Airline bot
-from opensearch_client import search_chunks # Still needed for Airline bot
+import time
+import itertools
+from metrics import start_metrics_server
+from chat_history import ChatHistory
+from chat_stream import answer_pieces, render_stream
+
+start_metrics_server() # Only if SKYCONNECT_METRICS_PORT is set; a no-op on reruns
+
+# --- RAG client, created on the first question and shared by every session in the process ---
+@st.cache_resource(show_spinner=False)
+def rag_client():
+    from rag_service import get_rag_client # Deferred: pulls in boto3 and numpy, which the first page render doesn't need
+    return get_rag_client()
 
 
 # --- Function to set background image and dynamic text colors ---
@@ -131,14 +97,17 @@ def set_app_style(bg_url, chat_text_color="#000001"):
          unsafe_allow_html=True
      )
 
-# --- Function to reset chat state when switching bots ---
+# --- Function to switch the chat when switching bots ---
+# Each bot keeps its own bounded conversation (see chat_history.py), so switching back resumes it.
 def reset_chat_state(new_bot_config_key):
     config = CHATBOT_CONFIGS[new_bot_config_key]
-    st.session_state.messages = [
-        {"role": "assistant", "content": config["initial_assistant_message"]}
-    ]
+    st.session_state.chat_history.activate(new_bot_config_key, config["initial_assistant_message"])
     st.session_state.current_bot_key = new_bot_config_key
 
+def render_message(message):
+    with st.chat_message(message["role"], avatar=current_config["assistant_avatar"] if message["role"] == "assistant" else "🧑‍💻"):
+        st.markdown(message["content"])
+
 
 # --- Sidebar for Chatbot Selection ---
 st.sidebar.title("Select Chatbot")
@@ -147,6 +116,8 @@ bot_keys_map = {config["display_name"]: key for key, config in CHATBOT_CONFIGS.i
 
 if "current_bot_key" not in st.session_state:
     st.session_state.current_bot_key = INITIAL_BOT_KEY # Default to airline
+if "chat_history" not in st.session_state:
+    st.session_state.chat_history = ChatHistory()
 
 default_selectbox_index = 0 # Default to first option
 try:
@@ -183,21 +154,27 @@ st.markdown(f"<p class='page-header-subtitle' style='--header-subtitle-color: {c
 st.markdown("---")
 
 
-# --- Initialize chat history if not already done (e.g., after reset or first run) ---
-if "messages" not in st.session_state:
-    # This will be based on the current_config after selection or default
-    st.session_state.messages = [
-        {"role": "assistant", "content": current_config["initial_assistant_message"]}
-    ]
-
-# --- Display chat messages ---
-for message in st.session_state.messages:
-    with st.chat_message(message["role"], avatar=current_config["assistant_avatar"] if message["role"] == "assistant" else "🧑‍💻"):
-        st.markdown(message["content"])
+# --- Initialize chat history if not already done (e.g., first run) ---
+chat_history = st.session_state.chat_history
+if chat_history.active_bot != st.session_state.current_bot_key:
+    chat_history.activate(st.session_state.current_bot_key, current_config["initial_assistant_message"])
+
+# --- Display chat messages: a summary of dropped turns, older turns on demand, the recent window live ---
+if chat_history.dropped():
+    with st.expander(f"🗂️ {chat_history.dropped()} earlier messages (summary)"):
+        st.text(chat_history.summary())
+older_pages = chat_history.older_pages()
+if older_pages and st.toggle("Show earlier messages", key="show_earlier_messages"):
+    page = st.number_input("Page (1 = most recent)", min_value=1, max_value=older_pages, value=1, step=1, key="earlier_messages_page") if older_pages > 1 else 1
+    for message in chat_history.older_page(page):
+        render_message(message)
+    st.markdown("---")
+for message in chat_history.recent():
+    render_message(message)
 
 # --- User Query Input ---
 if user_query := st.chat_input(current_config["chat_input_placeholder"]):
-    st.session_state.messages.append({"role": "user", "content": user_query})
+    chat_history.append("user", user_query)
     with st.chat_message("user", avatar="🧑‍💻"):
         st.markdown(user_query)
 
@@ -205,31 +182,24 @@ if user_query := st.chat_input(current_config["chat_input_placeholder"]):
     with st.chat_message("assistant", avatar=current_config["assistant_avatar"]):
         bot_key = st.session_state.current_bot_key
         
-        if bot_key == "airline_faq":
-            with st.spinner(f"✈️ SkyConnect is searching for your answer..."):
-                message_placeholder = st.empty()
-                
-                query_embedding = get_embedding(user_query) # Make sure bedrock_client is imported
-                results = search_chunks( # Make sure opensearch_client is imported
-                    current_config["opensearch_index_name"],
-                    query_embedding,
-                    k=3
-                )
-                
-                retrieved_chunks_text = [hit['_source']['chunk_text'] for hit in results]
-                context = "\n\n---\n\n".join(retrieved_chunks_text)
-
-                full_response = ""
-                if not retrieved_chunks_text:
-                    answer = "I couldn't find specific information related to your query in my current knowledge base. Could you please try rephrasing, or ask about a different topic like flight schedules or baggage policies?"
-                else:
-                    answer = query_llm( # Make sure bedrock_client is imported
-                        user_query,
-                        context,
-                        current_config["llm_persona_prompt"]
-                    )
-                message_placeholder.markdown(answer)
-                full_response = answer
+        if current_config.get("rag_enabled"):
+            message_placeholder = st.empty()
+            request_start = time.perf_counter()
+            turn = {}
+
+            # Turns dropped from the kept history still reach the LLM through their summary
+            events = rag_client().answer_stream(bot_key, user_query, chat_history.summary())
+            with st.spinner(f"{current_config['assistant_avatar']} Searching for your answer..."):
+                first_event = next(events) # Arrives once retrieval (or the answer cache) is done
+            answer, ttft = render_stream(message_placeholder, answer_pieces(itertools.chain([first_event], events), turn), request_start)
+
+            total_latency = time.perf_counter() - request_start
+            meta = turn.get("meta", {})
+            answer_source = " · precomputed answer" if meta.get("precomputed") else " · cached answer" if meta.get("cached") else ""
+            st.caption(f"⏱️ First token {ttft:.2f}s · Total {total_latency:.2f}s" + answer_source)
+            spans = (turn.get("done") or turn.get("error") or {}).get("spans", [])
+            st.session_state.last_turn = {"question": user_query, "total_seconds": total_latency, "spans": spans}
+            full_response = answer
         
         elif bot_key == "university_course":
             message_placeholder = st.empty()
@@ -249,7 +219,29 @@ if user_query := st.chat_input(current_config["chat_input_placeholder"]):
             message_placeholder.markdown(answer)
             full_response = answer
             
-        st.session_state.messages.append({"role": "assistant", "content": full_response})
+        chat_history.append("assistant", full_response)
+
+# --- Sidebar debug panel: where the last answer's time went ---
+if st.sidebar.checkbox("🔧 Show latency breakdown", key="show_latency_breakdown"):
+    last_turn = st.session_state.get("last_turn")
+    if not last_turn:
+        st.sidebar.caption("Ask a question to see its timing breakdown.")
+    else:
+        st.sidebar.caption(f"Last turn: {last_turn['total_seconds'] * 1000:.0f} ms total")
+        st.sidebar.dataframe(
+            [
+                {
+                    "stage": span["stage"],
+                    "ms": round(span["seconds"] * 1000, 1),
+                    "status": span["status"],
+                    "cache": {True: "hit", False: "miss"}.get(span.get("cache_hit"), ""),
+                    "KB in": round(span.get("response_bytes", 0) / 1024, 1),
+                    "retries": span.get("retries", 0),
+                }
+                for span in last_turn["spans"]
+            ],
+            hide_index=True,
+        )
 
 # --- Footer ---
 # st.markdown("---")
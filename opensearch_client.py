@@ -1,8 +1,12 @@
 # opensearch_client.py
 
+import time
+import threading
 from opensearchpy import OpenSearch, RequestsHttpConnection
-import boto3
-from requests_aws4auth import AWS4Auth
+from opensearchpy.serializer import JSONSerializer
+from retrieval import reciprocal_rank_fusion
+from metrics import timed
+from index_profiles import get_profile, knn_mapping
 # import uuid # uuid is not currently used, can be removed or kept for future use
 
 # ---------- Configuration ----------
@@ -11,80 +15,161 @@ host = "<YOUR_OPENSEARCH_ENDPOINT>" # Your OpenSearch endpoint
 
 # Default index name, can be used if no specific index is provided to create_index
 DEFAULT_INDEX_NAME = "skyconnect-knowledge-base"
-EMBEDDING_DIM = 1536  # Titan Embedding model output size
+EMBEDDING_DIM = 1536  # Titan Embedding model output size; index profiles (index_profiles.py) set it per index
 # -----------------------------------
 
-# AWS authentication
-# Ensure your AWS environment (e.g., IAM role for EC2/Lambda, or local AWS CLI config)
-# has permissions for aoss:ESHttpPut, aoss:ESHttpPost, aoss:ESHttpGet, etc. on the relevant collection.
-credentials = boto3.Session().get_credentials()
-aws_auth = AWS4Auth(
-    credentials.access_key,
-    credentials.secret_key,
-    region,
-    "aoss", # Service name for OpenSearch Serverless
-    session_token=credentials.token
-)
+# Response metering
+# Every response body the client parses goes through this serializer, so we can see how many
+# bytes come back over the wire and how long parsing them takes.
+class MeteredJSONSerializer(JSONSerializer):
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.responses = 0
+        self.response_bytes = 0
+        self.deserialize_seconds = 0.0
+
+    def loads(self, s):
+        start = time.perf_counter()
+        data = super().loads(s)
+        elapsed = time.perf_counter() - start
+        size = len(s.encode("utf-8")) if isinstance(s, str) else len(s)
+        self._local.last = {"response_bytes": size, "deserialize_seconds": elapsed}
+        with self._lock:
+            self.responses += 1
+            self.response_bytes += size
+            self.deserialize_seconds += elapsed
+        return data
+
+    def last_response(self):
+        """Size and parse time of the last response parsed on this thread."""
+        return getattr(self._local, "last", None)
+
+serializer = MeteredJSONSerializer()
+
+def get_transport_stats():
+    """
+    Totals and averages of response size and deserialization time since the process started.
+    """
+    with serializer._lock:
+        responses = serializer.responses
+        return {
+            "responses": responses,
+            "response_bytes": serializer.response_bytes,
+            "deserialize_seconds": serializer.deserialize_seconds,
+            "avg_response_bytes": serializer.response_bytes / responses if responses else 0,
+            "avg_deserialize_ms": 1000 * serializer.deserialize_seconds / responses if responses else 0.0,
+        }
+
+def _add_response_bytes(span):
+    # The serializer remembers the size of the last response parsed on this thread.
+    last = serializer.last_response()
+    if last:
+        span["response_bytes"] = span.get("response_bytes", 0) + last["response_bytes"]
 
 # OpenSearch client
-client = OpenSearch(
-    hosts=[{"host": host.replace("https://", ""), "port": 443}],
-    http_auth=aws_auth, # Use the renamed auth object
-    use_ssl=True,
-    verify_certs=True,
-    connection_class=RequestsHttpConnection,
-    timeout=60,
-    max_retries=3,
-    retry_on_timeout=True
-)
+# Built on first use rather than at import, so this module can be imported (and its client
+# swapped with set_client, e.g. by benchmark.py) without AWS credentials or network access.
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Returns the process-wide OpenSearch client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import boto3
+                from requests_aws4auth import AWS4Auth
+
+                # AWS authentication
+                # Ensure your AWS environment (e.g., IAM role for EC2/Lambda, or local AWS CLI config)
+                # has permissions for aoss:ESHttpPut, aoss:ESHttpPost, aoss:ESHttpGet, etc. on the relevant collection.
+                credentials = boto3.Session().get_credentials()
+                if credentials is None:
+                    raise RuntimeError("No AWS credentials found for OpenSearch (configure a profile, environment variables or an IAM role).")
+                aws_auth = AWS4Auth(
+                    credentials.access_key,
+                    credentials.secret_key,
+                    region,
+                    "aoss", # Service name for OpenSearch Serverless
+                    session_token=credentials.token
+                )
+                _client = OpenSearch(
+                    hosts=[{"host": host.replace("https://", ""), "port": 443}],
+                    http_auth=aws_auth, # Use the renamed auth object
+                    use_ssl=True,
+                    verify_certs=True,
+                    connection_class=RequestsHttpConnection,
+                    timeout=60,
+                    max_retries=3,
+                    retry_on_timeout=True,
+                    serializer=serializer
+                )
+    return _client
+
+def set_client(new_client):
+    """
+    Replaces the OpenSearch client used by every function in this module, e.g. with a local
+    stand-in for benchmarks. Returns the previous client (None if none was created yet).
+    """
+    global _client
+    with _client_lock:
+        previous, _client = _client, new_client
+    return previous
+
 
 # Create index with knn_vector mapping
-def create_index(index_to_create=DEFAULT_INDEX_NAME): # Function now accepts an argument
+def create_index(index_to_create=DEFAULT_INDEX_NAME, recreate=True, profile=None): # Function now accepts an argument
     """
     Creates an OpenSearch index with the specified name and KNN mapping.
-    If the index already exists, it will be deleted and recreated.
+    If the index already exists, it will be deleted and recreated, unless recreate is False,
+    in which case the existing index is left alone.
 
     :param index_to_create: The name of the index to create.
                             Defaults to DEFAULT_INDEX_NAME.
+    :param recreate: Whether to drop an existing index first.
+    :param profile: Name of the index profile (engine, HNSW parameters, vector encoding and
+                    dimension) in index_profiles.py. Defaults to DEFAULT_INDEX_PROFILE.
+    :return: True if a new index was created, False if an existing one was kept, None on error.
     """
     if not index_to_create:
         print("⚠️ Index name cannot be empty. Using default.")
         index_to_create = DEFAULT_INDEX_NAME
 
+    client = get_client()
     try:
         if client.indices.exists(index=index_to_create):
+            if not recreate:
+                print(f"ℹ️ Index {index_to_create} already exists. Keeping it.")
+                return False
             client.indices.delete(index=index_to_create)
             print(f"🗑️ Deleted existing index: {index_to_create}")
 
+        embedding_field, knn_settings = knn_mapping(get_profile(profile))
         mapping = {
             "settings": {
-                "index": {
-                    "knn": True,
-                    "knn.algo_param.ef_search": 100 # Optional: tune for search performance/accuracy
-                }
+                "index": knn_settings
             },
             "mappings": {
                 "properties": {
                     "chunk_text": {"type": "text"},
-                    "embedding": {
-                        "type": "knn_vector",
-                        "dimension": EMBEDDING_DIM,
-                        "method": { # Required for OpenSearch Serverless vector search
-                            "name": "hnsw",
-                            "space_type": "l2", # Can also be "cosinesimil" or "innerproduct"
-                            "engine": "nmslib", # Or "faiss" if supported and preferred
-                            "parameters": {
-                                "ef_construction": 256, # Tune based on dataset size/complexity
-                                "m": 48                 # Tune based on dataset size/complexity
-                            }
-                        }
-                    }
+                    "chunk_id": {"type": "keyword"},
+                    "chunk_hash": {"type": "keyword"},
+                    "source_file": {"type": "keyword"},
+                    "page_start": {"type": "integer"},
+                    "page_end": {"type": "integer"},
+                    "embedding": embedding_field # Required for OpenSearch Serverless vector search
                 }
             }
         }
 
         client.indices.create(index=index_to_create, body=mapping)
-        print(f"✅ Created index: {index_to_create} with KNN mapping.")
+        print(f"✅ Created index: {index_to_create} with KNN mapping ({get_profile(profile)['name']} profile).")
+        return True
     except Exception as e:
         print(f"❌ Error creating index {index_to_create}: {e}")
         # Potentially re-raise the exception if you want the calling script to handle it
@@ -92,34 +177,191 @@ def create_index(index_to_create=DEFAULT_INDEX_NAME): # Function now accepts an
 
 
 # Index a single chunk with its embedding
-def index_chunk(index_name, chunk_text, embedding):
+def index_chunk(index_name, chunk_text, embedding, **metadata):
     """
-    Indexes a single document (chunk_text and its embedding) into the specified index.
+    Indexes a single document (chunk_text, its embedding and optional chunk_id/source_file/
+    chunk_hash metadata) into the specified index. A one-item bulk_index_chunks, so single
+    writes get the same _id handling and retries as ingest.
+
+    :return: True if the document was indexed.
     """
     if not index_name:
         print("⚠️ Index name cannot be empty for indexing. Skipping chunk.")
-        return
+        return False
+    succeeded, _ = _bulk_with_retry(index_name, [{"chunk_text": chunk_text, "embedding": embedding, **metadata}], "index")
+    return succeeded == 1
 
-    body = {
-        "chunk_text": chunk_text,
-        "embedding": embedding
-    }
-    try:
-        client.index(index=index_name, body=body) # Added refresh for consistency in small ingest jobs
-        # For large ingest jobs, consider removing refresh="wait_for" or setting it to False and refreshing manually at the end.
-    except Exception as e:
-        print(f"❌ Error indexing chunk into {index_name}: {e}")
 
+# Send a _bulk request, re-submitting only the items that failed with a retryable status
+def _bulk_with_retry(index_name, items, op, max_retries=3, retry_backoff=1.0):
+    """
+    Runs one _bulk operation ("index" or "delete") over items. For "index", items are documents;
+    a document with a chunk_id is written under that _id so re-indexing it is idempotent. For
+    "delete", items are document IDs. Items rejected with 429 or 5xx are re-submitted on their own,
+    with exponential backoff, up to max_retries times. Other item errors are not retried.
 
-# Search chunks by query embedding using k-NN
-def search_chunks(index_name, query_embedding, k=5):
+    :return: Tuple of (number of items that succeeded, list of items that failed).
     """
-    Searches for the top k similar chunks in the specified index based on the query embedding.
+    items = list(items)
+    with timed(f"bulk_{op}", index=index_name, items=len(items)) as span:
+        succeeded, failed, attempt = _bulk_attempts(index_name, items, op, max_retries, retry_backoff, span)
+        span["retries"] = attempt
+        if failed:
+            span["error"] = f"{len(failed)} of {len(items)} item(s) failed"
+    return succeeded, failed
+
+def _bulk_attempts(index_name, items, op, max_retries, retry_backoff, span):
+    pending = items
+    failed = []
+    succeeded = 0
+    attempt = 0
+    while pending:
+        actions = []
+        for item in pending:
+            if op == "delete":
+                actions.append({"delete": {"_index": index_name, "_id": item}})
+            else:
+                meta = {"_index": index_name}
+                if item.get("chunk_id"):
+                    meta["_id"] = item["chunk_id"]
+                actions.append({"index": meta})
+                actions.append(item)
+        try:
+            res = get_client().bulk(body=actions)
+            results = res.get("items", [])
+            _add_response_bytes(span)
+        except Exception as e:
+            print(f"❌ Bulk {op} request to {index_name} failed: {e}")
+            results = [{op: {"status": 503, "error": str(e)}} for _ in pending]
+
+        retryable = []
+        for item, result in zip(pending, results):
+            result = result.get(op, {})
+            status = result.get("status", 500)
+            if 200 <= status < 300 or (op == "delete" and status == 404): # Already gone is fine
+                succeeded += 1
+            elif status == 429 or status >= 500:
+                retryable.append(item)
+            else:
+                print(f"❌ Error in bulk {op} on {index_name}: {result.get('error')}")
+                failed.append(item)
+
+        if not retryable:
+            break
+        attempt += 1
+        if attempt > max_retries:
+            print(f"❌ Giving up on {len(retryable)} item(s) after {max_retries} retries.")
+            failed.extend(retryable)
+            break
+        time.sleep(retry_backoff * (2 ** (attempt - 1)))
+        pending = retryable
+
+    return succeeded, failed, attempt
+
+
+# Index many chunks with the _bulk API
+def bulk_index_chunks(index_name, documents, max_retries=3, retry_backoff=1.0):
+    """
+    Indexes a batch of documents (dicts with chunk_text and embedding, plus optional
+    chunk_id/source_file/chunk_hash metadata) with a single _bulk request.
+
+    :return: Tuple of (number of documents indexed, list of documents that could not be indexed).
     """
     if not index_name:
-        print("⚠️ Index name cannot be empty for searching. Returning empty results.")
-        return []
+        print("⚠️ Index name cannot be empty for indexing. Skipping batch.")
+        return 0, list(documents)
+    return _bulk_with_retry(index_name, documents, "index", max_retries, retry_backoff)
+
 
+# Delete chunks by document ID with the _bulk API
+def bulk_delete_chunks(index_name, chunk_ids, max_retries=3, retry_backoff=1.0):
+    """
+    Deletes the documents with the given IDs. IDs that no longer exist count as deleted.
+
+    :return: Tuple of (number of documents deleted, list of IDs that could not be deleted).
+    """
+    if not index_name:
+        print("⚠️ Index name cannot be empty for deleting. Skipping batch.")
+        return 0, list(chunk_ids)
+    return _bulk_with_retry(index_name, chunk_ids, "delete", max_retries, retry_backoff)
+
+
+# Delete an index
+def delete_index(index_name):
+    get_client().indices.delete(index=index_name)
+
+
+# Point an alias at a new index, atomically
+def swap_alias(alias, new_index):
+    """
+    Moves alias from whatever index it currently points to onto new_index in a single
+    update_aliases call, so searches against the alias never see a missing or partial index.
+    If a concrete index is still named like the alias (the layout before aliases were used),
+    it is deleted first.
+
+    :return: List of indices the alias pointed to before the swap.
+    """
+    client = get_client()
+    old_indices = []
+    if client.indices.exists_alias(name=alias):
+        old_indices = list(client.indices.get_alias(name=alias).keys())
+    elif client.indices.exists(index=alias):
+        client.indices.delete(index=alias)
+        print(f"🗑️ Deleted concrete index {alias} so it can become an alias")
+
+    actions = [{"remove": {"index": index, "alias": alias}} for index in old_indices]
+    actions.append({"add": {"index": new_index, "alias": alias}})
+    client.indices.update_aliases(body={"actions": actions})
+    print(f"🔀 Alias {alias} now points to {new_index}")
+    return old_indices
+
+
+# Fetch stored embeddings by document ID
+def get_chunk_vectors(index_name, chunk_ids):
+    """
+    Fetches the stored embeddings of the given documents with one _mget request that returns
+    only the embedding field.
+
+    :return: Dict of {chunk_id: embedding list} for the documents that were found.
+    """
+    if not index_name or not chunk_ids:
+        return {}
+    with timed("get_vectors", index=index_name, ids=len(chunk_ids)) as span:
+        try:
+            res = get_client().mget(index=index_name, body={"ids": list(chunk_ids)}, _source_includes="embedding")
+            _add_response_bytes(span)
+        except Exception as e:
+            print(f"❌ Error fetching vectors from index {index_name}: {e}")
+            span["error"] = str(e)
+            return {}
+    return {
+        doc["_id"]: doc["_source"]["embedding"]
+        for doc in res.get("docs", [])
+        if doc.get("found") and "embedding" in doc.get("_source", {})
+    }
+
+
+def get_chunk_documents(index_name, chunk_ids):
+    """
+    Fetches whole documents (chunk text, metadata and embedding) with one _mget request.
+
+    :return: Dict of {chunk_id: _source} for the documents that were found.
+    """
+    if not index_name or not chunk_ids:
+        return {}
+    with timed("get_documents", index=index_name, ids=len(chunk_ids)) as span:
+        try:
+            res = get_client().mget(index=index_name, body={"ids": list(chunk_ids)})
+            _add_response_bytes(span)
+        except Exception as e:
+            print(f"❌ Error fetching documents from index {index_name}: {e}")
+            span["error"] = str(e)
+            return {}
+    return {doc["_id"]: doc["_source"] for doc in res.get("docs", []) if doc.get("found")}
+
+
+# Search chunks by query embedding using k-NN
+def _knn_query(query_embedding, k, include_vectors=False):
     query = {
         "size": k,
         "query": {
@@ -137,9 +379,100 @@ def search_chunks(index_name, query_embedding, k=5):
         #     }
         # }
     }
-    try:
-        res = client.search(index=index_name, body=query)
-        return res.get("hits", {}).get("hits", []) # Safer way to access nested keys
-    except Exception as e:
-        print(f"❌ Error searching in index {index_name}: {e}")
-        return []
\ No newline at end of file
+    if not include_vectors:
+        # Each stored embedding is ~20-30 KB of JSON; the chat path only needs the text and metadata.
+        query["_source"] = {"excludes": ["embedding"]}
+    return query
+
+def search_chunks(index_name, query_embedding, k=5, include_vectors=False):
+    """
+    Searches for the top k similar chunks in the specified index based on the query embedding.
+    Hits carry chunk_text and source metadata; the stored embedding is only returned when
+    include_vectors is True.
+    """
+    if not index_name:
+        print("⚠️ Index name cannot be empty for searching. Returning empty results.")
+        return []
+
+    with timed("search_knn", index=index_name, k=k) as span:
+        try:
+            res = get_client().search(index=index_name, body=_knn_query(query_embedding, k, include_vectors))
+            _add_response_bytes(span)
+            return res.get("hits", {}).get("hits", []) # Safer way to access nested keys
+        except Exception as e:
+            print(f"❌ Error searching in index {index_name}: {e}")
+            span["error"] = str(e)
+            return []
+
+
+# Search several query embeddings in one round trip
+def search_chunks_batch(index_name, query_embeddings, k=5, include_vectors=False):
+    """
+    Runs one k-NN query per embedding in a single _msearch request.
+
+    :return: List of hit lists, in the order of query_embeddings.
+    """
+    if not index_name:
+        print("⚠️ Index name cannot be empty for searching. Returning empty results.")
+        return [[] for _ in query_embeddings]
+    if not query_embeddings:
+        return []
+
+    body = []
+    for query_embedding in query_embeddings:
+        body.append({"index": index_name})
+        body.append(_knn_query(query_embedding, k, include_vectors))
+    with timed("search_knn_batch", index=index_name, k=k, queries=len(query_embeddings)) as span:
+        try:
+            responses = get_client().msearch(body=body).get("responses", [])
+            _add_response_bytes(span)
+        except Exception as e:
+            print(f"❌ Error running batched search in index {index_name}: {e}")
+            span["error"] = str(e)
+            return [[] for _ in query_embeddings]
+
+    results = []
+    for response in responses:
+        if "error" in response:
+            print(f"❌ Error in batched sub-query on {index_name}: {response['error']}")
+            results.append([])
+        else:
+            results.append(response.get("hits", {}).get("hits", []))
+    return results
+
+
+# Search chunks with BM25 and k-NN in one round trip, fused with reciprocal rank fusion
+def hybrid_search_chunks(index_name, query_text, query_embedding, k=5, lexical_weight=1.0, vector_weight=1.0, candidates=None, include_vectors=False):
+    """
+    Runs a BM25 match on chunk_text and a k-NN query on embedding in a single _msearch request,
+    then merges the two rankings with weighted reciprocal rank fusion. Exact tokens such as flight
+    numbers and airport codes are found by the lexical side even when embeddings miss them.
+
+    :param candidates: Hits fetched from each side before fusion. Defaults to 4 * k.
+    """
+    if not index_name:
+        print("⚠️ Index name cannot be empty for searching. Returning empty results.")
+        return []
+
+    candidates = candidates or 4 * k
+    lexical_query = {"size": candidates, "query": {"match": {"chunk_text": query_text}}}
+    if not include_vectors:
+        lexical_query["_source"] = {"excludes": ["embedding"]}
+    body = [{"index": index_name}, lexical_query, {"index": index_name}, _knn_query(query_embedding, candidates, include_vectors)]
+    with timed("search_hybrid", index=index_name, k=k, candidates=candidates) as span:
+        try:
+            responses = get_client().msearch(body=body).get("responses", [])
+            _add_response_bytes(span)
+        except Exception as e:
+            print(f"❌ Error running hybrid search in index {index_name}: {e}")
+            span["error"] = str(e)
+            return []
+
+    ranked_lists = []
+    for response in responses:
+        if "error" in response:
+            print(f"❌ Error in hybrid sub-query on {index_name}: {response['error']}")
+            ranked_lists.append([])
+        else:
+            ranked_lists.append(response.get("hits", {}).get("hits", []))
+    return reciprocal_rank_fusion(ranked_lists, weights=[lexical_weight, vector_weight], k=k)
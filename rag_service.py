@@ -0,0 +1,444 @@
+# rag_service.py
+import os
+import json
+import time
+import asyncio
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from chatbot_configs import CHATBOT_CONFIGS
+from bedrock_client import query_llm_stream, PRIORITY_INTERACTIVE
+from retrieval import embed_for_bot, search_for_bot, get_backend
+from answer_cache import get_answer_cache, DEFAULT_SIMILARITY_THRESHOLD
+from embedding_cache import normalize_text
+from context_builder import build_context
+from faq_precompute import get_faq_store, DEFAULT_FAQ_SIMILARITY_THRESHOLD
+from metrics import timed, trace, registry, start_metrics_server
+
+# ---------- Configuration ----------
+EMBED_CONCURRENCY = int(os.environ.get("RAG_EMBED_CONCURRENCY", "16"))   # Embedding calls in flight at once
+SEARCH_CONCURRENCY = int(os.environ.get("RAG_SEARCH_CONCURRENCY", "16")) # Searches in flight at once
+LLM_CONCURRENCY = int(os.environ.get("RAG_LLM_CONCURRENCY", "8"))        # LLM streams in flight at once
+RETRIEVAL_K = 3                                                          # Chunks retrieved per question, unless a bot sets retrieval_k
+RAG_SERVICE_URL = os.environ.get("SKYCONNECT_RAG_SERVICE_URL")           # Use a remote service instead of an in-process one
+DEFAULT_NO_CONTEXT_MESSAGE = "I couldn't find specific information related to your query in my current knowledge base."
+# -----------------------------------
+
+# The RAG pipeline (embed -> precomputed answers -> answer cache -> retrieve -> generate) as an
+# asyncio service. A request produces a stream of events:
+#   {"type": "meta", "cached": bool, "precomputed": bool, "sources": [{"chunk_id", "source_file", "page_start", "page_end"}, ...]}
+#   {"type": "delta", "text": "..."}     (one or more, the answer as it is generated)
+#   {"type": "done", "answer": "...", "ttft_seconds": ..., "total_seconds": ..., "spans": [...]}
+#   {"type": "error", "error": "..."}   (instead of done, if the pipeline failed)
+# A request may carry history, a summary of earlier turns (ChatHistory.summary()), which is
+# added to the LLM prompt.
+# spans are the metrics.py stage spans of the request, e.g. for a timing breakdown.
+#
+# Clients: LocalRAGClient runs the service on a background event loop in this process (what the
+# Streamlit apps use by default); HTTPRAGClient talks to `python rag_service.py` over HTTP.
+
+
+def _traced(fn, *args):
+    # Runs on a pool thread: returns fn's result and the spans it recorded there.
+    with trace() as spans:
+        return fn(*args), spans
+
+
+class _Broadcast:
+    """
+    Events of one in-flight request, replayable by any number of subscribers. Identical
+    questions asked while a request is running subscribe to it instead of starting their own.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event, final=False):
+        async with self._changed:
+            self.events.append(event)
+            self.finished = self.finished or final
+            self._changed.notify_all()
+
+    async def subscribe(self):
+        seen = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.events) > seen or self.finished)
+                new_events = self.events[seen:]
+                finished = self.finished
+            for event in new_events:
+                yield event
+            seen += len(new_events)
+            if finished and seen == len(self.events):
+                return
+
+
+class RAGService:
+    """
+    Serves bots' RAG pipelines concurrently on an event loop. The blocking Bedrock and
+    OpenSearch calls run on a thread pool, each stage gated by its own semaphore so a burst of
+    LLM streams cannot starve embedding or search.
+    """
+
+    def __init__(self, configs=None, embed_concurrency=EMBED_CONCURRENCY, search_concurrency=SEARCH_CONCURRENCY,
+                 llm_concurrency=LLM_CONCURRENCY, priority=PRIORITY_INTERACTIVE, use_caches=True):
+        # priority is the Bedrock scheduler lane of every call (batch_answer.py runs in the
+        # background lane); with use_caches False, precomputed and cached answers are neither
+        # served nor stored, so every question goes through retrieval and the LLM.
+        self.configs = configs or CHATBOT_CONFIGS
+        self.priority = priority
+        self.use_caches = use_caches
+        self._limits = {"embed": embed_concurrency, "search": search_concurrency, "llm": llm_concurrency}
+        self._semaphores = None # Created on first use, on the loop that runs the service
+        self._executor = ThreadPoolExecutor(max_workers=sum(self._limits.values()) + 4, thread_name_prefix="rag")
+        self._inflight = {}
+
+    def _semaphore(self, stage):
+        if self._semaphores is None:
+            self._semaphores = {name: asyncio.Semaphore(limit) for name, limit in self._limits.items()}
+        return self._semaphores[stage]
+
+    def _config(self, bot_key):
+        config = self.configs.get(bot_key)
+        if config is None or not config.get("rag_enabled"):
+            raise ValueError(f"Bot '{bot_key}' has no RAG pipeline.")
+        return config
+
+    async def _call(self, stage, fn, *args):
+        # Runs fn on the pool under the stage's limit. Returns its result and the spans it recorded.
+        async with self._semaphore(stage):
+            return await asyncio.get_running_loop().run_in_executor(self._executor, _traced, fn, *args)
+
+    async def embed(self, text, bot_key=None):
+        # With the bot's index profile if given, so the vector matches its index.
+        config = self._config(bot_key) if bot_key else {}
+        embedding, _ = await self._call("embed", embed_for_bot, config, text, self.priority)
+        return embedding
+
+    async def retrieve(self, bot_key, question, query_embedding=None, k=RETRIEVAL_K):
+        config = self._config(bot_key)
+        if query_embedding is None:
+            query_embedding = await self.embed(question, bot_key)
+        hits, _ = await self._call("search", search_for_bot, config, question, query_embedding, k)
+        return hits
+
+    async def _generate(self, question, context, persona, history, on_piece):
+        # Drains the blocking query_llm_stream generator on one pool thread, handing each piece to
+        # the loop as it arrives.
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done = object()
+
+        def drain():
+            try:
+                for piece in query_llm_stream(question, context, persona, priority=self.priority, history=history):
+                    loop.call_soon_threadsafe(queue.put_nowait, piece)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        async def consume():
+            while (piece := await queue.get()) is not done:
+                await on_piece(piece)
+
+        async with self._semaphore("llm"):
+            consumer = asyncio.create_task(consume())
+            try:
+                _, spans = await loop.run_in_executor(self._executor, _traced, drain)
+            finally:
+                await consumer
+        return spans
+
+    async def _run(self, bot_key, question, history, broadcast):
+        start = time.perf_counter()
+        spans = []
+        try:
+            config = self._config(bot_key)
+            index_name = config["opensearch_index_name"]
+            query_embedding, stage_spans = await self._call("embed", embed_for_bot, config, question, self.priority)
+            spans += stage_spans
+
+            answer, sources, precomputed = None, [], False
+            faq = config.get("faq") if self.use_caches else None
+            if faq: # Answers generated ahead of time by faq_precompute.py
+                backend_name = get_backend(config.get("retrieval_backend")).__name__
+                with timed("faq_lookup", index=index_name) as span:
+                    entry = get_faq_store().lookup(index_name, query_embedding, faq.get("similarity_threshold", DEFAULT_FAQ_SIMILARITY_THRESHOLD), backend_name)
+                    span["cache_hit"] = entry is not None
+                spans.append(span)
+                if entry is not None:
+                    answer, sources, precomputed = entry["answer"], entry["sources"], True
+
+            answer_cache = get_answer_cache()
+            if answer is None and self.use_caches:
+                threshold = config.get("answer_cache_similarity_threshold", DEFAULT_SIMILARITY_THRESHOLD)
+                with timed("answer_cache", index=index_name) as span: # A small in-memory matmul, fine on the loop
+                    answer = answer_cache.lookup(index_name, query_embedding, threshold=threshold)
+                    span["cache_hit"] = answer is not None
+                spans.append(span)
+            if answer is not None:
+                await broadcast.publish({"type": "meta", "cached": True, "precomputed": precomputed, "sources": sources})
+                await broadcast.publish({"type": "delta", "text": answer})
+                ttft = time.perf_counter() - start
+            else:
+                k = config.get("retrieval_k", RETRIEVAL_K)
+                hits, stage_spans = await self._call("search", search_for_bot, config, question, query_embedding, k)
+                spans += stage_spans
+                sources = [
+                    {key: hit["_source"].get(key) for key in ("chunk_id", "source_file", "page_start", "page_end")}
+                    for hit in hits
+                ]
+                await broadcast.publish({"type": "meta", "cached": False, "precomputed": False, "sources": sources})
+
+                if not hits:
+                    answer = config.get("no_context_message", DEFAULT_NO_CONTEXT_MESSAGE)
+                    await broadcast.publish({"type": "delta", "text": answer})
+                    ttft = time.perf_counter() - start
+                else:
+                    with timed("context", index=index_name) as span: # Merges overlapping chunks, fits the bot's token budget
+                        context, context_stats = build_context(hits, config.get("context_token_budget"))
+                        span.update(context_stats)
+                    spans.append(span)
+                    pieces = []
+                    first_token_at = []
+
+                    async def on_piece(piece):
+                        if not first_token_at:
+                            first_token_at.append(time.perf_counter())
+                        pieces.append(piece)
+                        await broadcast.publish({"type": "delta", "text": piece})
+
+                    spans += await self._generate(question, context, config["llm_persona_prompt"], history, on_piece)
+                    answer = "".join(pieces).strip()
+                    ttft = (first_token_at[0] if first_token_at else time.perf_counter()) - start
+                    if self.use_caches and not history: # An answer that saw earlier turns may not fit other conversations
+                        await asyncio.get_running_loop().run_in_executor(
+                            self._executor, answer_cache.store, index_name, query_embedding, answer, question
+                        )
+
+            await broadcast.publish({
+                "type": "done",
+                "answer": answer,
+                "ttft_seconds": ttft,
+                "total_seconds": time.perf_counter() - start,
+                "spans": spans,
+            }, final=True)
+        except Exception as e:
+            print(f"❌ RAG request for {bot_key} failed: {e}")
+            await broadcast.publish({"type": "error", "error": str(e), "spans": spans}, final=True)
+
+    async def answer_stream(self, bot_key, question, history=None):
+        """
+        Async iterator over the events of answering question with bot_key's pipeline. A request
+        for a question (compared with whitespace and case normalized) that is already being
+        answered for the same bot and history joins that request instead of calling the backends again.
+
+        :param history: Optional summary of earlier turns of the conversation, added to the LLM prompt.
+        """
+        self._config(bot_key) # Unknown bots fail here with ValueError, not as an error event
+        history = history or None
+        key = (bot_key, normalize_text(question).lower(), history)
+        broadcast = self._inflight.get(key)
+        if broadcast is None:
+            broadcast = self._inflight[key] = _Broadcast()
+            task = asyncio.create_task(self._run(bot_key, question, history, broadcast))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            registry.inc("skyconnect_coalesced_requests_total", 1, "Requests that joined an identical in-flight request.", bot=bot_key)
+        async for event in broadcast.subscribe():
+            yield event
+
+    async def answer(self, bot_key, question, history=None):
+        """
+        Answers question in one piece: the done event's fields plus cached and sources.
+        Raises RuntimeError if the pipeline failed.
+        """
+        result = {}
+        async for event in self.answer_stream(bot_key, question, history):
+            if event["type"] == "meta":
+                result.update(cached=event["cached"], precomputed=event.get("precomputed", False), sources=event["sources"])
+            elif event["type"] == "done":
+                result.update({key: value for key, value in event.items() if key != "type"})
+            elif event["type"] == "error":
+                raise RuntimeError(event["error"])
+        return result
+
+
+# ---------- Synchronous clients (used by the Streamlit apps) ----------
+
+class LocalRAGClient:
+    """
+    Runs a RAGService on an event loop in a daemon thread, and exposes it to synchronous code
+    such as Streamlit scripts. One instance serves every session in the process.
+    """
+
+    def __init__(self, service=None):
+        self.service = service or RAGService()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="rag-service-loop", daemon=True).start()
+
+    def answer_stream(self, bot_key, question, history=None):
+        events = self.service.answer_stream(bot_key, question, history)
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(events.__anext__(), self._loop).result()
+            except StopAsyncIteration:
+                return
+
+    def answer(self, bot_key, question, history=None):
+        return asyncio.run_coroutine_threadsafe(self.service.answer(bot_key, question, history), self._loop).result()
+
+
+class HTTPRAGClient:
+    """
+    Same interface as LocalRAGClient, for a service started with `python rag_service.py`.
+    """
+
+    def __init__(self, base_url, timeout=120):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, path, payload):
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def answer_stream(self, bot_key, question, history=None):
+        with self._post("/v1/answer", {"bot": bot_key, "question": question, "history": history, "stream": True}) as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+
+    def answer(self, bot_key, question, history=None):
+        with self._post("/v1/answer", {"bot": bot_key, "question": question, "history": history}) as response:
+            return json.loads(response.read())
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_rag_client():
+    """
+    Returns the process-wide RAG client: an HTTPRAGClient if SKYCONNECT_RAG_SERVICE_URL is set,
+    otherwise a LocalRAGClient.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HTTPRAGClient(RAG_SERVICE_URL) if RAG_SERVICE_URL else LocalRAGClient()
+    return _client
+
+
+# ---------- HTTP API ----------
+# Minimal HTTP/1.1 on asyncio streams, one request per connection:
+#   POST /v1/embed    {"text"}                          -> {"embedding"}
+#   POST /v1/retrieve {"bot", "question", "k"}          -> {"hits"}
+#   POST /v1/answer   {"bot", "question", "history", "stream"} -> answer JSON, or NDJSON events if stream is true
+#   GET  /healthz
+
+_STATUS_TEXT = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+async def _write_head(writer, status, content_type="application/json", extra_headers=()):
+    lines = [
+        f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}",
+        f"Content-Type: {content_type}",
+        "Access-Control-Allow-Origin: *", # The web widget calls the API from another origin
+        "Access-Control-Allow-Headers: Content-Type",
+        "Connection: close",
+        *extra_headers,
+    ]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+async def _write_json(writer, status, payload):
+    body = json.dumps(payload).encode("utf-8")
+    await _write_head(writer, status, extra_headers=[f"Content-Length: {len(body)}"])
+    writer.write(body)
+
+def _text(payload, field, required=True):
+    # String field of a request body; KeyError/TypeError become a 400. Optional fields may be absent or null.
+    value = payload[field] if required else payload.get(field)
+    if value is None and not required:
+        return None
+    if not isinstance(value, str):
+        raise TypeError(f"'{field}' must be a string, not {type(value).__name__}")
+    return value
+
+async def _write_error(writer, streaming, status, message):
+    # Once the NDJSON head is out the status can no longer change, so the error goes in the stream.
+    if streaming:
+        writer.write((json.dumps({"type": "error", "error": message}) + "\n").encode("utf-8"))
+    else:
+        await _write_json(writer, status, {"error": message})
+
+async def _handle(service, reader, writer):
+    try:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        headers = {}
+        while (line := (await reader.readline()).decode("latin-1").strip()):
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if len(request_line) < 2:
+            return
+        method, path = request_line[0], request_line[1].split("?")[0]
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+        if method == "OPTIONS":
+            await _write_head(writer, 204, extra_headers=["Access-Control-Allow-Methods: GET, POST", "Content-Length: 0"])
+        elif method == "GET" and path == "/healthz":
+            await _write_json(writer, 200, {"status": "ok", "in_flight": len(service._inflight)})
+        elif method == "POST" and path in ("/v1/embed", "/v1/retrieve", "/v1/answer"):
+            streaming = False
+            try:
+                payload = json.loads(body or b"{}")
+                if path == "/v1/embed":
+                    await _write_json(writer, 200, {"embedding": await service.embed(_text(payload, "text"), payload.get("bot"))})
+                elif path == "/v1/retrieve":
+                    hits = await service.retrieve(payload["bot"], _text(payload, "question"), k=int(payload.get("k", RETRIEVAL_K)))
+                    await _write_json(writer, 200, {"hits": hits})
+                elif payload.get("stream"):
+                    service._config(payload["bot"]) # Fail with 400 before the stream starts
+                    question, history = _text(payload, "question"), _text(payload, "history", required=False)
+                    await _write_head(writer, 200, "application/x-ndjson")
+                    streaming = True
+                    async for event in service.answer_stream(payload["bot"], question, history):
+                        writer.write((json.dumps(event) + "\n").encode("utf-8"))
+                        await writer.drain()
+                else:
+                    await _write_json(writer, 200, await service.answer(payload["bot"], _text(payload, "question"), _text(payload, "history", required=False)))
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                # Malformed payloads: a missing field, bad JSON, or a field of the wrong type
+                await _write_error(writer, streaming, 400, f"{type(e).__name__}: {e}")
+            except Exception as e: # Pipeline failures (RuntimeError) and any Bedrock/OpenSearch client error
+                print(f"❌ {method} {path} failed: {type(e).__name__}: {e}")
+                await _write_error(writer, streaming, 500, str(e) or type(e).__name__)
+        else:
+            await _write_json(writer, 404, {"error": f"No route for {method} {path}"})
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass # Client went away
+    finally:
+        writer.close()
+
+async def serve(host="0.0.0.0", port=8080, service=None):
+    service = service or RAGService()
+    server = await asyncio.start_server(lambda reader, writer: _handle(service, reader, writer), host, port)
+    print(f"🚀 RAG service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the chatbots' RAG pipeline over HTTP.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    start_metrics_server() # Only if SKYCONNECT_METRICS_PORT is set
+    asyncio.run(serve(args.host, args.port))
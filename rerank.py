@@ -0,0 +1,157 @@
+# rerank.py
+import os
+import time
+import argparse
+import threading
+from collections import OrderedDict
+import numpy as np
+from metrics import timed
+
+# ---------- Configuration ----------
+DEFAULT_CANDIDATES = 20   # Hits over-fetched for re-ranking
+DEFAULT_LAMBDA = 0.7      # 1.0 = pure relevance, 0.0 = pure diversity
+VECTOR_CACHE_ROWS = int(os.environ.get("SKYCONNECT_VECTOR_CACHE_ROWS", 20000)) # ~120 MB of 1536-d float32 rows at most
+# -----------------------------------
+
+# Maximal marginal relevance: pick, one at a time, the candidate that maximizes
+#   lambda * cos(query, candidate) - (1 - lambda) * max cos(candidate, already picked)
+# so near-duplicate chunks from the same policy section stop crowding out other relevant facts.
+# Everything is computed once up front (n x d normalize, n relevances, n x n similarities), and
+# each of the k picks is a vectorized argmax plus an np.maximum update.
+
+def mmr_select(query_embedding, candidate_vectors, k, lambda_mult=DEFAULT_LAMBDA, min_relevance=None):
+    """
+    :param candidate_vectors: n x d array-like of candidate embeddings.
+    :param min_relevance: Optional cosine similarity to the query below which candidates are never picked.
+    :return: Indices of the selected candidates, in selection order (at most k).
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    if candidates.ndim != 2 or not len(candidates) or k <= 0:
+        return []
+
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    candidates = candidates / np.where(norms == 0, 1.0, norms)
+    query_norm = np.linalg.norm(query)
+    relevance = candidates @ (query / query_norm) if query_norm else np.zeros(len(candidates), dtype=np.float32)
+    similarity = candidates @ candidates.T
+
+    blocked = np.zeros(len(candidates), dtype=bool)
+    if min_relevance is not None:
+        blocked |= relevance < min_relevance
+    max_similarity = np.zeros(len(candidates), dtype=np.float32)
+    selected = []
+    for _ in range(min(k, len(candidates))):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[blocked] = -np.inf
+        best = int(np.argmax(scores))
+        if blocked[best]:
+            break # Nothing eligible left
+        selected.append(best)
+        blocked[best] = True
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+# Shipping 20 x 1536 floats as JSON with every search costs far more than the MMR itself, so
+# candidate vectors come from an in-process LRU cache of float32 rows instead. Misses are fetched
+# once with the backend's get_chunk_vectors (one _mget for OpenSearch). Chunk IDs are content
+# hashes, so a cached row never goes stale; the concrete index name is part of the key anyway.
+class VectorCache:
+    def __init__(self, max_rows=VECTOR_CACHE_ROWS):
+        self.max_rows = max_rows
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        """
+        :return: Dict of {key: float32 row} for the keys that are cached.
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                row = self._rows.get(key)
+                if row is not None:
+                    self._rows.move_to_end(key)
+                    found[key] = row
+        return found
+
+    def put_many(self, rows):
+        with self._lock:
+            for key, row in rows.items():
+                self._rows[key] = np.asarray(row, dtype=np.float32)
+                self._rows.move_to_end(key)
+            while len(self._rows) > self.max_rows:
+                self._rows.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+vector_cache = VectorCache()
+
+def _candidate_vectors(hits, backend, index_name, span):
+    # Returns a float32 row per hit, or None if any of them cannot be found.
+    keys = [(hit.get("_index", index_name), hit["_id"]) for hit in hits]
+    shipped = {key: hit["_source"]["embedding"] for key, hit in zip(keys, hits) if "embedding" in hit["_source"]}
+    if shipped:
+        vector_cache.put_many(shipped)
+    rows = vector_cache.get_many(keys)
+    span["vector_cache_hits"] = len(rows) - len(shipped)
+
+    missing = [key for key in keys if key not in rows]
+    if missing and backend is not None:
+        by_index = {}
+        for hit_index, chunk_id in missing:
+            by_index.setdefault(hit_index, []).append(chunk_id)
+        fetched = {}
+        for hit_index, chunk_ids in by_index.items():
+            fetched.update({(hit_index, chunk_id): np.asarray(vector, dtype=np.float32) for chunk_id, vector in backend.get_chunk_vectors(hit_index, chunk_ids).items()})
+        span["fetched"] = len(fetched)
+        vector_cache.put_many(fetched)
+        rows.update(fetched)
+    if len(rows) < len(keys):
+        return None
+    return np.stack([rows[key] for key in keys])
+
+def rerank_hits(hits, query_embedding, k, lambda_mult=DEFAULT_LAMBDA, min_relevance=None, backend=None, index_name=None):
+    """
+    Re-ranks hits down to k with MMR, timed as the "rerank" stage. Candidate vectors are taken
+    from the hits (if fetched with include_vectors=True), the vector cache, or the backend's
+    get_chunk_vectors, in that order; embeddings are removed from the returned hits. If a vector
+    cannot be found, the hits keep their original order.
+    """
+    with timed("rerank", candidates=len(hits), k=k) as span:
+        vectors = _candidate_vectors(hits, backend, index_name, span) if hits else None
+        if vectors is None:
+            chosen = hits[:k]
+            span["fallback"] = True
+        else:
+            order = mmr_select(query_embedding, vectors, k, lambda_mult, min_relevance)
+            chosen = [hits[i] for i in order]
+        span["selected"] = len(chosen)
+        return [
+            {**hit, "_source": {key: value for key, value in hit["_source"].items() if key != "embedding"}}
+            for hit in chosen
+        ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark of MMR selection.")
+    parser.add_argument("--candidates", type=int, default=DEFAULT_CANDIDATES)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.candidates, args.dim)).astype(np.float32)
+    query = rng.standard_normal(args.dim).astype(np.float32)
+    as_lists = vectors.tolist() # What a search response actually carries
+
+    for label, candidates in (("numpy input", vectors), ("JSON lists", as_lists)):
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            mmr_select(query, candidates, args.k)
+            samples.append(time.perf_counter() - start)
+        p50, p99 = np.percentile(np.asarray(samples) * 1e6, [50, 99])
+        print(f"⏱️ MMR {args.candidates} x {args.dim} -> {args.k} ({label}): p50 {p50:.0f} µs, p99 {p99:.0f} µs")
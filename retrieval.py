@@ -0,0 +1,91 @@
+# retrieval.py
+import importlib
+from rerank import rerank_hits, DEFAULT_CANDIDATES, DEFAULT_LAMBDA
+from bedrock_client import get_embedding, PRIORITY_INTERACTIVE
+from index_profiles import profile_for_config, embedding_dimensions, encode_vector
+
+# Retrieval backends share one function API (create_index, bulk_index_chunks, bulk_delete_chunks,
+# delete_index, swap_alias, search_chunks, search_chunks_batch, hybrid_search_chunks, get_chunk_vectors, get_chunk_documents). Bots pick one with "retrieval_backend" in
+# CHATBOT_CONFIGS; ingest.py picks one with --backend.
+BACKENDS = {
+    "opensearch": "opensearch_client",
+    "local": "local_vector_store",
+}
+DEFAULT_BACKEND = "opensearch"
+
+def get_backend(name=None):
+    """
+    Returns the backend module for name. Modules are imported on first use, so the local backend
+    works offline without AWS credentials.
+    """
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown retrieval backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    return importlib.import_module(BACKENDS[name])
+
+RRF_K = 60 # Standard reciprocal rank fusion constant; damps the influence of top ranks
+
+def reciprocal_rank_fusion(ranked_lists, weights=None, k=5, rrf_k=RRF_K):
+    """
+    Merges several rankings of OpenSearch-style hits (best first) into one. A hit scores
+    sum(weight / (rrf_k + rank)) over the lists it appears in, matched by _id. Only ranks are
+    used, so BM25 and cosine scores never need to be put on the same scale.
+
+    :return: The top k hits, with _score set to the fused score.
+    """
+    weights = weights or [1.0] * len(ranked_lists)
+    fused = {}
+    hits_by_id = {}
+    for hits, weight in zip(ranked_lists, weights):
+        if not weight:
+            continue
+        for rank, hit in enumerate(hits, start=1):
+            fused[hit["_id"]] = fused.get(hit["_id"], 0.0) + weight / (rrf_k + rank)
+            hits_by_id.setdefault(hit["_id"], hit)
+    top_ids = sorted(fused, key=fused.get, reverse=True)[:k]
+    return [{**hits_by_id[hit_id], "_score": fused[hit_id]} for hit_id in top_ids]
+
+def embed_for_bot(config, text, priority=PRIORITY_INTERACTIVE):
+    """
+    Embeds text with the model and dimensions of the bot's "index_profile" (see index_profiles.py),
+    so questions land in the same vector space as the indexed chunks.
+    """
+    profile = profile_for_config(config)
+    return get_embedding(text, model_id=profile["embedding_model_id"], dimensions=embedding_dimensions(profile), priority=priority)
+
+def search_for_bot(config, query_text, query_embedding, k=3):
+    """
+    Retrieves chunks for a bot from the backend and with the mode set in its CHATBOT_CONFIGS entry:
+    "retrieval_mode" is "knn" (default) or "hybrid", weighted by "hybrid_weights". If the bot
+    has a "rerank" entry, rerank["candidates"] hits are fetched and narrowed down to k with
+    maximal marginal relevance (see rerank.py). query_embedding comes from embed_for_bot.
+    With the local backend, "local_hnsw" searches its HNSW graph instead of scoring every row.
+    """
+    backend = get_backend(config.get("retrieval_backend"))
+    index_name = config["opensearch_index_name"]
+    options = {}
+    if config.get("local_hnsw"):
+        if config.get("retrieval_backend") != "local":
+            raise ValueError(f"local_hnsw only applies to the local backend, not {config.get('retrieval_backend', DEFAULT_BACKEND)}")
+        options["use_hnsw"] = True
+    rerank = config.get("rerank")
+    search_embedding = encode_vector(profile_for_config(config), query_embedding) # int8 for byte indexes
+    fetch_k = rerank.get("candidates", DEFAULT_CANDIDATES) if rerank else k
+    if config.get("retrieval_mode", "knn") == "hybrid":
+        weights = config.get("hybrid_weights", {})
+        hits = backend.hybrid_search_chunks(
+            index_name,
+            query_text,
+            search_embedding,
+            k=fetch_k,
+            lexical_weight=weights.get("lexical", 1.0),
+            vector_weight=weights.get("vector", 1.0),
+            candidates=fetch_k if rerank else None, # fetch_k is already the over-fetch
+            **options,
+        )
+    else:
+        hits = backend.search_chunks(index_name, search_embedding, k=fetch_k, **options)
+    if not rerank:
+        return hits
+    return rerank_hits(hits, query_embedding, k, rerank.get("lambda", DEFAULT_LAMBDA), rerank.get("min_relevance"),
+                       backend=backend, index_name=index_name)
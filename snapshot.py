@@ -0,0 +1,168 @@
+# snapshot.py
+import os
+import json
+import time
+import argparse
+import numpy as np
+from retrieval import get_backend, BACKENDS, DEFAULT_BACKEND
+from ingest_manifest import file_hash, load_manifest, save_manifest
+from index_profiles import get_profile, local_dtype, stored_list
+from answer_cache import mark_index_updated
+
+# ---------- Configuration ----------
+SNAPSHOT_FORMAT = 1
+EXPORT_BATCH = 500   # Chunk IDs fetched per get_chunk_documents call
+IMPORT_BATCH = 500   # Documents per _bulk request when importing into OpenSearch
+# -----------------------------------
+
+# A snapshot is everything ingest.py produced for one index, so another environment (staging, a
+# DR region, a laptop) can be stood up without parsing PDFs or calling Bedrock. It is a directory:
+#
+#   embeddings.bin  raw row-major matrix in the index profile's storage dtype (float32, float16
+#                   or int8), the same layout as a local vector store, so it can be memory-mapped
+#   chunks.jsonl    one JSON document per row (chunk text and metadata, no embedding)
+#   manifest.json   format, index profile (embedding model ID, dimension, encoding), row count,
+#                   sha256 of both data files and the ingest manifest (source file hashes and
+#                   chunk IDs). Written last, so a snapshot without it is incomplete.
+#
+# Importing creates a fresh timestamped index and swaps the alias onto it, like ingest.py
+# --mode rebuild, and restores the ingest manifest, so later incremental runs only embed what
+# changed since the snapshot was taken.
+
+def _paths(path):
+    return {name: os.path.join(path, name) for name in ("embeddings.bin", "chunks.jsonl", "manifest.json")}
+
+def export_snapshot(index_name, path, backend=None):
+    """
+    Writes index_name's chunks, metadata and stored embeddings to the snapshot directory path.
+
+    :return: The snapshot manifest dict.
+    """
+    backend = backend or get_backend()
+    manifest = load_manifest(index_name, backend.__name__)
+    ids = [chunk["chunk_id"] for entry in manifest["files"].values() for chunk in entry["chunks"]]
+    if not ids:
+        raise ValueError(f"No ingest manifest for {index_name} ({backend.__name__}); run ingest.py first.")
+    profile = get_profile(manifest.get("index_profile", "nmslib-float"))
+    dtype = np.dtype(local_dtype(profile))
+    paths = _paths(path)
+    os.makedirs(path, exist_ok=True)
+    if os.path.exists(paths["manifest.json"]):
+        os.remove(paths["manifest.json"]) # Incomplete until the new one is written
+
+    rows, missing = 0, 0
+    with open(paths["embeddings.bin"], "wb") as vectors_file, open(paths["chunks.jsonl"], "w") as chunks_file:
+        for start in range(0, len(ids), EXPORT_BATCH):
+            batch = ids[start:start + EXPORT_BATCH]
+            documents = backend.get_chunk_documents(index_name, batch)
+            for chunk_id in batch:
+                document = documents.get(chunk_id)
+                if document is None:
+                    missing += 1
+                    continue
+                vector = np.asarray(document.pop("embedding"), dtype=np.float32)
+                if vector.shape != (profile["dimensions"],):
+                    raise ValueError(f"Chunk {chunk_id} has a {vector.shape[0]}-dim embedding; the {profile['name']} profile has {profile['dimensions']}.")
+                vectors_file.write(vector.astype(dtype).tobytes())
+                chunks_file.write(json.dumps(document) + "\n")
+                rows += 1
+            print(f"📦 Exported {rows} of {len(ids)} chunks")
+    if missing:
+        raise RuntimeError(f"{missing} chunk(s) listed in the manifest are missing from {index_name}; run ingest.py and export again.")
+
+    snapshot = {
+        "format": SNAPSHOT_FORMAT,
+        "index": index_name,
+        "created": time.time(),
+        "rows": rows,
+        "dtype": dtype.name,
+        "index_profile": profile,
+        "checksums": {name: file_hash(paths[name]) for name in ("embeddings.bin", "chunks.jsonl")},
+        "ingest_manifest": manifest,
+    }
+    tmp_path = f"{paths['manifest.json']}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f, indent=2)
+    os.replace(tmp_path, paths["manifest.json"])
+    size_mb = sum(os.path.getsize(paths[name]) for name in ("embeddings.bin", "chunks.jsonl")) / 2**20
+    print(f"✅ Snapshot of {index_name}: {rows} chunks, {profile['name']} profile, {size_mb:.1f} MB in {path}")
+    return snapshot
+
+def read_snapshot(path, verify=True):
+    """
+    :return: The snapshot manifest, after checking the data files against its checksums.
+    """
+    paths = _paths(path)
+    try:
+        with open(paths["manifest.json"]) as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"{path} has no manifest.json; the export did not complete.")
+    if snapshot.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {snapshot.get('format')} (expected {SNAPSHOT_FORMAT}).")
+    if verify:
+        for name, expected in snapshot["checksums"].items():
+            if file_hash(paths[name]) != expected:
+                raise ValueError(f"{paths[name]} does not match the snapshot checksum; copy it again.")
+    return snapshot
+
+def import_snapshot(path, alias, backend=None, verify=True):
+    """
+    Loads a snapshot into a new index behind alias, without re-embedding or parsing PDFs.
+    The local store attaches the files as they are; OpenSearch gets them in _bulk batches
+    read from the memory-mapped matrix.
+
+    :return: Dict with the new index name and the number of chunks loaded.
+    """
+    backend = backend or get_backend()
+    snapshot = read_snapshot(path, verify)
+    profile, rows, paths = snapshot["index_profile"], snapshot["rows"], _paths(path)
+    new_index = f"{alias}-{time.strftime('%Y%m%d%H%M%S')}"
+    if not backend.create_index(index_to_create=new_index, recreate=False, profile=profile):
+        raise RuntimeError(f"Could not create {new_index}; if it already exists, an import just ran. Retry in a second.")
+    start = time.perf_counter()
+    try:
+        if hasattr(backend, "attach_files"):
+            backend.attach_files(new_index, paths["embeddings.bin"], paths["chunks.jsonl"], rows)
+        else:
+            matrix = np.memmap(paths["embeddings.bin"], dtype=snapshot["dtype"], mode="r", shape=(rows, profile["dimensions"]))
+            with open(paths["chunks.jsonl"]) as f:
+                row = 0
+                while row < rows:
+                    documents = [
+                        {**json.loads(f.readline()), "embedding": stored_list(profile, matrix[i])}
+                        for i in range(row, min(row + IMPORT_BATCH, rows))
+                    ]
+                    _, failed = backend.bulk_index_chunks(new_index, documents)
+                    if failed:
+                        raise RuntimeError(f"{len(failed)} chunk(s) could not be indexed into {new_index}")
+                    row += len(documents)
+                    print(f"✅ Imported chunks {row - len(documents) + 1}-{row}")
+    except Exception:
+        backend.delete_index(new_index)
+        print(f"❌ Import failed; deleted {new_index}. {alias} is unchanged.")
+        raise
+
+    for old_index in backend.swap_alias(alias, new_index):
+        backend.delete_index(old_index)
+        print(f"🗑️ Deleted previous index: {old_index}")
+    save_manifest(alias, {**snapshot["ingest_manifest"], "index_profile": profile["name"]}, backend.__name__)
+    mark_index_updated(alias) # Drop answers cached against the old content
+    seconds = time.perf_counter() - start
+    print(f"📊 Loaded {rows} chunks into {new_index} in {seconds:.1f}s ({profile['name']} profile)")
+    return {"index": new_index, "chunks": rows, "seconds": seconds}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export an ingested index to a snapshot, or load a snapshot without re-embedding.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot directory.")
+    parser.add_argument("--index", default="skyconnect-knowledge-base", help="Index (or alias) to export, or alias to import into.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND)
+    parser.add_argument("--skip-verify", action="store_true", help="Do not check the data files against the manifest checksums.")
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend)
+    if args.command == "export":
+        export_snapshot(args.index, args.path, backend)
+    else:
+        import_snapshot(args.path, args.index, backend, verify=not args.skip_verify)
@@ -0,0 +1,72 @@
+# startup_time.py
+import os
+import sys
+import json
+import tempfile
+import argparse
+import statistics
+import subprocess
+
+# Measures the cold start of the Streamlit apps: the first run of each script in a fresh Python
+# process, as a new server process would do it. streamlit itself is imported before the clock
+# starts, so the figure is what the app's own code and imports cost. Needs no AWS access; the
+# first run of an app only renders the page and does not call Bedrock or OpenSearch. A one-line
+# Streamlit page is measured too, as the floor every app pays.
+
+DEFAULT_APPS = ["app.py", "multiApp.py"]
+
+_CHILD = """
+import sys, json, time
+from streamlit.testing.v1 import AppTest
+before = set(sys.modules)
+start = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.run()
+seconds = time.perf_counter() - start
+heavy = [name for name in ("boto3", "botocore", "opensearchpy", "requests_aws4auth", "langchain", "PyPDF2", "numpy") if name in sys.modules and name not in before]
+print(json.dumps({{"seconds": seconds, "exception": [str(e.value) for e in at.exception], "heavy_imports": heavy}}))
+"""
+
+def measure(app, runs):
+    """
+    :return: Dict with the median and all cold-start seconds of app, and the heavy modules it imported.
+    """
+    samples = []
+    result = {}
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", _CHILD.format(app=app)], capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if result["exception"]:
+            raise RuntimeError(f"{app} failed on first run: {result['exception']}")
+        samples.append(result["seconds"])
+    return {"app": app, "median_seconds": statistics.median(samples), "samples": samples, "heavy_imports": result["heavy_imports"]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold-start time of the Streamlit apps.")
+    parser.add_argument("apps", nargs="*", default=DEFAULT_APPS)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per app; the median is reported.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write("import streamlit as st\nst.write('hello')\n")
+    try:
+        floor = measure(f.name, args.runs)["median_seconds"]
+    finally:
+        os.unlink(f.name)
+    print(f"⏱️ bare Streamlit page: first run {floor * 1000:.0f} ms (median of {args.runs})")
+
+    results = []
+    for app in args.apps:
+        result = measure(app, args.runs)
+        result["overhead_seconds"] = result["median_seconds"] - floor
+        results.append(result)
+        heavy = ", ".join(result["heavy_imports"]) or "none"
+        print(
+            f"⏱️ {app}: first run {result['median_seconds'] * 1000:.0f} ms (median of {args.runs}), "
+            f"{result['overhead_seconds'] * 1000:+.0f} ms over the bare page; heavy imports: {heavy}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,47 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+import pytest
+
+# The modules under test read SKYCONNECT_CACHE_DIR when they are imported, so point it at a
+# scratch directory before any test module imports them. Nothing touches the real .cache/.
+os.environ["SKYCONNECT_CACHE_DIR"] = tempfile.mkdtemp(prefix="skyconnect-tests-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_bedrock():
+    """
+    Routes Bedrock calls to an instant FakeBedrockRuntime through an unthrottled scheduler.
+    """
+    import bedrock_client
+    from fake_services import FakeBedrockRuntime
+
+    fake = FakeBedrockRuntime(embedding_latency=0.0, llm_ttft=0.0, llm_token_latency=0.0)
+    bedrock_client.set_bedrock_runtime(fake)
+    previous = bedrock_client.set_scheduler(bedrock_client.BedrockScheduler({}))
+    yield fake
+    bedrock_client.set_scheduler(previous)
+
+
+def write_document(path, *chunks):
+    """
+    Writes a stand-in "PDF" for the text_chunks fixture: one chunk per line.
+    """
+    path.write_text("\n".join(chunks) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def text_chunks(monkeypatch):
+    """
+    Makes ingest read documents written by write_document instead of extracting PDFs, so tests
+    can create and edit them.
+    """
+    import ingest
+
+    def iter_chunks(file_path, *args, **kwargs):
+        with open(file_path) as f:
+            yield from (line.strip() for line in f if line.strip())
+    monkeypatch.setattr(ingest, "iter_pdf_chunks", iter_chunks)
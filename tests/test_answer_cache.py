@@ -0,0 +1,30 @@
+# tests/test_answer_cache.py
+import numpy as np
+from answer_cache import SemanticAnswerCache, mark_index_updated
+
+
+def test_lookup_hits_above_threshold_and_misses_below():
+    cache = SemanticAnswerCache()
+    question = np.array([1.0, 0.0, 0.0])
+    cache.store("test-threshold", question, "Two bags.", "How many bags?")
+
+    close = np.array([0.95, np.sqrt(1 - 0.95 ** 2), 0.0]) # Cosine similarity 0.95
+    assert cache.lookup("test-threshold", 3 * question) == "Two bags." # Scale does not matter
+    assert cache.lookup("test-threshold", close, threshold=0.94) == "Two bags."
+    assert cache.lookup("test-threshold", close, threshold=0.96) is None
+    assert cache.lookup("other-index", question) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_reingest_invalidates_entries():
+    cache = SemanticAnswerCache()
+    cache.store("test-invalidate", [0.0, 1.0], "Cached.")
+    assert cache.lookup("test-invalidate", [0.0, 1.0]) == "Cached."
+    mark_index_updated("test-invalidate")
+    assert cache.lookup("test-invalidate", [0.0, 1.0]) is None
+
+
+def test_expired_entries_miss():
+    cache = SemanticAnswerCache(ttl_seconds=-1)
+    cache.store("test-ttl", [1.0, 0.0], "Stale.")
+    assert cache.lookup("test-ttl", [1.0, 0.0]) is None
@@ -0,0 +1,70 @@
+# tests/test_bedrock_scheduler.py
+import time
+import threading
+import pytest
+import bedrock_client
+from bedrock_client import BedrockScheduler, EMBEDDING_MODEL_ID, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from fake_services import FakeBedrockRuntime, FakeThrottlingException, fake_embedding
+from metrics import trace
+
+
+@pytest.fixture
+def quota_bedrock(monkeypatch):
+    """
+    A FakeBedrockRuntime that throttles beyond one call per second, behind a scheduler that
+    admits far more, so every throttle comes from the runtime.
+    """
+    fake = FakeBedrockRuntime(embedding_latency=0.0, quota_per_second=1)
+    previous_runtime = bedrock_client.set_bedrock_runtime(fake)
+    previous_scheduler = bedrock_client.set_scheduler(BedrockScheduler({EMBEDDING_MODEL_ID: 100.0}))
+    yield fake
+    bedrock_client.set_scheduler(previous_scheduler)
+    bedrock_client.set_bedrock_runtime(previous_runtime)
+
+
+def test_throttled_call_is_retried_until_it_succeeds(quota_bedrock, monkeypatch):
+    monkeypatch.setattr(bedrock_client, "THROTTLE_PAUSE_SECONDS", 0.4) # Pauses of 0.4s then 0.8s outlast the 1s quota window
+    bedrock_client.get_embedding("first question", use_cache=False)
+    with trace() as spans:
+        embedding = bedrock_client.get_embedding("second question", use_cache=False)
+
+    assert embedding == fake_embedding("second question")
+    assert spans[-1]["throttles"] == 2 and spans[-1]["status"] == "ok"
+    assert quota_bedrock.calls["throttled"] == 2
+    assert quota_bedrock.calls["embedding"] == 2
+
+
+def test_retry_budget_is_respected(quota_bedrock, monkeypatch):
+    monkeypatch.setattr(bedrock_client, "THROTTLE_PAUSE_SECONDS", 0.01)
+    monkeypatch.setattr(bedrock_client, "MAX_THROTTLE_RETRIES", 2)
+    bedrock_client.get_embedding("first question", use_cache=False)
+    with pytest.raises(FakeThrottlingException):
+        bedrock_client.get_embedding("second question", use_cache=False)
+    assert quota_bedrock.calls["throttled"] == 3 # The first attempt and two retries
+
+
+def test_interactive_request_overtakes_queued_background_request(fake_bedrock):
+    scheduler = BedrockScheduler({EMBEDDING_MODEL_ID: 2.0})
+    bedrock_client.set_scheduler(scheduler)
+    for _ in range(2): # Use up the burst, so the next requests queue
+        scheduler.acquire(EMBEDDING_MODEL_ID)
+    finished = []
+
+    def ask(name, priority):
+        bedrock_client.get_embedding(name, use_cache=False, priority=priority)
+        finished.append(name)
+
+    def wait_for_waiters(count):
+        deadline = time.monotonic() + 5
+        while scheduler.stats()[EMBEDDING_MODEL_ID]["waiting"] < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    background = threading.Thread(target=ask, args=("ingest chunk", PRIORITY_BACKGROUND))
+    background.start()
+    wait_for_waiters(1)
+    interactive = threading.Thread(target=ask, args=("chat question", PRIORITY_INTERACTIVE))
+    interactive.start()
+    wait_for_waiters(2)
+    background.join()
+    interactive.join()
+    assert finished == ["chat question", "ingest chunk"]
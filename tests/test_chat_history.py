@@ -0,0 +1,27 @@
+# tests/test_chat_history.py
+from chat_history import ChatHistory
+
+
+def test_dropped_turns_are_summarized():
+    history = ChatHistory(window=2, max_messages=4)
+    history.activate("airline_faq", "Hello!")
+    for i in range(3):
+        history.append("user", f"Question {i}?")
+        history.append("assistant", f"Answer {i}. More detail follows.")
+
+    assert [message["content"] for message in history.recent()] == ["Question 2?", "Answer 2. More detail follows."]
+    assert history.dropped() == 3
+    assert history.summary() == "A: Hello!\nQ: Question 0?\nA: Answer 0."
+
+
+def test_session_limit_drops_least_recently_used_bot_first():
+    history = ChatHistory(window=1, max_chars=30)
+    history.activate("coffee_shop")
+    history.append("user", "x" * 10)
+    history.activate("airline_faq")
+    history.append("user", "y" * 10)
+    history.append("user", "z" * 15)
+
+    assert history.dropped("coffee_shop") == 1
+    assert history.dropped("airline_faq") == 0
+    assert history.total_chars() == 25
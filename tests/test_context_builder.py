@@ -0,0 +1,48 @@
+# tests/test_context_builder.py
+from context_builder import build_context, estimate_tokens, PASSAGE_SEPARATOR
+
+
+def _hit(text, source_file="data/SkyConnect_Baggage.pdf", page=1):
+    return {"_source": {"chunk_text": text, "source_file": source_file, "page_start": page, "page_end": page}}
+
+
+BAGS = "Economy passengers may check one bag of up to 23 kg on every flight."
+FEES = "Each additional bag costs 60 USD and must be paid at the airport counter."
+
+
+def test_contained_hits_are_dropped():
+    context, stats = build_context([_hit(BAGS + " " + FEES), _hit(FEES), _hit(BAGS.replace(" ", "\n  "))]) # Whitespace differences do not count
+    assert stats["passages"] == 1
+    assert context == "[SkyConnect_Baggage.pdf, p. 1]\n" + BAGS + " " + FEES
+
+
+def test_overlapping_chunks_of_a_file_are_merged():
+    first, second = BAGS + " " + FEES[:40], FEES[:40] + FEES[40:] + " Pets travel in the cabin."
+    context, stats = build_context([_hit(second, page=2), _hit(first, page=1)])
+    assert stats["passages"] == 1
+    assert context == "[SkyConnect_Baggage.pdf, pp. 1-2]\n" + BAGS + " " + FEES + " Pets travel in the cabin."
+
+    # The same overlap across two files is left alone
+    _, stats = build_context([_hit(second, page=2), _hit(first, source_file="data/SkyConnect_Fees.pdf")])
+    assert stats["passages"] == 2
+
+
+def test_repeated_lines_are_kept_only_in_the_better_hit():
+    heading = "SkyConnect Airlines - Baggage Policy and Allowances"
+    context, _ = build_context([_hit(heading + "\n\n\n" + BAGS, page=1), _hit(heading + "\n\n\n" + FEES, page=3)])
+    assert context.count(heading) == 1 and BAGS in context and FEES in context
+
+
+def test_budget_keeps_best_passages_and_truncates_the_last():
+    sentence = "Flights to Lisbon leave daily at nine. "
+    hits = [_hit(sentence * 30, "data/a.pdf"), _hit(sentence.replace("Lisbon", "Oslo") * 30, "data/b.pdf"), _hit(BAGS, "data/c.pdf")]
+    full = estimate_tokens("[a.pdf, p. 1]\n" + (sentence * 30).strip() + PASSAGE_SEPARATOR)
+    context, stats = build_context(hits, token_budget=full + 100)
+
+    assert stats["truncated"] and stats["passages"] == 2
+    assert stats["estimated_tokens"] <= full + 100
+    assert context.startswith("[a.pdf, p. 1]\n") and "Oslo" in context and context.endswith(" …")
+    assert BAGS not in context # Less relevant than the passage that filled the budget
+
+    _, stats = build_context(hits, token_budget=full)
+    assert stats["passages"] == 1 and not stats["truncated"]
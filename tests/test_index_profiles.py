@@ -0,0 +1,13 @@
+# tests/test_index_profiles.py
+import pytest
+from index_profiles import get_profile, DEFAULT_INDEX_PROFILE
+
+
+def test_get_profile_names_every_profile():
+    assert get_profile()["name"] == DEFAULT_INDEX_PROFILE
+    custom = {**get_profile("faiss-fp16"), "m": 32}
+    del custom["name"]
+    assert get_profile(custom) == {"name": "custom", **custom}
+    assert get_profile({**custom, "name": "faiss-m32"})["name"] == "faiss-m32"
+    with pytest.raises(ValueError):
+        get_profile("no-such-profile")
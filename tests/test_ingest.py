@@ -0,0 +1,73 @@
+# tests/test_ingest.py
+import os
+import pytest
+import ingest
+import local_vector_store
+from conftest import write_document
+from ingest_checkpoint import IngestCheckpoint
+from ingest_manifest import load_manifest
+
+
+pytestmark = pytest.mark.usefixtures("text_chunks")
+
+
+def _stored_texts(index_name):
+    store = local_vector_store.get_store(index_name)
+    return sorted(store._documents[row]["chunk_text"] for row in store._ids.values())
+
+
+def test_incremental_ingest_applies_added_changed_and_removed_files(tmp_path, fake_bedrock):
+    index_name = "test-manifest-diff"
+    a = write_document(tmp_path / "a.pdf", "Checked bags weigh up to 23 kg.", "Pets travel in the cabin.")
+    b = write_document(tmp_path / "b.pdf", "Flights leave from terminal 2.")
+    c = write_document(tmp_path / "c.pdf", "Lounges open at 5 am.")
+    totals = ingest.ingest_incremental([a, b, c], index_name, backend=local_vector_store)
+    assert (totals["indexed"], totals["deleted"]) == (4, 0)
+
+    write_document(tmp_path / "a.pdf", "Checked bags weigh up to 23 kg.", "Pets travel in the hold.") # Changed
+    d = write_document(tmp_path / "d.pdf", "Wi-Fi is free on long-haul flights.")                     # Added; c is removed
+    embeddings_before = fake_bedrock.calls["embedding"]
+    totals = ingest.ingest_incremental([a, b, d], index_name, backend=local_vector_store)
+
+    assert (totals["indexed"], totals["deleted"], totals["failed"]) == (2, 2, 0)
+    assert fake_bedrock.calls["embedding"] - embeddings_before == 2 # Only the new chunks were embedded
+    assert _stored_texts(index_name) == sorted([
+        "Checked bags weigh up to 23 kg.", "Pets travel in the hold.",
+        "Flights leave from terminal 2.", "Wi-Fi is free on long-haul flights.",
+    ])
+    assert sorted(load_manifest(index_name, "local_vector_store")["files"]) == sorted([a, b, d])
+
+    totals = ingest.ingest_incremental([a, b, d], index_name, backend=local_vector_store)
+    assert (totals["indexed"], totals["deleted"]) == (0, 0)
+
+
+def test_interrupted_ingest_resumes_from_checkpoint(tmp_path, monkeypatch, fake_bedrock):
+    index_name = "test-checkpoint-resume"
+    pdf = write_document(tmp_path / "faq.pdf", *[f"Answer number {i}." for i in range(6)])
+    bulk_index_chunks = local_vector_store.bulk_index_chunks
+    written = []
+
+    def recording_bulk_index(crash_after=None):
+        def bulk(index, documents, *args, **kwargs):
+            if crash_after is not None and len(written) >= crash_after:
+                raise KeyboardInterrupt # Killed part-way through the file
+            written.extend(doc["chunk_id"] for doc in documents)
+            return bulk_index_chunks(index, documents, *args, **kwargs)
+        return bulk
+
+    monkeypatch.setattr(local_vector_store, "bulk_index_chunks", recording_bulk_index(crash_after=4))
+    with pytest.raises(KeyboardInterrupt):
+        ingest.ingest_incremental([pdf], index_name, batch_size=2, backend=local_vector_store)
+    checkpoint = IngestCheckpoint(index_name, "local_vector_store")
+    assert checkpoint.load() is not None and checkpoint.chunk_count() == 4
+    assert load_manifest(index_name, "local_vector_store")["files"] == {}
+
+    written.clear()
+    monkeypatch.setattr(local_vector_store, "bulk_index_chunks", recording_bulk_index())
+    totals = ingest.ingest_incremental([pdf], index_name, batch_size=2, backend=local_vector_store)
+
+    assert (totals["resumed"], totals["indexed"]) == (4, 2)
+    assert len(written) == 2
+    assert _stored_texts(index_name) == sorted(f"Answer number {i}." for i in range(6))
+    assert not os.path.exists(checkpoint.path)
+    assert len(load_manifest(index_name, "local_vector_store")["files"][pdf]["chunks"]) == 6
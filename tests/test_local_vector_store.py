@@ -0,0 +1,56 @@
+# tests/test_local_vector_store.py
+import numpy as np
+import pytest
+from local_vector_store import LocalVectorStore
+
+DIMENSION = 16
+
+
+def _brute_force(vectors, query, k):
+    ids = sorted(vectors)
+    matrix = np.asarray([vectors[chunk_id] for chunk_id in ids], dtype=np.float32)
+    similarities = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    return [ids[row] for row in np.argsort(-similarities)[:k]]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_search_matches_brute_force_after_upserts_and_deletes(tmp_path, dtype):
+    rng = np.random.default_rng(7)
+    store = LocalVectorStore(str(tmp_path / "store"), dimension=DIMENSION, dtype=dtype)
+    vectors = {}
+
+    def upsert(ids):
+        documents = [{"chunk_id": chunk_id, "chunk_text": f"chunk {chunk_id}", "embedding": rng.normal(size=DIMENSION).tolist()} for chunk_id in ids]
+        store.upsert(documents)
+        vectors.update({doc["chunk_id"]: np.asarray(doc["embedding"], dtype=dtype).astype(np.float32) for doc in documents})
+
+    upsert([f"c{i}" for i in range(40)])
+    upsert([f"c{i}" for i in range(0, 40, 5)]) # Replacements
+    store.delete([f"c{i}" for i in range(1, 40, 7)] + ["missing"])
+    for chunk_id in [f"c{i}" for i in range(1, 40, 7)]:
+        vectors.pop(chunk_id)
+    upsert([f"c{i}" for i in range(40, 50)])
+
+    assert len(store) == len(vectors)
+    for _ in range(10):
+        query = rng.normal(size=DIMENSION)
+        assert [hit["_id"] for hit in store.search(query, k=5)] == _brute_force(vectors, query, 5)
+
+    reopened = LocalVectorStore(str(tmp_path / "store"), dimension=DIMENSION, dtype=dtype)
+    query = rng.normal(size=DIMENSION)
+    assert [hit["_id"] for hit in reopened.search(query, k=5)] == _brute_force(vectors, query, 5)
+
+
+def test_hnsw_search_sees_writes(tmp_path):
+    pytest.importorskip("hnswlib")
+    rng = np.random.default_rng(3)
+    store = LocalVectorStore(str(tmp_path / "store"), dimension=DIMENSION, use_hnsw=True)
+    store.upsert([{"chunk_id": f"c{i}", "chunk_text": "", "embedding": rng.normal(size=DIMENSION).tolist()} for i in range(30)])
+    query = rng.normal(size=DIMENSION)
+    best = store.search(query, k=1, use_hnsw=False)[0]["_id"]
+    assert store.search(query, k=1)[0]["_id"] == best
+
+    store.delete([best])
+    assert best not in [hit["_id"] for hit in store.search(query, k=5)]
+    store.upsert([{"chunk_id": "exact", "chunk_text": "", "embedding": query.tolist()}])
+    assert store.search(query, k=1)[0]["_id"] == "exact"
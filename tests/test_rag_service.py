@@ -0,0 +1,117 @@
+# tests/test_rag_service.py
+import json
+import asyncio
+import pytest
+import ingest
+import rag_service
+import local_vector_store
+from conftest import write_document
+from chatbot_configs import CHATBOT_CONFIGS
+from metrics import registry
+from rag_service import RAGService
+
+pytestmark = pytest.mark.usefixtures("text_chunks")
+
+BOT = "airline_faq"
+INDEX = "test-rag-service"
+
+
+@pytest.fixture
+def service(tmp_path, fake_bedrock):
+    pdf = write_document(tmp_path / "policies.pdf", "Checked bags weigh up to 23 kg.", "Pets travel in the cabin.")
+    ingest.ingest_incremental([pdf], INDEX, backend=local_vector_store)
+    config = {**CHATBOT_CONFIGS[BOT], "opensearch_index_name": INDEX, "retrieval_backend": "local", "faq": None}
+    return RAGService(configs={BOT: config}, use_caches=False)
+
+
+def _coalesced():
+    return registry._counters.get(("skyconnect_coalesced_requests_total", (("bot", BOT),)), 0)
+
+
+def test_identical_in_flight_questions_share_one_request(service, fake_bedrock):
+    fake_bedrock.llm_ttft = 0.2 # Keep the first request in flight while the others arrive
+
+    async def ask_all():
+        return await asyncio.gather(
+            service.answer(BOT, "How heavy can checked bags be?"),
+            service.answer(BOT, "  how heavy can CHECKED bags be?"),
+            service.answer(BOT, "Can my cat travel with me?"),
+        )
+
+    coalesced = _coalesced()
+    first, same, other = asyncio.run(ask_all())
+    assert fake_bedrock.calls["stream"] == 2
+    assert _coalesced() - coalesced == 1
+    assert first["answer"] == same["answer"] and first["sources"] == same["sources"]
+    assert other["answer"]
+
+
+async def _request(service, method, path, body=b""):
+    # Sends one raw HTTP request to a server running _handle; returns (status, body).
+    server = await asyncio.start_server(lambda reader, writer: rag_service._handle(service, reader, writer), "127.0.0.1", 0)
+    async with server:
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), payload.decode("utf-8")
+
+
+def _post(service, path, payload):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+    return asyncio.run(_request(service, "POST", path, body))
+
+
+@pytest.mark.parametrize("path, payload", [
+    ("/v1/answer", b"{not json"),
+    ("/v1/answer", ["not", "an", "object"]),
+    ("/v1/answer", {"bot": BOT}),
+    ("/v1/answer", {"bot": BOT, "question": 42}),
+    ("/v1/answer", {"bot": BOT, "question": "Bags?", "history": ["not", "text"]}),
+    ("/v1/answer", {"bot": "coffee_shop", "question": "Espresso?", "stream": True}),
+    ("/v1/embed", {"text": None}),
+])
+def test_malformed_requests_get_400(service, path, payload):
+    status, body = _post(service, path, payload)
+    assert status == 400 and json.loads(body)["error"]
+
+
+def test_unknown_route_gets_404(service):
+    assert asyncio.run(_request(service, "GET", "/v1/nothing"))[0] == 404
+
+
+def test_pipeline_failure_gets_500(service, monkeypatch):
+    def search_down(*args, **kwargs):
+        raise OSError("search backend down")
+    monkeypatch.setattr(rag_service, "search_for_bot", search_down)
+    status, body = _post(service, "/v1/answer", {"bot": BOT, "question": "Bags?"})
+    assert status == 500 and "search backend down" in json.loads(body)["error"]
+
+
+def test_failure_after_stream_start_becomes_an_error_event(service, monkeypatch):
+    async def broken_stream(bot_key, question, history=None):
+        yield {"type": "meta", "cached": False, "precomputed": False, "sources": []}
+        raise LookupError("lost the model stream")
+    monkeypatch.setattr(service, "answer_stream", broken_stream)
+    status, body = _post(service, "/v1/answer", {"bot": BOT, "question": "Bags?", "stream": True})
+    events = [json.loads(line) for line in body.splitlines()]
+    assert status == 200
+    assert [event["type"] for event in events] == ["meta", "error"]
+    assert events[-1]["error"] == "lost the model stream"
+
+
+def test_history_summary_reaches_the_prompt(service, fake_bedrock, monkeypatch):
+    prompts = []
+    stream = fake_bedrock.invoke_model_with_response_stream
+
+    def recording_stream(**kwargs):
+        prompts.append(json.loads(kwargs["body"])["prompt"])
+        return stream(**kwargs)
+    monkeypatch.setattr(fake_bedrock, "invoke_model_with_response_stream", recording_stream)
+
+    asyncio.run(service.answer(BOT, "And for pets?", "Q: How heavy can bags be?\nA: Up to 23 kg."))
+    asyncio.run(service.answer(BOT, "And for pets?"))
+    assert "Earlier in this conversation:\nQ: How heavy can bags be?\nA: Up to 23 kg." in prompts[0]
+    assert "Earlier in this conversation" not in prompts[1]
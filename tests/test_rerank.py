@@ -0,0 +1,25 @@
+# tests/test_rerank.py
+import numpy as np
+from rerank import mmr_select
+
+
+def test_pure_relevance_keeps_similarity_order():
+    query = [1.0, 0.0, 0.0]
+    candidates = [[0.5, 0.5, 0.0], [1.0, 0.1, 0.0], [0.9, 0.0, 0.4]]
+    assert mmr_select(query, candidates, k=3, lambda_mult=1.0) == [1, 2, 0]
+
+
+def test_near_duplicates_give_way_to_diverse_candidates():
+    query = [1.0, 0.0]
+    candidates = [[1.0, 0.05], [1.0, 0.06], [0.7, 0.7]] # The first two are near copies
+    assert mmr_select(query, candidates, k=2, lambda_mult=1.0) == [0, 1]
+    assert mmr_select(query, candidates, k=2, lambda_mult=0.3) == [0, 2]
+
+
+def test_min_relevance_and_edge_cases():
+    query = [1.0, 0.0]
+    candidates = np.array([[1.0, 0.0], [0.0, 1.0], [-1.0, 0.0]])
+    assert mmr_select(query, candidates, k=3, min_relevance=0.5) == [0]
+    assert mmr_select(query, candidates, k=0) == []
+    assert mmr_select(query, np.empty((0, 2)), k=3) == []
+    assert sorted(mmr_select([0.0, 0.0], candidates, k=5)) == [0, 1, 2] # A zero query still picks each candidate once
@@ -0,0 +1,22 @@
+# tests/test_retrieval.py
+import pytest
+from retrieval import reciprocal_rank_fusion, RRF_K
+
+
+def _hits(*ids):
+    return [{"_id": hit_id, "_score": 0.0, "_source": {"chunk_id": hit_id}} for hit_id in ids]
+
+
+def test_rrf_prefers_hits_ranked_in_both_lists():
+    fused = reciprocal_rank_fusion([_hits("a", "b", "c"), _hits("c", "b", "d")], k=4)
+    # c (ranks 3 and 1) edges out b (2 and 2); a and d appear in one list each
+    assert [hit["_id"] for hit in fused] == ["c", "b", "a", "d"]
+    assert fused[0]["_score"] == pytest.approx(1 / (RRF_K + 3) + 1 / (RRF_K + 1))
+    assert fused[0]["_source"] == {"chunk_id": "c"}
+
+
+def test_rrf_weights_and_k():
+    lexical, vector = _hits("a", "b"), _hits("b", "a")
+    assert [hit["_id"] for hit in reciprocal_rank_fusion([lexical, vector], weights=[2.0, 1.0])] == ["a", "b"]
+    assert [hit["_id"] for hit in reciprocal_rank_fusion([lexical, vector], weights=[0.0, 1.0])] == ["b", "a"]
+    assert len(reciprocal_rank_fusion([lexical, vector], k=1)) == 1
@@ -0,0 +1,60 @@
+# tests/test_snapshot.py
+import os
+import pytest
+import ingest
+import local_vector_store
+import opensearch_client
+from conftest import write_document
+from fake_services import FakeOpenSearch, fake_embedding
+from ingest_manifest import load_manifest
+from snapshot import export_snapshot, import_snapshot, read_snapshot
+
+pytestmark = pytest.mark.usefixtures("text_chunks", "fake_bedrock")
+
+CHUNKS = ["Checked bags weigh up to 23 kg.", "Pets travel in the cabin.", "Lounges open at 5 am."]
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    pdf = write_document(tmp_path / "policies.pdf", *CHUNKS)
+    ingest.ingest_incremental([pdf], "test-snapshot-source", backend=local_vector_store)
+    path = str(tmp_path / "snapshot")
+    export_snapshot("test-snapshot-source", path, backend=local_vector_store)
+    return path
+
+
+def _top_text(backend, index_name, text):
+    return backend.search_chunks(index_name, fake_embedding(text), k=1)[0]["_source"]["chunk_text"]
+
+
+@pytest.mark.parametrize("backend_name", ["local", "opensearch"])
+def test_round_trip_restores_chunks_vectors_and_manifest(snapshot_dir, backend_name):
+    if backend_name == "local":
+        backend = local_vector_store
+    else:
+        backend = opensearch_client
+        opensearch_client.set_client(FakeOpenSearch(0.0, serializer=opensearch_client.serializer))
+    result = import_snapshot(snapshot_dir, "test-snapshot-copy", backend=backend)
+
+    assert result["chunks"] == len(CHUNKS)
+    for text in CHUNKS:
+        assert _top_text(backend, "test-snapshot-copy", text) == text
+    source_manifest = load_manifest("test-snapshot-source", "local_vector_store")
+    assert load_manifest("test-snapshot-copy", backend.__name__) == source_manifest
+
+
+def test_checksum_mismatch_is_refused(snapshot_dir):
+    read_snapshot(snapshot_dir) # Intact
+    with open(f"{snapshot_dir}/embeddings.bin", "r+b") as f:
+        f.seek(10)
+        f.write(b"\xff")
+    with pytest.raises(ValueError, match="checksum"):
+        import_snapshot(snapshot_dir, "test-snapshot-corrupt", backend=local_vector_store)
+    assert load_manifest("test-snapshot-corrupt", "local_vector_store") == {"files": {}}
+    assert read_snapshot(snapshot_dir, verify=False)["rows"] == len(CHUNKS)
+
+
+def test_incomplete_export_is_refused(snapshot_dir):
+    os.remove(f"{snapshot_dir}/manifest.json")
+    with pytest.raises(ValueError, match="did not complete"):
+        read_snapshot(snapshot_dir)
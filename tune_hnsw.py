@@ -0,0 +1,253 @@
+# tune_hnsw.py
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import itertools
+import numpy as np
+from embedding_cache import CACHE_DIR
+from retrieval import get_backend, embed_for_bot, BACKENDS, DEFAULT_BACKEND
+from ingest_manifest import load_manifest
+from eval_retrieval import load_eval_set, DEFAULT_EVAL_FILE
+from index_profiles import get_profile, encode_vector, stored_list, bytes_per_vector, save_tuned_profile, TUNED_PROFILES_FILE
+
+# Measures HNSW parameters (m, ef_construction, ef_search) on the vectors of an ingested index.
+# The stored embeddings are loaded by chunk ID from the ingest manifest, the eval questions are
+# embedded with the index's profile, and exact top-k neighbours are computed by brute force.
+# Every configuration is then built and queried, either as an in-process hnswlib graph
+# (--target local, quick, no AWS) or as a real OpenSearch index with the profile's engine
+# (--target opensearch, one temporary index per configuration, deleted afterwards).
+# The best configuration can be saved as a named profile for create_index and ingest.py.
+
+# ---------- Configuration ----------
+DEFAULT_M = [16, 32, 48]
+DEFAULT_EF_CONSTRUCTION = [128, 256]
+DEFAULT_EF_SEARCH = [32, 64, 100, 256]
+DEFAULT_K = 10
+DEFAULT_TARGET_RECALL = 0.95
+DEFAULT_RESULTS_PATH = os.path.join(CACHE_DIR, "reports", "hnsw_tuning.json")
+LATENCY_ROUNDS = 5             # Times every query is repeated when timing
+VECTOR_FETCH_BATCH = 500       # Chunk IDs per get_chunk_vectors call
+BULK_BATCH = 200               # Vectors per _bulk request when building OpenSearch candidates
+TUNING_INDEX_PREFIX = "hnsw-tune"
+SEARCHABLE_TIMEOUT = 120.0     # Seconds to wait for a new OpenSearch index to answer searches
+# -----------------------------------
+
+_HNSWLIB_SPACES = {"l2": "l2", "cosinesimil": "cosine", "innerproduct": "ip"}
+
+def load_corpus(index_name, backend):
+    """
+    :return: Tuple of (chunk IDs, float32 matrix of their stored embeddings, manifest).
+    """
+    manifest = load_manifest(index_name, backend.__name__)
+    ids = [chunk["chunk_id"] for entry in manifest["files"].values() for chunk in entry["chunks"]]
+    vectors = {}
+    for start in range(0, len(ids), VECTOR_FETCH_BATCH):
+        vectors.update(backend.get_chunk_vectors(index_name, ids[start:start + VECTOR_FETCH_BATCH]))
+    ids = [chunk_id for chunk_id in ids if chunk_id in vectors]
+    matrix = np.array([vectors[chunk_id] for chunk_id in ids], dtype=np.float32).reshape(len(ids), -1)
+    return ids, matrix, manifest
+
+def add_distractors(corpus, rows, profile, seed=0):
+    """
+    Appends rows random unit vectors, encoded like the profile stores them, so a small corpus
+    can be swept at the size it is expected to grow to.
+    """
+    if not rows:
+        return corpus
+    vectors = np.random.default_rng(seed).standard_normal((rows, corpus.shape[1])).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    if profile["vector_encoding"] == "byte":
+        vectors = np.array([encode_vector(profile, vector) for vector in vectors], dtype=np.float32)
+    return np.vstack([corpus, vectors])
+
+def exact_top_k(corpus, queries, k, space_type="l2"):
+    """
+    Brute-force ground truth.
+    :return: Array of shape (queries, k) with the corpus rows of each query's nearest neighbours.
+    """
+    if space_type == "l2":
+        scores = -((corpus ** 2).sum(axis=1)[None, :] - 2 * queries @ corpus.T) # -||c - q||^2 up to a per-query constant
+    elif space_type == "cosinesimil":
+        norms = np.linalg.norm(corpus, axis=1)
+        scores = (queries @ corpus.T) / np.where(norms == 0, 1.0, norms)[None, :]
+    else:
+        scores = queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+def _recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])) if len(truth) else 1.0
+
+def _timed_queries(search, queries, rounds=LATENCY_ROUNDS):
+    # Runs every query rounds times; returns the rows found by the first round and all latencies.
+    found, samples = [], []
+    for round_number in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            rows = search(query)
+            samples.append(time.perf_counter() - start)
+            if round_number == 0:
+                found.append(rows)
+    p50, p99 = np.percentile(np.asarray(samples) * 1000, [50, 99])
+    return found, float(p50), float(p99)
+
+def sweep_hnswlib(corpus, queries, truth, profile, grid, k):
+    """
+    Builds one hnswlib graph per (m, ef_construction) and queries it at every ef_search.
+    Memory is the size of the serialized graph, vectors included.
+    """
+    try:
+        import hnswlib
+    except ImportError:
+        raise ImportError("The local sweep needs the hnswlib package: pip install hnswlib")
+    results = []
+    for m, ef_construction in itertools.product(grid["m"], grid["ef_construction"]):
+        index = hnswlib.Index(space=_HNSWLIB_SPACES[profile["space_type"]], dim=corpus.shape[1])
+        start = time.perf_counter()
+        index.init_index(max_elements=len(corpus), ef_construction=ef_construction, M=m)
+        index.add_items(corpus, np.arange(len(corpus)))
+        build_seconds = time.perf_counter() - start
+        with tempfile.TemporaryDirectory(prefix="skyconnect-hnsw-") as tmp:
+            index.save_index(os.path.join(tmp, "graph.bin"))
+            memory_bytes = os.path.getsize(os.path.join(tmp, "graph.bin"))
+
+        for ef_search in grid["ef_search"]:
+            index.set_ef(max(ef_search, k)) # hnswlib needs ef >= k
+            found, p50, p99 = _timed_queries(lambda query: index.knn_query(query, k=k)[0][0], queries)
+            results.append(_result(m, ef_construction, ef_search, k, _recall(found, truth), p50, p99,
+                                   build_seconds, memory_bytes, "hnswlib graph size"))
+            print(f"   m={m} ef_construction={ef_construction} ef_search={ef_search}: recall {results[-1][f'recall@{k}']:.3f}, p99 {p99:.2f} ms")
+    return results
+
+def _wait_searchable(backend, index_name, query, expected):
+    # OpenSearch makes new documents searchable after a refresh interval, not on write.
+    deadline = time.monotonic() + SEARCHABLE_TIMEOUT
+    while len(backend.search_chunks(index_name, query, k=expected)) < expected:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{index_name} did not become searchable within {SEARCHABLE_TIMEOUT:.0f}s")
+        time.sleep(1.0)
+
+def sweep_opensearch(backend, corpus, queries, truth, profile, grid, k):
+    """
+    Creates, fills, queries and deletes one OpenSearch index per configuration. ef_search is
+    part of the faiss mapping, so every combination gets its own index. Build time includes
+    the wait until the index answers searches; memory is the k-NN estimate.
+    """
+    results = []
+    ids = [f"v{row}" for row in range(len(corpus))]
+    for m, ef_construction, ef_search in itertools.product(grid["m"], grid["ef_construction"], grid["ef_search"]):
+        candidate = {**profile, "name": f"{profile['name']}-tuning", "m": m, "ef_construction": ef_construction, "ef_search": ef_search}
+        index_name = f"{TUNING_INDEX_PREFIX}-m{m}-efc{ef_construction}-ef{ef_search}"
+        backend.create_index(index_to_create=index_name, profile=candidate)
+        try:
+            start = time.perf_counter()
+            for batch_start in range(0, len(corpus), BULK_BATCH):
+                documents = [
+                    {"chunk_id": ids[row], "chunk_text": "", "embedding": stored_list(profile, corpus[row])}
+                    for row in range(batch_start, min(batch_start + BULK_BATCH, len(corpus)))
+                ]
+                _, failed = backend.bulk_index_chunks(index_name, documents)
+                if failed:
+                    raise RuntimeError(f"{len(failed)} vector(s) could not be indexed into {index_name}")
+            _wait_searchable(backend, index_name, stored_list(profile, queries[0]), min(k, len(corpus)))
+            build_seconds = time.perf_counter() - start
+
+            # Recall from one _msearch; latency from single queries, as the chat path sends them.
+            rows_by_id = {doc_id: row for row, doc_id in enumerate(ids)}
+            hit_lists = backend.search_chunks_batch(index_name, [stored_list(profile, query) for query in queries], k=k)
+            found = [[rows_by_id[hit["_id"]] for hit in hits] for hits in hit_lists]
+            _, p50, p99 = _timed_queries(
+                lambda query: backend.search_chunks(index_name, stored_list(profile, query), k=k),
+                queries,
+            )
+        finally:
+            backend.delete_index(index_name)
+        results.append(_result(m, ef_construction, ef_search, k, _recall(found, truth), p50, p99,
+                               build_seconds, bytes_per_vector(candidate) * len(corpus), "k-NN estimate"))
+        print(f"   m={m} ef_construction={ef_construction} ef_search={ef_search}: recall {results[-1][f'recall@{k}']:.3f}, p99 {p99:.2f} ms")
+    return results
+
+def _result(m, ef_construction, ef_search, k, recall, p50, p99, build_seconds, memory_bytes, memory_source):
+    return {
+        "m": m, "ef_construction": ef_construction, "ef_search": ef_search,
+        f"recall@{k}": recall, "p50_ms": p50, "p99_ms": p99,
+        "build_seconds": build_seconds, "memory_mb": memory_bytes / 2**20, "memory_source": memory_source,
+    }
+
+def recommend(results, k, target_recall=DEFAULT_TARGET_RECALL):
+    """
+    :return: The configuration with the lowest p99 latency (then memory) among those reaching
+             target_recall, or the one with the best recall if none does.
+    """
+    reaching = [result for result in results if result[f"recall@{k}"] >= target_recall]
+    if not reaching:
+        return max(results, key=lambda result: (result[f"recall@{k}"], -result["p99_ms"]))
+    return min(reaching, key=lambda result: (result["p99_ms"], result["memory_mb"]))
+
+def print_results(results, k):
+    print(f"\n{'m':>4} {'ef_con':>7} {'ef_search':>9} {f'recall@{k}':>10} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'memory MB':>10}")
+    for result in results:
+        print(f"{result['m']:>4} {result['ef_construction']:>7} {result['ef_search']:>9} {result[f'recall@{k}']:>10.3f} "
+              f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['build_seconds']:>8.2f} {result['memory_mb']:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep HNSW parameters on an ingested index and measure recall, latency, build time and memory.")
+    parser.add_argument("--index", default="skyconnect-knowledge-base", help="Ingested index (or alias) whose vectors are swept.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND, help="Where the ingested vectors are read from.")
+    parser.add_argument("--target", choices=["local", "opensearch"], default="local",
+                        help="local: hnswlib graphs in this process. opensearch: temporary indexes in the collection.")
+    parser.add_argument("--index-profile", default=None, help="Profile to tune; defaults to the one the index was built with.")
+    parser.add_argument("--m", type=int, nargs="+", default=DEFAULT_M)
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=DEFAULT_EF_CONSTRUCTION)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=DEFAULT_EF_SEARCH)
+    parser.add_argument("--k", type=int, default=DEFAULT_K)
+    parser.add_argument("--eval-file", default=DEFAULT_EVAL_FILE, help="Questions used as queries.")
+    parser.add_argument("--random-rows", type=int, default=0, help="Random unit vectors added to the corpus, to tune for a larger collection.")
+    parser.add_argument("--target-recall", type=float, default=DEFAULT_TARGET_RECALL)
+    parser.add_argument("--save-profile", metavar="NAME", help=f"Save the recommended configuration as profile NAME in {TUNED_PROFILES_FILE}.")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_PATH)
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend)
+    ids, corpus, manifest = load_corpus(args.index, backend)
+    if not ids:
+        sys.exit(f"❌ No ingested vectors found for {args.index} ({args.backend}). Run ingest.py first.")
+    profile = get_profile(args.index_profile or manifest.get("index_profile", "nmslib-float"))
+    if corpus.shape[1] != profile["dimensions"]:
+        sys.exit(f"❌ {args.index} holds {corpus.shape[1]}-dim vectors, but the {profile['name']} profile has {profile['dimensions']}.")
+    corpus = add_distractors(corpus, args.random_rows, profile)
+
+    questions = [item["question"] for item in load_eval_set(args.eval_file)]
+    queries = np.array([encode_vector(profile, embed_for_bot({"index_profile": profile["name"]}, question)) for question in questions], dtype=np.float32)
+    truth = exact_top_k(corpus, queries, args.k, profile["space_type"])
+    print(f"\n--- HNSW sweep: {len(corpus)} vectors ({len(ids)} ingested), {len(queries)} queries, {profile['name']} profile, {args.target} ---")
+
+    grid = {"m": args.m, "ef_construction": args.ef_construction, "ef_search": args.ef_search}
+    if args.target == "local":
+        results = sweep_hnswlib(corpus, queries, truth, profile, grid, args.k)
+    else:
+        results = sweep_opensearch(get_backend("opensearch"), corpus, queries, truth, profile, grid, args.k)
+
+    print_results(results, args.k)
+    best = recommend(results, args.k, args.target_recall)
+    reached = best[f"recall@{args.k}"] >= args.target_recall
+    print(f"\n{'🏆' if reached else '⚠️'} {'Fastest configuration reaching' if reached else 'No configuration reached'} recall@{args.k} {args.target_recall:.2f}"
+          f"{'' if reached else '; best recall'}: m={best['m']} ef_construction={best['ef_construction']} ef_search={best['ef_search']}")
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"index": args.index, "profile": profile, "vectors": len(corpus), "ingested": len(ids), "queries": len(queries),
+                   "k": args.k, "target": args.target, "results": results, "recommended": best}, f, indent=2)
+    print(f"💾 Results written to {args.output}")
+
+    if args.save_profile:
+        measured = {key: best[key] for key in (f"recall@{args.k}", "p50_ms", "p99_ms", "build_seconds", "memory_mb")}
+        save_tuned_profile(args.save_profile, {
+            **profile, "m": best["m"], "ef_construction": best["ef_construction"], "ef_search": best["ef_search"],
+            "tuned": {"index": args.index, "vectors": len(corpus), "target": args.target, **measured},
+        })
+        print(f"✅ Saved profile {args.save_profile} to {TUNED_PROFILES_FILE}. Build an index with it: python ingest.py --mode rebuild --index-profile {args.save_profile}")